@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare encode and decode throughput of JSON codecs on large serialized games.
+
+Run with ``python benchmarks/json_codecs.py``. Codecs that are not installed are skipped.
+"""
+import time
+import random
+from decimal import Decimal
+
+import click
+
+from planningpoker.cards import coerce_cards
+from planningpoker.json import CODECS, AUTO_CODEC, get_codec
+from planningpoker.persistence import ProcessMemoryPersistence
+
+GAME_ID = 'benchmark-game'
+CARDS = coerce_cards(['0', '0.5', '1', '2', '3', '5', '8', '13', '20', '40', '100', '?', 'coffee'])
+
+
+def make_game(players: int, rounds: int, polls: int) -> dict:
+    """Play a game with every player voting in every poll and return ``serialize_game`` of it."""
+    persistence = ProcessMemoryPersistence()
+    persistence.add_game(GAME_ID, 'player-0', 'Player 0', CARDS)
+    for player in range(1, players):
+        persistence.add_player(GAME_ID, 'player-%d' % player, 'Player %d - Łukasz' % player)
+
+    chooser = random.Random(0)
+    for round_number in range(rounds):
+        round_name = 'PROJ-%d: Estimate the ticket' % round_number
+        persistence.add_round(GAME_ID, round_name)
+        for _ in range(polls):
+            persistence.add_poll(GAME_ID, round_name)
+            for player in range(players):
+                persistence.cast_vote(GAME_ID, round_name, 'player-%d' % player,
+                                      chooser.choice(CARDS))
+        persistence.finalize_round(GAME_ID, round_name)
+    return persistence.serialize_game(GAME_ID)
+
+
+def measure(function, argument, min_time: float) -> float:
+    """Return the best time of a call, calling the function for at least ``min_time`` seconds."""
+    best = float('inf')
+    deadline = time.perf_counter() + min_time
+    while True:
+        start = time.perf_counter()
+        function(argument)
+        end = time.perf_counter()
+        best = min(best, end - start)
+        if end > deadline:
+            return best
+
+
+@click.command()
+@click.option('--players', type=int, default=50, help='Players voting in every poll.')
+@click.option('--rounds', type=int, default=200, help='Finalized rounds of the game.')
+@click.option('--polls', type=int, default=2, help='Polls in every round.')
+@click.option('--min-time', type=float, default=2.0, help='Seconds to measure each operation for.')
+def benchmark(players, rounds, polls, min_time):
+    """Print encode and decode throughput of every installed codec."""
+    game = make_game(players, rounds, polls)
+    reference = None
+    print('%d votes per game' % (players * rounds * polls))
+    print('%-20s %10s %12s %12s' % ('codec', 'size [kB]', 'encode [MB/s]', 'decode [MB/s]'))
+    for name in sorted(CODECS) + [AUTO_CODEC]:
+        try:
+            codec = get_codec(name)
+        except ValueError:
+            print('%-20s not installed' % name)
+            continue
+
+        encoded = codec.dumpb(game)
+        text = encoded.decode()
+        # Decoded numbers are floats, so compare them with the game the way clients would.
+        decoded = codec.loads(text)
+        if reference is None:
+            reference = decoded
+        assert decoded == reference, 'Codecs disagree.'
+        assert Decimal(str(decoded['cards'][1])) == CARDS[1]
+
+        encode_time = measure(codec.dumpb, game, min_time)
+        decode_time = measure(codec.loads, text, min_time)
+        megabytes = len(encoded) / 1e6
+        print('%-20s %10.1f %12.1f %12.1f' % (codec.name, len(encoded) / 1e3,
+                                              megabytes / encode_time, megabytes / decode_time))
+
+
+if __name__ == '__main__':
+    benchmark()
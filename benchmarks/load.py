@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Simulate planning sessions over HTTP and measure throughput and latency of every endpoint.
+
+Every game has a moderator adding rounds and polls and players joining, voting and - some of them
+- changing their votes, while all of them poll the game state with conditional requests, the way
+the frontend does. Games are played at the same time.
+
+Run against a running application with ``--url``; otherwise the application is served in this
+process, with the given ``--persistence``. Save the results as JSON with ``--output`` and compare
+two builds with ``--compare``:
+
+    $ python benchmarks/load.py --games 50 --players 8 --output before.json
+    $ python benchmarks/load.py --games 50 --players 8 --compare before.json
+"""
+import os
+import time
+import random
+import asyncio
+from collections import defaultdict, OrderedDict
+
+import aiohttp
+import click
+import simplejson
+
+from planningpoker.app import make_app
+from planningpoker.json import dump_to_json
+from planningpoker.persistence import backend_from_uri, DEFAULT_PERSISTENCE_URI
+
+HOST = '127.0.0.1'
+COOKIE_NAME = 'AIOHTTP_SESSION'
+JSON_HEADERS = {'Content-Type': 'application/json'}
+CARDS = [1, 2, 3, 5, 8, 13, '?']
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+
+    """Latencies and errors of requests by endpoint."""
+
+    def __init__(self):
+        """Start with no requests."""
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        """Add a request."""
+        self.latencies[endpoint].append(latency)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summarize(self, duration: float) -> OrderedDict:
+        """
+        Return statistics of every endpoint.
+
+        :param duration: seconds the load was generated for
+        :return: endpoints to their request counts, errors, requests per second and latency
+            percentiles in milliseconds
+        """
+        summary = OrderedDict()
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            statistics = OrderedDict([
+                ('requests', len(latencies)),
+                ('errors', self.errors[endpoint]),
+                ('throughput', len(latencies) / duration),
+            ])
+            for percent in PERCENTILES:
+                statistics['p%d' % percent] = percentile(latencies, percent) * 1000
+            summary[endpoint] = statistics
+        return summary
+
+
+def percentile(ordered: list, percent: float) -> float:
+    """Return the nearest-rank percentile of sorted values."""
+    rank = max(int(len(ordered) * percent / 100 + 0.5), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Client:
+
+    """A browser of a moderator or a player, keeping its session cookie."""
+
+    def __init__(self, loop, connector, base_url: str, recorder: Recorder):
+        """Start with no cookie."""
+        self._loop = loop
+        self._connector = connector
+        self._base_url = base_url
+        self._recorder = recorder
+        self.cookie = None
+
+    async def request(self, method: str, endpoint: str, path: str, data: dict = None,
+                      headers: dict = None) -> (int, dict, str):
+        """
+        Send a request and read the whole response.
+
+        :param endpoint: the route of the request, to record its latency under
+        :return: the response status, its decoded JSON body (or None) and its ETag header
+        """
+        if data is not None:
+            headers = dict(JSON_HEADERS, **(headers or {}))
+        start = time.perf_counter()
+        try:
+            response = await aiohttp.request(
+                method, self._base_url + path,
+                data=None if data is None else dump_to_json(data), headers=headers,
+                cookies=None if self.cookie is None else {COOKIE_NAME: self.cookie},
+                connector=self._connector, loop=self._loop)
+            body = await response.read()
+        except aiohttp.ClientError:
+            self._recorder.record(endpoint, time.perf_counter() - start, False)
+            return None, None, None
+        self._recorder.record(endpoint, time.perf_counter() - start, response.status < 400)
+
+        if COOKIE_NAME in response.cookies:
+            self.cookie = response.cookies[COOKIE_NAME].value
+        json = simplejson.loads(body.decode()) if body and response.status != 304 else None
+        return response.status, json, response.headers.get('ETag')
+
+
+async def watch(client: Client, game_id: str, interval: float, finished: asyncio.Event) -> None:
+    """Poll the state of a game with conditional requests until the game is finished."""
+    etag = None
+    while not finished.is_set():
+        status, _, new_etag = await client.request(
+            'GET', 'GET /game/{game_id}', '/game/%s' % game_id,
+            headers=None if etag is None else {'If-None-Match': etag})
+        if status == 200:
+            etag = new_etag
+        await asyncio.sleep(interval)
+
+
+async def vote(client: Client, game_id: str, round_name: str, chooser: random.Random,
+               think_time: float, revote_probability: float) -> None:
+    """Vote after a while and, perhaps, change the vote."""
+    path = '/game/%s/round/%s/vote' % (game_id, round_name)
+    await asyncio.sleep(chooser.uniform(0, think_time))
+    await client.request('POST', 'POST /game/{game_id}/round/{round_name}/vote', path,
+                         {'vote': chooser.choice(CARDS)})
+    if chooser.random() < revote_probability:
+        await asyncio.sleep(chooser.uniform(0, think_time))
+        await client.request('POST', 'POST /game/{game_id}/round/{round_name}/vote', path,
+                             {'vote': chooser.choice(CARDS)})
+
+
+async def play_game(loop, connector, base_url: str, recorder: Recorder, chooser: random.Random,
+                    players: int, rounds: int, polls: int, think_time: float,
+                    revote_probability: float, poll_interval: float) -> None:
+    """Play a game from its creation until its last round is finalized."""
+    moderator = Client(loop, connector, base_url, recorder)
+    status, created, _ = await moderator.request('POST', 'POST /new_game', '/new_game',
+                                                 {'cards': CARDS, 'moderator_name': 'Moderator'})
+    if status != 200:
+        raise click.ClickException('Could not create a game: %s %s' % (status, created))
+    game_id = created['game_id']
+    game_path = '/game/%s' % game_id
+
+    voters = [moderator]
+    for player in range(players - 1):
+        client = Client(loop, connector, base_url, recorder)
+        await client.request('POST', 'POST /game/{game_id}/join', game_path + '/join',
+                             {'name': 'Player %d' % player})
+        voters.append(client)
+
+    finished = asyncio.Event()
+    watchers = [loop.create_task(watch(client, game_id, poll_interval, finished))
+                for client in voters]
+    try:
+        for round_number in range(rounds):
+            round_name = 'PROJ-%d' % round_number
+            round_path = '%s/round/%s' % (game_path, round_name)
+            await moderator.request('POST', 'POST /game/{game_id}/new_round',
+                                    game_path + '/new_round', {'round_name': round_name})
+            for _ in range(polls):
+                await moderator.request('POST', 'POST /game/{game_id}/round/{round_name}/new_poll',
+                                        round_path + '/new_poll', {})
+                await asyncio.gather(*[
+                    vote(client, game_id, round_name, chooser, think_time, revote_probability)
+                    for client in voters
+                ])
+            await moderator.request('POST', 'POST /game/{game_id}/round/{round_name}/finalize',
+                                    round_path + '/finalize', {})
+    finally:
+        finished.set()
+        await asyncio.gather(*watchers)
+
+
+async def generate_load(loop, base_url: str, games: int, connections: int, seed: int,
+                        **game_options) -> float:
+    """
+    Play games at the same time.
+
+    :param connections: the most connections open at once
+    :param game_options: keyword arguments of ``play_game``
+    :return: seconds it took
+    """
+    connector = aiohttp.TCPConnector(loop=loop, limit=connections)
+    chooser = random.Random(seed)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            play_game(loop, connector, base_url, chooser=random.Random(chooser.random()),
+                      **game_options)
+            for _ in range(games)
+        ])
+        return time.perf_counter() - start
+    finally:
+        connector.close()
+
+
+def serve_and_run(persistence_uri: str, coroutine_function, **kwargs):
+    """Serve the application in this process and run a coroutine with its base URL."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    app = make_app(loop, os.urandom(32), backend_from_uri(persistence_uri))
+    handler = app.make_handler()
+    server = loop.run_until_complete(loop.create_server(handler, HOST, 0))
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return loop.run_until_complete(
+            coroutine_function(loop, 'http://%s:%d' % (HOST, port), **kwargs))
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(app.shutdown())
+        loop.run_until_complete(handler.finish_connections(1.0))
+        loop.run_until_complete(app.finish())
+        loop.close()
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    """Print statistics of every endpoint, with their change against the baseline results."""
+    def change(current, previous):
+        return ' (%+.0f%%)' % ((current / previous - 1) * 100) if previous else ''
+
+    baseline_endpoints = {} if baseline is None else baseline['endpoints']
+    print('%-50s %9s %7s %14s %18s %18s %18s' % (
+        'endpoint', 'requests', 'errors', 'requests/s', 'p50 [ms]', 'p95 [ms]', 'p99 [ms]'))
+    for endpoint, statistics in results['endpoints'].items():
+        previous = baseline_endpoints.get(endpoint, {})
+        print('%-50s %9d %7d %14s %18s %18s %18s' % (
+            endpoint, statistics['requests'], statistics['errors'],
+            *['%.1f%s' % (statistics[key], change(statistics[key], previous.get(key)))
+              for key in ['throughput', 'p50', 'p95', 'p99']]))
+    previous_throughput = None if baseline is None else baseline['throughput']
+    print('Total: %.1f requests/s%s' % (results['throughput'],
+                                        change(results['throughput'], previous_throughput)))
+
+
+@click.command()
+@click.option('--url', help='Base URL of a running application; served in process by default.')
+@click.option('--persistence', 'persistence_uri', default=DEFAULT_PERSISTENCE_URI,
+              help='Storage backend URI of the application served in process.')
+@click.option('--games', type=int, default=20, help='Games played at the same time.')
+@click.option('--players', type=int, default=8, help='Players of every game, the moderator too.')
+@click.option('--rounds', type=int, default=5, help='Rounds of every game.')
+@click.option('--polls', type=int, default=2, help='Polls of every round.')
+@click.option('--think-time', type=float, default=0.05,
+              help='The most seconds a player waits before voting.')
+@click.option('--revote-probability', type=float, default=0.3,
+              help='Chance of a player changing the vote in a poll.')
+@click.option('--poll-interval', type=float, default=0.2,
+              help='Seconds between requests for the game state of every client.')
+@click.option('--connections', type=int, default=100, help='The most connections open at once.')
+@click.option('--seed', type=int, default=0, help='Seed of random choices of players.')
+@click.option('--label', default='', help='Name of the build, saved with the results.')
+@click.option('--output', type=click.File('w'), help='File to save results to, as JSON.')
+@click.option('--compare', type=click.File('r'),
+              help='Results of another build to compare with, as saved by --output.')
+def benchmark(url, persistence_uri, games, players, rounds, polls, think_time,
+              revote_probability, poll_interval, connections, seed, label, output, compare):
+    """Play games against the application and print statistics of every endpoint."""
+    settings = OrderedDict([
+        ('games', games), ('players', players), ('rounds', rounds), ('polls', polls),
+        ('think_time', think_time), ('revote_probability', revote_probability),
+        ('poll_interval', poll_interval), ('connections', connections), ('seed', seed),
+    ])
+    recorder = Recorder()
+    kwargs = dict(games=games, connections=connections, seed=seed, recorder=recorder,
+                  players=players, rounds=rounds, polls=polls, think_time=think_time,
+                  revote_probability=revote_probability, poll_interval=poll_interval)
+    if url is None:
+        duration = serve_and_run(persistence_uri, generate_load, **kwargs)
+    else:
+        loop = asyncio.get_event_loop()
+        duration = loop.run_until_complete(generate_load(loop, url.rstrip('/'), **kwargs))
+
+    requests = sum(len(latencies) for latencies in recorder.latencies.values())
+    results = OrderedDict([
+        ('label', label),
+        ('settings', settings),
+        ('duration', duration),
+        ('throughput', requests / duration),
+        ('endpoints', recorder.summarize(duration)),
+    ])
+    print_results(results, None if compare is None else simplejson.load(compare))
+    if output is not None:
+        simplejson.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    benchmark()
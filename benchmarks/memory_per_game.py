@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Measure memory taken by a game kept in process memory.
+
+Compares the slotted model of ``ProcessMemoryPersistence`` with the nested dicts it used before.
+Every game gets the same players, rounds and votes in both layouts; IDs and names are allocated
+before measuring, as they are shared with the requests that brought them.
+
+    $ python benchmarks/memory_per_game.py --games 10000
+"""
+import gc
+import tracemalloc
+
+import click
+
+from planningpoker.cards import coerce_card, coerce_cards
+from planningpoker.random_id import get_random_id
+from planningpoker.persistence import ProcessMemoryPersistence
+
+CARDS = ['0', '1', '2', '3', '5', '8', '13', '20', '40', '100', '?']
+
+
+def make_games_input(games: int, players: int) -> list:
+    """Return game IDs, player IDs and player names (the moderator first) of each game."""
+    return [
+        (get_random_id(), [get_random_id() for _ in range(players)],
+         ['Player %d' % player for player in range(players)])
+        for _ in range(games)
+    ]
+
+
+def votes(players: int, rounds: int, polls: int):
+    """Yield ``(round name, poll, player, card)`` of every vote, in order."""
+    for round in range(rounds):
+        for poll in range(polls):
+            for player in range(players):
+                yield 'Round %d' % round, poll, player, CARDS[(round + poll + player) % len(CARDS)]
+
+
+def build_legacy(games_input: list, rounds: int, polls: int) -> dict:
+    """Build the nested dicts ``ProcessMemoryPersistence`` used to keep."""
+    games = {}
+    for game_id, player_ids, player_names in games_input:
+        game = games[game_id] = {
+            'players': dict(zip(player_ids, player_names)),
+            'moderator_id': player_ids[0],
+            'cards': coerce_cards(CARDS),
+            'rounds_order': [],
+            'rounds': {},
+        }
+        for round_name, poll, player, card in votes(len(player_ids), rounds, polls):
+            if round_name not in game['rounds']:
+                game['rounds_order'].append(round_name)
+                game['rounds'][round_name] = {'finalized': True, 'polls': []}
+            round_polls = game['rounds'][round_name]['polls']
+            if len(round_polls) == poll:
+                round_polls.append({})
+            # Every vote arrives in a request of its own, so its estimation is a new object.
+            round_polls[poll][player_names[player]] = coerce_card(card)
+    return games
+
+
+def build_slotted(games_input: list, rounds: int, polls: int) -> ProcessMemoryPersistence:
+    """Play the same games through ``ProcessMemoryPersistence``."""
+    persistence = ProcessMemoryPersistence()
+    for game_id, player_ids, player_names in games_input:
+        persistence.add_game(game_id, player_ids[0], player_names[0], coerce_cards(CARDS))
+        for player_id, player_name in zip(player_ids[1:], player_names[1:]):
+            persistence.add_player(game_id, player_id, player_name)
+        for round_name, poll, player, card in votes(len(player_ids), rounds, polls):
+            if poll == 0 and player == 0:
+                persistence.add_round(game_id, round_name)
+            if player == 0:
+                persistence.add_poll(game_id, round_name)
+            persistence.cast_vote(game_id, round_name, player_ids[player], coerce_card(card))
+            if poll == polls - 1 and player == len(player_ids) - 1:
+                persistence.finalize_round(game_id, round_name)
+    return persistence
+
+
+def measure(build, *args) -> int:
+    """Return the number of bytes still allocated by a build function after it returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build(*args)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del built
+    return after - before
+
+
+@click.command()
+@click.option('--games', type=int, default=10000, help='Number of games.')
+@click.option('--players', type=int, default=6, help='Players per game, including the moderator.')
+@click.option('--rounds', type=int, default=5, help='Rounds per game.')
+@click.option('--polls', type=int, default=2, help='Polls per round.')
+def main(games, players, rounds, polls):
+    """Print bytes per game of the nested dict layout and the slotted model."""
+    games_input = make_games_input(games, players)
+    legacy = measure(build_legacy, games_input, rounds, polls)
+    slotted = measure(build_slotted, games_input, rounds, polls)
+    print('%d games, %d players, %d rounds of %d polls each' % (games, players, rounds, polls))
+    print('nested dicts: %8d bytes per game' % (legacy // games))
+    print('slotted:      %8d bytes per game (%.0f%%)'
+          % (slotted // games, 100 * slotted / legacy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Measure every persistence operation on games of growing sizes.
+
+For each size N one game gets N players, N rounds and - in its last round - N polls, the last one
+with N votes; the backend holds N other games. Every operation is then called on that game
+``--operations`` times. Operations that should not depend on the size of a game, but get slower
+with it, show up in the last column - the growth of time per operation from the smallest size to
+the largest.
+
+    $ python benchmarks/persistence.py --sizes 10,100,1000,10000
+    $ python benchmarks/persistence.py --persistence redis://localhost:6379/15
+
+Backends are given by persistence URIs, as taken by ``--persistence`` of the application.
+Mutations of blocking backends are applied by a thread pool while games are built.
+"""
+import os
+import time
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from planningpoker.cards import coerce_cards
+from planningpoker.persistence import backend_from_uri
+
+GAME_ID = 'benchmark-game'
+CARDS = coerce_cards(['0', '0.5', '1', '2', '3', '5', '8', '13', '20', '40', '100', '?'])
+
+# Threads applying mutations of blocking backends while building games.
+BUILD_THREADS = 32
+
+
+def player_id(slot: int) -> str:
+    """Return the ID of a player."""
+    return 'player-%d' % slot
+
+
+def build_game(backend, size: int, operations: int) -> None:
+    """
+    Fill the backend with a game of the given size.
+
+    Also adds ``operations`` rounds with a poll each, for ``finalize_round`` to finalize.
+    """
+    active_round = 'round-%d' % (size - 1)
+    ready_rounds = ['ready-%d' % number for number in range(operations)]
+
+    def apply(method, argument_lists):
+        if backend.blocking:
+            with ThreadPoolExecutor(BUILD_THREADS) as executor:
+                for future in [executor.submit(method, *args) for args in argument_lists]:
+                    future.result()
+        else:
+            for args in argument_lists:
+                method(*args)
+
+    backend.add_game(GAME_ID, player_id(0), 'Player 0', CARDS)
+    apply(backend.add_game, [('other-game-%d' % number, player_id(0), 'Player 0', CARDS)
+                             for number in range(size)])
+    apply(backend.add_player, [(GAME_ID, player_id(slot), 'Player %d' % slot)
+                               for slot in range(1, size)])
+    backend.add_rounds(GAME_ID, ['round-%d' % number for number in range(size)] + ready_rounds)
+    apply(backend.add_poll, [(GAME_ID, active_round)] * size)
+    apply(backend.cast_vote, [(GAME_ID, active_round, player_id(slot), CARDS[slot % len(CARDS)])
+                              for slot in range(size)])
+    apply(backend.add_poll, [(GAME_ID, round_name) for round_name in ready_rounds])
+
+
+def operation_calls(size: int) -> OrderedDict:
+    """
+    Return the operations to measure on a game built by ``build_game``.
+
+    :return: names of operations to functions taking the backend and the number of the call
+    """
+    active_round = 'round-%d' % (size - 1)
+    return OrderedDict([
+        ('add_game', lambda backend, number: backend.add_game(
+            'new-game-%d' % number, player_id(0), 'Player 0', CARDS)),
+        ('add_player', lambda backend, number: backend.add_player(
+            GAME_ID, 'new-player-%d' % number, 'New Player %d' % number)),
+        ('add_round', lambda backend, number: backend.add_round(
+            GAME_ID, 'new-round-%d' % number)),
+        ('add_poll', lambda backend, number: backend.add_poll(GAME_ID, active_round)),
+        # Players who voted last change their votes - the worst case for a scan of votes.
+        ('cast_vote', lambda backend, number: backend.cast_vote(
+            GAME_ID, active_round, player_id(size - 1 - number % size),
+            CARDS[number % len(CARDS)])),
+        ('finalize_round', lambda backend, number: backend.finalize_round(
+            GAME_ID, 'ready-%d' % number)),
+        ('get_game_version', lambda backend, number: backend.get_game_version(GAME_ID)),
+        ('client_owns_game', lambda backend, number: backend.client_owns_game(
+            GAME_ID, player_id(size - 1))),
+        ('serialize_game', lambda backend, number: backend.serialize_game(GAME_ID)),
+        ('export_votes', lambda backend, number: list(backend.export_votes(GAME_ID))),
+    ])
+
+
+def measure_backend(persistence_uri: str, size: int, operations: int) -> OrderedDict:
+    """
+    Build a game of the given size in a new backend and time every operation on it.
+
+    :param persistence_uri: URI of an empty backend
+    :return: names of operations to their mean time per call, in seconds
+    """
+    backend = backend_from_uri(persistence_uri)
+    try:
+        build_game(backend, size, operations)
+        times = OrderedDict()
+        for name, call in operation_calls(size).items():
+            start = time.perf_counter()
+            for number in range(operations):
+                call(backend, number)
+            times[name] = (time.perf_counter() - start) / operations
+        return times
+    finally:
+        close = getattr(backend, 'close', None)
+        if close is not None:
+            close()
+
+
+def default_persistence_uris(directory: str) -> list:
+    """Return URIs of the backends not needing a server, storing data in the directory."""
+    return ['memory://',
+            'memory:///' + os.path.join(directory, 'journal-{size}'),
+            'sqlite:///' + os.path.join(directory, 'planningpoker-{size}.sqlite3')]
+
+
+@click.command()
+@click.option('--persistence', 'persistence_uris', multiple=True,
+              help='URI of a backend to measure, repeatable; may contain {size} to get a new '
+                   'database per size. Memory, journal and SQLite backends by default. Keys of '
+                   'Redis backends are not removed - use an empty database.')
+@click.option('--sizes', default='10,100,1000', help='Comma-separated sizes of games.')
+@click.option('--operations', type=int, default=100, help='Calls of every operation per size.')
+def benchmark(persistence_uris, sizes, operations):
+    """Print microseconds per call of every operation at every size of the game."""
+    sizes = [int(size) for size in sizes.split(',')]
+    directory = tempfile.mkdtemp(prefix='planningpoker-benchmark-')
+    try:
+        for persistence_uri in persistence_uris or default_persistence_uris(directory):
+            results = [measure_backend(persistence_uri.format(size=size), size, operations)
+                       for size in sizes]
+            print(persistence_uri)
+            print('%-18s' % 'operation [us]' + ''.join('%12d' % size for size in sizes) +
+                  '%10s' % 'growth')
+            for name in results[0]:
+                times = [result[name] for result in results]
+                print('%-18s' % name + ''.join('%12.1f' % (t * 1e6) for t in times) +
+                      '%9.1fx' % (times[-1] / times[0]))
+            print()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    benchmark()
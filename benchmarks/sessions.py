@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare requests per second of voting players with the session cache on and off.
+
+Run with ``python benchmarks/sessions.py``. The application is served in this process, on
+the loopback interface, and every player votes over and over, sending the cookie it got when it
+joined.
+"""
+import os
+import time
+import asyncio
+
+import aiohttp
+import click
+
+from planningpoker.app import make_app
+from planningpoker.json import dump_to_json
+from planningpoker.persistence import ProcessMemoryPersistence
+from planningpoker.sessions import SESSION_CACHE_SIZE
+
+HOST = '127.0.0.1'
+COOKIE_NAME = 'AIOHTTP_SESSION'
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+async def post(loop, connector, url: str, data: dict,
+               cookie: str = None) -> aiohttp.ClientResponse:
+    """Send a JSON request with the session cookie, if given, and read the response."""
+    response = await aiohttp.request(
+        'POST', url, data=dump_to_json(data), headers=JSON_HEADERS,
+        cookies={COOKIE_NAME: cookie} if cookie is not None else None,
+        connector=connector, loop=loop)
+    await response.read()
+    assert response.status == 200, response.status
+    return response
+
+
+async def play(loop, base_url: str, players: int, votes: int) -> float:
+    """
+    Set up a game and make every player vote ``votes`` times at once.
+
+    :return: requests per second of the voting
+    """
+    connector = aiohttp.TCPConnector(loop=loop, limit=players)
+    try:
+        new_game = await post(loop, connector, base_url + '/new_game',
+                              {'cards': ['1', '2', '3'], 'moderator_name': 'Moderator'})
+        game_id = (await new_game.json())['game_id']
+        moderator = new_game.cookies[COOKIE_NAME].value
+        game_url = '%s/game/%s' % (base_url, game_id)
+        await post(loop, connector, game_url + '/new_round', {'round_name': 'R'}, moderator)
+        await post(loop, connector, game_url + '/round/R/new_poll', {}, moderator)
+
+        cookies = []
+        for player in range(players):
+            join = await post(loop, connector, game_url + '/join', {'name': 'P%d' % player})
+            cookies.append(join.cookies[COOKIE_NAME].value)
+
+        async def vote(cookie):
+            for _ in range(votes):
+                await post(loop, connector, game_url + '/round/R/vote', {'vote': 2}, cookie)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[vote(cookie) for cookie in cookies], loop=loop)
+        return players * votes / (time.perf_counter() - start)
+    finally:
+        connector.close()
+
+
+def serve_and_play(session_cache_size: int, players: int, votes: int) -> (float, object):
+    """
+    Serve the application and play a game against it.
+
+    :return: requests per second and the session storage of the application
+    """
+    loop = asyncio.new_event_loop()
+    app = make_app(loop, os.urandom(32), ProcessMemoryPersistence(),
+                   session_cache_size=session_cache_size)
+    handler = app.make_handler()
+    server = loop.run_until_complete(loop.create_server(handler, HOST, 0))
+    port = server.sockets[0].getsockname()[1]
+    try:
+        requests_per_second = loop.run_until_complete(
+            play(loop, 'http://%s:%d' % (HOST, port), players, votes))
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(app.shutdown())
+        loop.run_until_complete(handler.finish_connections(1.0))
+        loop.run_until_complete(app.finish())
+        loop.close()
+    return requests_per_second, app['session_storage']
+
+
+@click.command()
+@click.option('--players', type=int, default=50, help='Players voting at once.')
+@click.option('--votes', type=int, default=100, help='Votes of every player.')
+def benchmark(players, votes):
+    """Print requests per second with the session cache off and on."""
+    for label, cache_size in [('cache off', 0), ('cache on', SESSION_CACHE_SIZE)]:
+        requests_per_second, storage = serve_and_play(cache_size, players, votes)
+        hit_rate = getattr(storage, 'hit_rate', None)
+        print('%-10s %8.1f requests/s%s' % (
+            label, requests_per_second,
+            '' if hit_rate is None else ', hit rate %.3f' % hit_rate))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,266 @@
+"""
+Estimation analytics across games.
+
+The poll that ended each finalized round is loaded into columnar NumPy arrays, one element per
+vote, from compact arrays read by the backends, so analyses are a handful of vectorized operations
+however many votes there are:
+    - spread - how far apart the estimates of a team (the players of a game) are in a round,
+    - re-votes - how many polls it takes to finalize a round,
+    - the distribution of estimates among the cards of each deck.
+
+Requires the ``numpy`` package (``pip install planningpoker[analytics]``).
+"""
+import sys
+import base64
+from array import array
+from collections import namedtuple
+
+import click
+import numpy
+
+from planningpoker.json import dump_to_json
+from planningpoker.statistics import is_numeric
+from planningpoker.persistence import BasePersistence, backend_from_uri
+from planningpoker.persistence.base import FinalizedPolls, VOTES_TYPECODE
+from planningpoker.persistence.exceptions import NoSuchGame
+
+# Columns of votes of finalized rounds. Games, decks and rounds are referred to by their indices
+# in ``game_ids``, ``decks`` and the round arrays.
+Columns = namedtuple('Columns', [
+    'game_ids',  # IDs of games, by game index.
+    'decks',  # Distinct decks - tuples of cards - by deck index.
+    'game_deck',  # The deck of each game.
+    'round_game',  # The game of each finalized round.
+    'round_polls',  # The number of polls each round took.
+    'vote_game',  # The game of each vote.
+    'vote_round',  # The round of each vote; votes of a round are contiguous.
+    'vote_player',  # The player slot of each voter within their game.
+    'vote_card',  # The index of the card voted for within the game's deck.
+    'vote_estimate',  # The numeric value of the card voted for, NaN for other cards.
+])
+
+
+def _encode_array(values: array) -> str:
+    """Return the machine representation of an array as base64 text."""
+    return base64.b64encode(values.tobytes()).decode()
+
+
+def _decode_array(typecode: str, text: str) -> array:
+    """Return an array encoded by ``_encode_array`` on a machine of the same architecture."""
+    return array(typecode, base64.b64decode(text))
+
+
+class ColumnsBuilder:
+
+    """
+    Collects finalized rounds of games into ``Columns``.
+
+    Games are added as ``FinalizedPolls`` - compact arrays backends read without serializing the
+    game - which are appended as a whole, so adding a game costs the same however many votes it
+    has. Per-vote columns are derived when building.
+
+    Builders of other processes, e.g. of workers serving shards of games, are merged from their
+    dumps - the same arrays, encoded as base64 text.
+    """
+
+    def __init__(self):
+        """Start with no games."""
+        self._game_ids = []
+        self._decks = {}  # Decks to their indices.
+        self._game_deck = array('l')
+        self._game_rounds = array('l')  # The number of finalized rounds of each game.
+        self._round_polls = array(VOTES_TYPECODE)
+        self._round_votes = array(VOTES_TYPECODE)
+        self._votes = array(VOTES_TYPECODE)  # Alternating player slots and card indices.
+
+    def add_game(self, game_id: str, polls: FinalizedPolls) -> None:
+        """Add votes of finalized rounds of a game, as returned by ``finalized_polls``."""
+        self._game_ids.append(game_id)
+        self._game_deck.append(self._decks.setdefault(tuple(polls.cards), len(self._decks)))
+        self._game_rounds.append(len(polls.round_polls))
+        self._round_polls.extend(polls.round_polls)
+        self._round_votes.extend(polls.round_votes)
+        self._votes.extend(polls.votes)
+
+    def dump(self) -> dict:
+        """Return the collected games as JSON-serializable values, for ``merge``."""
+        return {
+            'game_ids': self._game_ids,
+            'decks': sorted(self._decks, key=self._decks.__getitem__),
+            'game_deck': _encode_array(self._game_deck),
+            'game_rounds': _encode_array(self._game_rounds),
+            'round_polls': _encode_array(self._round_polls),
+            'round_votes': _encode_array(self._round_votes),
+            'votes': _encode_array(self._votes),
+        }
+
+    def merge(self, dumped: dict) -> None:
+        """Add the games of another builder, given its ``dump`` decoded from JSON."""
+        deck_indices = [self._decks.setdefault(tuple(deck), len(self._decks))
+                        for deck in dumped['decks']]
+        self._game_ids.extend(dumped['game_ids'])
+        self._game_deck.extend(deck_indices[deck]
+                               for deck in _decode_array('l', dumped['game_deck']))
+        self._game_rounds.extend(_decode_array('l', dumped['game_rounds']))
+        self._round_polls.extend(_decode_array(VOTES_TYPECODE, dumped['round_polls']))
+        self._round_votes.extend(_decode_array(VOTES_TYPECODE, dumped['round_votes']))
+        self._votes.extend(_decode_array(VOTES_TYPECODE, dumped['votes']))
+
+    def build(self) -> Columns:
+        """Return the collected votes as NumPy arrays."""
+        decks = sorted(self._decks, key=self._decks.__getitem__)
+        game_deck = numpy.array(self._game_deck, dtype='l')
+        round_game = numpy.repeat(numpy.arange(len(self._game_ids)), self._game_rounds)
+        vote_round = numpy.repeat(numpy.arange(len(self._round_polls)), self._round_votes)
+        vote_game = round_game[vote_round]
+        votes = numpy.array(self._votes, dtype='l').reshape(-1, 2)
+        vote_card = votes[:, 1]
+
+        # Numeric values of cards by deck and card index, NaN padded.
+        estimates = numpy.full((len(decks), max(map(len, decks), default=0)), numpy.nan)
+        for deck_index, deck in enumerate(decks):
+            estimates[deck_index, :len(deck)] = [
+                float(card) if is_numeric(card) else numpy.nan for card in deck]
+
+        return Columns(
+            list(self._game_ids), decks, game_deck, round_game,
+            numpy.array(self._round_polls, dtype='l'), vote_game, vote_round, votes[:, 0],
+            vote_card, estimates[game_deck[vote_game], vote_card])
+
+
+def load_columns(persistence: BasePersistence) -> Columns:
+    """Load finalized rounds of all games of a backend."""
+    builder = ColumnsBuilder()
+    for game_id in persistence.game_ids():
+        try:
+            polls = persistence.finalized_polls(game_id)
+        except NoSuchGame:
+            continue  # Removed in the meantime.
+        builder.add_game(game_id, polls)
+    return builder.build()
+
+
+def _divide(dividends: numpy.ndarray, divisors: numpy.ndarray) -> numpy.ndarray:
+    """Divide elementwise, with NaN where the divisor is 0."""
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return dividends / divisors
+
+
+def _to_list(values: numpy.ndarray) -> list:
+    """Convert an array to a list of JSON-serializable values, NaN becoming None."""
+    return [None if value != value else value for value in values.tolist()]
+
+
+def round_spread(columns: Columns) -> (numpy.ndarray, numpy.ndarray, numpy.ndarray):
+    """
+    Compute the spread of numeric estimates of rounds with at least one.
+
+    :return: indices of the rounds, standard deviations and ranges (max - min) of their estimates
+    """
+    numeric = ~numpy.isnan(columns.vote_estimate)
+    rounds = columns.vote_round[numeric]
+    values = columns.vote_estimate[numeric]
+    if values.size == 0:
+        return rounds, values, values
+
+    # Votes of a round are contiguous, so each round is a slice starting where the round changes.
+    starts = numpy.flatnonzero(numpy.concatenate(([True], rounds[1:] != rounds[:-1])))
+    counts = numpy.diff(numpy.append(starts, values.size))
+    means = numpy.add.reduceat(values, starts) / counts
+    variances = numpy.add.reduceat(values * values, starts) / counts - means * means
+    deviations = numpy.sqrt(numpy.maximum(variances, 0))  # Rounding errors may make it negative.
+    ranges = numpy.maximum.reduceat(values, starts) - numpy.minimum.reduceat(values, starts)
+    return rounds[starts], deviations, ranges
+
+
+def team_report(columns: Columns) -> dict:
+    """
+    Report on the spread of estimates and the re-votes of each team.
+
+    :return: dicts by game ID: the number of finalized rounds, the mean number of polls per round
+        and the mean standard deviation and range of numeric estimates in a round
+    """
+    games_count = len(columns.game_ids)
+    if games_count == 0:
+        return {}
+    rounds = numpy.bincount(columns.round_game, minlength=games_count)
+    polls = numpy.bincount(columns.round_game, weights=columns.round_polls,
+                           minlength=games_count)
+
+    spread_rounds, deviations, ranges = round_spread(columns)
+    spread_games = columns.round_game[spread_rounds]
+    estimated_rounds = numpy.bincount(spread_games, minlength=games_count)
+    mean_deviations = _divide(numpy.bincount(spread_games, weights=deviations,
+                                             minlength=games_count), estimated_rounds)
+    mean_ranges = _divide(numpy.bincount(spread_games, weights=ranges, minlength=games_count),
+                          estimated_rounds)
+
+    return {
+        game_id: {'rounds': rounds_count, 'mean_polls': mean_polls,
+                  'mean_deviation': mean_deviation, 'mean_range': mean_range}
+        for game_id, rounds_count, mean_polls, mean_deviation, mean_range in zip(
+            columns.game_ids, rounds.tolist(), _to_list(_divide(polls, rounds)),
+            _to_list(mean_deviations), _to_list(mean_ranges))
+    }
+
+
+def revote_report(columns: Columns) -> dict:
+    """
+    Report on the number of polls it takes to finalize a round.
+
+    :return: a dict with the mean number of polls, the rate of rounds with more than one poll and
+        the numbers of rounds by their number of polls, starting with one poll
+    """
+    polls = columns.round_polls
+    if polls.size == 0:
+        return {'mean_polls': None, 'revote_rate': None, 'rounds_by_polls': []}
+    return {
+        'mean_polls': float(polls.mean()),
+        'revote_rate': float(numpy.count_nonzero(polls > 1)) / polls.size,
+        'rounds_by_polls': numpy.bincount(polls)[1:].tolist(),
+    }
+
+
+def deck_report(columns: Columns) -> list:
+    """
+    Report on the distribution of estimates in each deck.
+
+    :return: dicts with the cards of the deck, the number of games using it and the number of
+        votes for each card, in the order of decks' first use
+    """
+    decks_count = len(columns.decks)
+    if decks_count == 0:
+        return []
+    width = max(len(deck) for deck in columns.decks)
+    # Each (deck, card) pair gets a cell of its own in a flat array of decks by cards.
+    cells = columns.game_deck[columns.vote_game] * width + columns.vote_card
+    votes = numpy.bincount(cells, minlength=decks_count * width).reshape(decks_count, width)
+    games = numpy.bincount(columns.game_deck, minlength=decks_count)
+    return [
+        {'cards': list(deck), 'games': games_count, 'votes': deck_votes[:len(deck)]}
+        for deck, games_count, deck_votes in zip(columns.decks, games.tolist(), votes.tolist())
+    ]
+
+
+def analyze(columns: Columns) -> dict:
+    """Return all reports, as JSON-serializable values."""
+    return {
+        'games': len(columns.game_ids),
+        'rounds': int(columns.round_game.size),
+        'votes': int(columns.vote_game.size),
+        'teams': team_report(columns),
+        'revotes': revote_report(columns),
+        'decks': deck_report(columns),
+    }
+
+
+@click.command()
+@click.argument('persistence_uri')
+def analytics_entry(persistence_uri):
+    """Print analytics of finalized rounds stored at PERSISTENCE_URI as JSON."""
+    try:
+        persistence = backend_from_uri(persistence_uri, read_only=True)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    print(dump_to_json(analyze(load_columns(persistence))))
@@ -2,7 +2,13 @@
 """Web app initialization."""
 import sys
 import os
+import time
+import atexit
 import base64
+import signal
+import shutil
+import tempfile
+import multiprocessing
 from functools import wraps
 
 import click
@@ -12,17 +18,82 @@ from aiohttp import web
 from aiohttp_session import session_middleware
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 
+from planningpoker.json import AUTO_CODEC, get_codec, set_codec
 from planningpoker.routing import routes
-from planningpoker.persistence import BasePersistence, ProcessMemoryPersistence
+from planningpoker.sessions import CachingEncryptedCookieStorage, SESSION_CACHE_SIZE
+from planningpoker.bus import BaseBus, bus_from_uri, DEFAULT_BUS_URI
+from planningpoker.push import GamePublisher
+from planningpoker.metrics import RequestMetrics
+from planningpoker.profiling import RequestProfiler, PROFILE_EVERY
+from planningpoker.middlewares import (
+    metrics_middleware, profiling_middleware, expired_games_middleware
+)
+from planningpoker.sharding import Shard, SINGLE_SHARD
+from planningpoker.dispatcher import make_dispatcher_app
+from planningpoker.persistence import (
+    BasePersistence, BaseAsyncPersistence, AsyncPersistenceAdapter, backend_from_uri,
+    DEFAULT_PERSISTENCE_URI
+)
+from planningpoker.persistence.uri import shard_persistence_uri
 
+WORKERS_START_TIMEOUT = 10
 
-@asyncio.coroutine
-async def init(loop, host: str, port: int, secret_key: str, persistence: BasePersistence):
-    """Initialize the application."""
+# Signals after which a process shuts its application down and exits.
+TERMINATING_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+async def evict_expired_games(loop, persistence: BaseAsyncPersistence, interval: float) -> None:
+    """Remove idle games every ``interval`` seconds, forever."""
+    while True:
+        await asyncio.sleep(interval, loop=loop)
+        await persistence.evict_expired_games()
+
+
+def make_app(loop, secret_key: str, persistence: BasePersistence,
+             shard: Shard = SINGLE_SHARD, bus: BaseBus = None,
+             admin_token: str = None,
+             session_cache_size: int = SESSION_CACHE_SIZE,
+             profile_file: str = None, profile_every: int = PROFILE_EVERY) -> web.Application:
+    """
+    Create the application.
+
+    :param persistence: a synchronous backend; views get it wrapped in an awaitable adapter;
+        closed on shutdown
+    :param shard: the shard of games served by this process
+    :param bus: a started bus notifying other processes of changes of games; closed on shutdown
+    :param admin_token: the bearer token of admin endpoints; ``None`` disables them
+    :param session_cache_size: the most session cookies to keep decrypted; 0 disables the cache
+    :param profile_file: the file to write reports of the request profiler to
+    :param profile_every: profile one request in this many of each route, once the profiler is
+        turned on
+    """
+    expiry_interval = persistence.expiry_interval
+    persistence = AsyncPersistenceAdapter(persistence, loop=loop, bus=bus)
+    if session_cache_size:
+        session_storage = CachingEncryptedCookieStorage(secret_key, cache_size=session_cache_size)
+    else:
+        session_storage = EncryptedCookieStorage(secret_key)
     app = web.Application(
         loop=loop,
-        middlewares=[session_middleware(EncryptedCookieStorage(secret_key))]
+        middlewares=[metrics_middleware,
+                     profiling_middleware,
+                     session_middleware(session_storage),
+                     expired_games_middleware]
     )
+    app['session_storage'] = session_storage
+    app['shard'] = shard
+    app['admin_token'] = admin_token
+    app['profiler'] = RequestProfiler(loop, profile_every, profile_file)
+    app['publisher'] = GamePublisher(persistence, loop)
+    app.on_shutdown.append(lambda app: app['publisher'].close())
+    app.on_shutdown.append(lambda app: persistence.bus.close())
+    app.on_shutdown.append(lambda app: app['profiler'].close())
+
+    if expiry_interval is not None:
+        eviction = loop.create_task(evict_expired_games(loop, persistence, expiry_interval))
+        app.on_shutdown.append(lambda app: eviction.cancel())
+    # Last, so that nothing uses the backend once it is closed.
+    app.on_shutdown.append(lambda app: persistence.close())
 
     for name, (method, path, handler) in routes.items():
 
@@ -44,10 +115,119 @@ async def init(loop, host: str, port: int, secret_key: str, persistence: BasePer
         request.match_info['filename'] = 'index.html'
         return await route.handle(request)
 
-    app.router.add_route('GET', '/', static_index)
-    srv = await loop.create_server(app.make_handler(), host, port)
+    app.router.add_route('GET', '/', static_index, name='index')
+    app['metrics'] = RequestMetrics(app.router)
+    return app
+
+
+def serve_until_terminated(loop, app: web.Application) -> None:
+    """
+    Run the loop until SIGTERM or SIGINT, then shut the application down.
+
+    Signals received during the shutdown are ignored, so that it completes - e.g. the backend
+    makes all mutations durable - even if the process is signalled again.
+    """
+    for signal_number in TERMINATING_SIGNALS:
+        loop.add_signal_handler(signal_number, loop.stop)
+    loop.run_forever()
+    for signal_number in TERMINATING_SIGNALS:
+        loop.add_signal_handler(signal_number, lambda: None)
+    loop.run_until_complete(app.shutdown())
+
+
+@asyncio.coroutine
+async def init(loop, host: str, port: int, secret_key: str, persistence: BasePersistence,
+               bus: BaseBus = None, admin_token: str = None, profile_file: str = None,
+               profile_every: int = PROFILE_EVERY):
+    """Initialize the application and return it. ``SIGUSR2`` toggles the request profiler."""
+    if bus is not None:
+        await bus.start()
+    app = make_app(loop, secret_key, persistence, bus=bus, admin_token=admin_token,
+                   profile_file=profile_file, profile_every=profile_every)
+    loop.add_signal_handler(signal.SIGUSR2, app['profiler'].toggle)
+    await loop.create_server(app.make_handler(), host, port)
     print('HTTP server started at %s:%s' % (host, port), file=sys.stderr)
-    return srv
+    return app
+
+
+def run_worker(shard: Shard, socket_path: str, secret_key: str, persistence_uri: str,
+               game_ttl: (float, None), bus_uri: str, admin_token: (str, None),
+               json_codec: str, profile_file: (str, None), profile_every: int) -> None:
+    """
+    Serve one shard of games on a Unix socket - the body of a worker process.
+
+    ``SIGUSR2`` toggles the request profiler of the worker. Reports go to ``profile_file``
+    suffixed with the shard index.
+    """
+    set_codec(get_codec(json_codec))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    persistence = backend_from_uri(shard_persistence_uri(persistence_uri, shard),
+                                   game_ttl=game_ttl)
+    bus = bus_from_uri(loop, bus_uri)
+    loop.run_until_complete(bus.start())
+    if profile_file is not None:
+        profile_file = '%s.%d' % (profile_file, shard.index)
+    app = make_app(loop, secret_key, persistence, shard, bus, admin_token,
+                   profile_file=profile_file, profile_every=profile_every)
+    loop.add_signal_handler(signal.SIGUSR2, app['profiler'].toggle)
+    loop.run_until_complete(loop.create_unix_server(app.make_handler(), socket_path))
+    serve_until_terminated(loop, app)
+
+
+def start_workers(count: int, secret_key: str, persistence_uri: str,
+                  game_ttl: (float, None), bus_uri: str, admin_token: (str, None),
+                  json_codec: str, profile_file: (str, None), profile_every: int) -> (list, list):
+    """
+    Start worker processes and wait until they listen.
+
+    :return: paths of workers' sockets and the worker processes, in the order of shard indices
+    :raise RuntimeError: if a worker exits or does not start listening in time
+    """
+    socket_dir = tempfile.mkdtemp(prefix='planningpoker-')
+    atexit.register(shutil.rmtree, socket_dir, ignore_errors=True)
+    sockets = [os.path.join(socket_dir, 'worker-%d.sock' % index) for index in range(count)]
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(Shard(index, count), path, secret_key, persistence_uri, game_ttl, bus_uri,
+                  admin_token, json_codec, profile_file, profile_every),
+            name='planningpoker-worker-%d' % index, daemon=True)
+        for index, path in enumerate(sockets)
+    ]
+    for worker in workers:
+        worker.start()
+
+    deadline = time.monotonic() + WORKERS_START_TIMEOUT
+    while not all(os.path.exists(path) for path in sockets):
+        if not all(worker.is_alive() for worker in workers):
+            raise RuntimeError('A worker process exited.')
+        if time.monotonic() > deadline:
+            raise RuntimeError('Workers did not start in %s seconds.' % WORKERS_START_TIMEOUT)
+        time.sleep(0.05)
+    return sockets, workers
+
+
+def forward_signal(signal_number: int, workers: list) -> None:
+    """Send a signal to the worker processes which are still running."""
+    for worker in workers:
+        if worker.is_alive():
+            os.kill(worker.pid, signal_number)
+
+
+@asyncio.coroutine
+async def init_dispatcher(loop, host: str, port: int, worker_sockets: list, workers: list):
+    """
+    Initialize the dispatcher forwarding requests to workers and return its application.
+
+    SIGUSR2 sent to the dispatcher is passed on to workers, toggling their profilers.
+    """
+    app = make_dispatcher_app(loop, worker_sockets)
+    loop.add_signal_handler(signal.SIGUSR2, forward_signal, signal.SIGUSR2, workers)
+    await loop.create_server(app.make_handler(), host, port)
+    print('HTTP server started at %s:%s with %d workers' % (host, port, len(worker_sockets)),
+          file=sys.stderr)
+    return app
 
 
 @click.command()
@@ -56,9 +236,35 @@ async def init(loop, host: str, port: int, secret_key: str, persistence: BasePer
 @click.option('-k', '--cookie-secret-key', type=str,
               help='Fernet key to encrypt cookies with. Must be 32 url-safe base64-encoded '
                    'bytes. Use `cryptography.fernet.Fernet.generate_key()` to generate.')
+@click.option('--persistence', 'persistence_uri', type=str,
+              help='Storage backend URI: memory:// (the default), memory:///path/to/journal/dir, '
+                   'sqlite:///path/to/db or redis://host:port/db.')
+@click.option('--game-ttl', type=float,
+              help='Seconds after the last access to remove a game after. Games are kept forever '
+                   'by default. Supported by the memory:// backends.')
+@click.option('--bus', 'bus_uri', type=str,
+              help='URI of the bus notifying other processes sharing the storage backend of game '
+                   'changes: memory:// (the default - no other processes), unix:///path/to/socket '
+                   'of a planningpoker-bus-broker or redis://host:port/db.')
+@click.option('--admin-token', type=str,
+              help='Bearer token granting access to admin endpoints, such as /admin/analytics. '
+                   'Admin endpoints are disabled by default.')
+@click.option('--json-codec', type=str,
+              help='JSON library to encode responses and decode requests with: auto (the '
+                   'default - the fastest one installed), orjson, simplejson or stdlib.')
+@click.option('--profile-file', type=str,
+              help='File to write reports of the request profiler to, rotated at 10 MB. The '
+                   'profiler is turned on and off with SIGUSR2 or /admin/profiler.')
+@click.option('--profile-every', type=int,
+              help='Profile one request in this many of each route (default: %d).'
+                   % PROFILE_EVERY)
+@click.option('-w', '--workers', type=int,
+              help='Number of worker processes to shard games among. With more than 1 (the '
+                   'default) a dispatcher process forwards requests to workers.')
 @click.option('-c', '--config', 'config_file', type=click.File('r'),
               help='Config file to fall back to if options are not provided.')
-def cli_entry(host, port, cookie_secret_key, config_file):
+def cli_entry(host, port, cookie_secret_key, persistence_uri, game_ttl, bus_uri, admin_token,
+              json_codec, profile_file, profile_every, workers, config_file):
     """
     Run the planningpoker web application.
 
@@ -68,6 +274,7 @@ def cli_entry(host, port, cookie_secret_key, config_file):
         if host is None or port is None or cookie_secret_key is None:
             print('When no config is provided, all options must be passed.', file=sys.stderr)
             exit(1)
+        config = {}
     else:
         try:
             config = load(config_file)
@@ -87,12 +294,63 @@ def cli_entry(host, port, cookie_secret_key, config_file):
         print('Key not found in config: %r' % key, file=sys.stderr)
         exit(1)
 
+    if persistence_uri is None:
+        persistence_uri = config.get('persistence', DEFAULT_PERSISTENCE_URI)
+    if game_ttl is None:
+        game_ttl = config.get('game_ttl')
+    if bus_uri is None:
+        bus_uri = config.get('bus', DEFAULT_BUS_URI)
+    if admin_token is None:
+        admin_token = config.get('admin_token')
+    if json_codec is None:
+        json_codec = config.get('json_codec', AUTO_CODEC)
+    if profile_file is None:
+        profile_file = config.get('profile_file')
+    if profile_every is None:
+        profile_every = config.get('profile_every', PROFILE_EVERY)
+    if workers is None:
+        workers = config.get('workers', 1)
+
     cookie_secret_bytes = base64.urlsafe_b64decode(cookie_secret_key.encode())
+    try:
+        set_codec(get_codec(json_codec))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    if workers > 1:
+        try:
+            worker_sockets, processes = start_workers(workers, cookie_secret_bytes, persistence_uri,
+                                                      game_ttl, bus_uri, admin_token,
+                                                      json_codec, profile_file, profile_every)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            exit(1)
+        loop = asyncio.get_event_loop()
+        app = loop.run_until_complete(
+            init_dispatcher(loop, host, port, worker_sockets, processes))
+        serve_until_terminated(loop, app)
+        # Wait for workers to shut down - daemon processes are killed when the dispatcher exits.
+        forward_signal(signal.SIGTERM, processes)
+        for process in processes:
+            process.join()
+        return
 
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(init(
+    try:
+        persistence = backend_from_uri(persistence_uri, game_ttl=game_ttl)
+        bus = bus_from_uri(loop, bus_uri)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    app = loop.run_until_complete(init(
         loop,
         host, port, cookie_secret_bytes,
-        persistence=ProcessMemoryPersistence()
+        persistence=persistence,
+        bus=bus,
+        admin_token=admin_token,
+        profile_file=profile_file,
+        profile_every=profile_every
     ))
-    loop.run_forever()
+    serve_until_terminated(loop, app)
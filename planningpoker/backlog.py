@@ -0,0 +1,202 @@
+"""
+Reading round names from uploaded backlogs.
+
+A backlog is streamed line by line: CSV with a header row naming the ``round_name`` column, or
+NDJSON with a JSON string or an object with the ``round_name`` key on each line. Other CSV columns
+and object keys - ticket metadata - are allowed but not kept, so memory use depends only on
+the names, never on the size of the upload.
+"""
+import csv
+
+import simplejson
+
+# The most rounds a single upload may create.
+MAX_IMPORTED_ROUNDS = 1000
+
+# The longest line of an upload, in bytes.
+MAX_LINE_LENGTH = 64 * 1024
+
+# Bytes of an upload read at a time.
+READ_CHUNK_SIZE = 16 * 1024
+
+CSV_CONTENT_TYPES = frozenset(['text/csv'])
+NDJSON_CONTENT_TYPES = frozenset(['application/x-ndjson', 'application/ndjson'])
+
+
+class BacklogError(ValueError):
+
+    """A backlog that cannot be imported."""
+
+    def __init__(self, line_number: int, reason: str):
+        """
+        Store the reason.
+
+        :param line_number: number of the offending line, counted from 1
+        :param reason: what is wrong with the line
+        """
+        super().__init__(line_number, reason)
+        self.line_number = line_number
+        self.reason = reason
+
+    def __str__(self):
+        """String representation."""
+        return 'Line %d: %s' % (self.line_number, self.reason)
+
+
+def parse_ndjson_line(line: str) -> (str, None):
+    """
+    Return the round name from an NDJSON line, or None for a blank line.
+
+    :raise ValueError: if the line is not a JSON string or an object with a ``round_name``
+    """
+    if not line.strip():
+        return None
+    item = simplejson.loads(line)
+    if isinstance(item, dict):
+        try:
+            return item['round_name']
+        except KeyError:
+            raise ValueError('No round_name.')
+    return item
+
+
+class CSVParser:
+
+    """Returns round names from consecutive CSV lines, the first one being the header."""
+
+    def __init__(self):
+        """Expect the header."""
+        self._name_column = None
+
+    def __call__(self, line: str) -> (str, None):
+        """
+        Return the round name from a CSV line, or None for the header or a blank line.
+
+        Quoted values spanning many lines are not supported.
+
+        :raise ValueError: if the line cannot be parsed or there is no ``round_name`` column
+        """
+        if not line.strip():
+            return None
+        try:
+            [row] = csv.reader([line], strict=True)
+        except csv.Error as e:
+            raise ValueError(str(e))
+
+        if self._name_column is None:
+            try:
+                self._name_column = [column.strip() for column in row].index('round_name')
+            except ValueError:
+                raise ValueError('The header has no round_name column.')
+            return None
+
+        try:
+            return row[self._name_column]
+        except IndexError:
+            raise ValueError('No round_name.')
+
+
+def line_parser(content_type: str):
+    """
+    Return a function taking consecutive lines of an upload and returning round names or None.
+
+    :return: the parser or None if the content type is not supported
+    """
+    if content_type in CSV_CONTENT_TYPES:
+        return CSVParser()
+    if content_type in NDJSON_CONTENT_TYPES:
+        return parse_ndjson_line
+    return None
+
+
+class LineReader:
+
+    """
+    Splits a stream into lines, reading it in chunks.
+
+    ``readline`` of aiohttp streams buffers a line whatever its length; this reader buffers at most
+    ``max_length`` bytes of a line and a chunk.
+    """
+
+    def __init__(self, stream, max_length: int = MAX_LINE_LENGTH,
+                 chunk_size: int = READ_CHUNK_SIZE):
+        """
+        Start at the beginning of the stream.
+
+        :param stream: a stream with a ``read`` coroutine taking the most bytes to return, e.g.
+            ``request.content``
+        :param max_length: the longest line to return whole, in bytes
+        :param chunk_size: the most bytes to read from the stream at a time
+        """
+        self._stream = stream
+        self._max_length = max_length
+        self._chunk_size = chunk_size
+        self._buffer = b''
+        self._position = 0  # Where the next line starts in the buffer.
+        self._eof = False
+
+    async def readline(self) -> bytes:
+        """
+        Return the next line, with its line break, or an empty bytes object at the end.
+
+        A line longer than ``max_length`` is cut after ``max_length + 1`` bytes, as soon as they
+        are read - enough to tell it's too long.
+        """
+        while True:
+            limit = self._position + self._max_length + 1
+            newline = self._buffer.find(b'\n', self._position, limit)
+            if newline != -1:
+                return self._take(newline + 1)
+            if len(self._buffer) >= limit or self._eof:
+                return self._take(min(len(self._buffer), limit))
+            chunk = await self._stream.read(self._chunk_size)
+            self._eof = not chunk
+            self._buffer = self._buffer[self._position:] + chunk
+            self._position = 0
+
+    def _take(self, end: int) -> bytes:
+        """Return the buffered bytes from the start of the line to ``end`` and move past them."""
+        line = self._buffer[self._position:end]
+        self._position = end
+        return line
+
+
+async def read_round_names(stream, parse_line, max_rounds: int = MAX_IMPORTED_ROUNDS) -> list:
+    """
+    Read round names from a stream of UTF-8 encoded lines.
+
+    :param stream: a stream with a ``read`` coroutine, e.g. ``request.content`` - see
+        ``LineReader``
+    :param parse_line: a function returned by ``line_parser``
+    :param max_rounds: the most names to accept
+    :return: round names, in order
+    :raise BacklogError: if a line is invalid or there are too many names
+    """
+    lines = LineReader(stream)
+    names = []
+    line_number = 0
+    while True:
+        line = await lines.readline()
+        if not line:
+            return names
+        line_number += 1
+        if len(line) > MAX_LINE_LENGTH:
+            raise BacklogError(line_number, 'The line is longer than %d bytes.' % MAX_LINE_LENGTH)
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            raise BacklogError(line_number, 'The line is not valid UTF-8.')
+        if line_number == 1:
+            text = text.lstrip('\ufeff')  # Byte order mark, as written by spreadsheets.
+
+        try:
+            name = parse_line(text.rstrip('\r\n'))
+        except ValueError as e:
+            raise BacklogError(line_number, str(e))
+        if name is None:
+            continue
+        if not isinstance(name, str) or name == '':
+            raise BacklogError(line_number, 'The round name must be a non-empty string.')
+        if len(names) == max_rounds:
+            raise BacklogError(line_number, 'Cannot import more than %d rounds.' % max_rounds)
+        names.append(name)
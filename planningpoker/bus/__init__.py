@@ -0,0 +1,10 @@
+"""
+Notification buses, telling every process serving games about changes made by any of them.
+
+A persistence adapter publishes the new version of a game after each mutation it makes and listens
+for versions published by others, waking its own clients waiting for the game to change.
+"""
+from planningpoker.bus.base import BaseBus
+from planningpoker.bus.memory import MemoryBus
+from planningpoker.bus.unix import UnixBus, UnixBusBroker
+from planningpoker.bus.uri import bus_from_uri, DEFAULT_BUS_URI
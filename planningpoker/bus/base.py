@@ -0,0 +1,57 @@
+"""Base for game change notification buses."""
+import abc
+import asyncio
+
+
+def encode_change(game_id: str, version: int) -> bytes:
+    """Encode a change notification as a line of the wire format shared by network buses."""
+    return ('%s %d\n' % (game_id, version)).encode()
+
+
+def decode_change(line: bytes) -> (str, int):
+    """
+    Decode a change notification line, with or without its line feed.
+
+    :raise ValueError: if the line is malformed
+    """
+    game_id, version = line.decode().split()
+    return game_id, int(version)
+
+
+class BaseBus(abc.ABC):
+
+    """
+    Base notification bus, carrying ``(game_id, version)`` of every game change between processes.
+
+    Every notification published by any process sharing the bus - the publishing one included - is
+    delivered to listeners of every process. Delivery is best-effort: notifications published while
+    a process is disconnected from the bus are lost to it.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        """Start with no listeners."""
+        self._loop = loop
+        self._listeners = []
+
+    def add_listener(self, listener) -> None:
+        """
+        Call a function with ``game_id`` and ``version`` of every delivered notification.
+
+        Listeners are called on the event loop and must not block.
+        """
+        self._listeners.append(listener)
+
+    def _deliver(self, game_id: str, version: int) -> None:
+        """Pass a notification to the listeners."""
+        for listener in self._listeners:
+            listener(game_id, version)
+
+    async def start(self) -> None:
+        """Connect to the bus, if there is anything to connect to."""
+
+    @abc.abstractmethod
+    def publish(self, game_id: str, version: int) -> None:
+        """Announce a new version of a game, without waiting for it to be delivered."""
+
+    def close(self) -> None:
+        """Disconnect from the bus."""
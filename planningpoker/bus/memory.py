@@ -0,0 +1,11 @@
+"""Bus delivering notifications within the process."""
+from planningpoker.bus.base import BaseBus
+
+
+class MemoryBus(BaseBus):
+
+    """A bus for a single process - or for several persistence adapters sharing a loop."""
+
+    def publish(self, game_id: str, version: int) -> None:
+        """Deliver a notification on the next iteration of the loop."""
+        self._loop.call_soon(self._deliver, game_id, version)
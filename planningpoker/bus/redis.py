@@ -0,0 +1,69 @@
+"""
+Bus over Redis pub/sub, for processes on any number of hosts.
+
+Requires the ``redis`` package (``pip install planningpoker[redis]``).
+"""
+import asyncio
+
+from redis import StrictRedis
+
+from planningpoker.bus.base import BaseBus, encode_change, decode_change
+
+DEFAULT_CHANNEL = 'planningpoker:changes'
+
+# Seconds the listening thread waits for a message before checking if it should stop.
+LISTEN_TIMEOUT = 1.0
+
+
+class RedisBus(BaseBus):
+
+    """
+    A bus publishing notifications to a Redis channel.
+
+    The client is synchronous: publishing is done in the loop's default executor and listening in
+    a thread of its own, which hands notifications over to the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, redis: StrictRedis,
+                 channel: str = DEFAULT_CHANNEL):
+        """
+        Prepare the bus.
+
+        :param redis: client of the Redis server to publish notifications through
+        :param channel: the channel to publish notifications to
+        """
+        super().__init__(loop)
+        self._redis = redis
+        self._channel = channel
+        self._listener_thread = None
+
+    @classmethod
+    def from_url(cls, loop: asyncio.AbstractEventLoop, url: str) -> 'RedisBus':
+        """Create a bus using the Redis server at ``redis://[:password@]host[:port][/db]``."""
+        return cls(loop, StrictRedis.from_url(url))
+
+    async def start(self) -> None:
+        """Subscribe to the channel and start listening."""
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._loop.run_in_executor(
+            None, lambda: pubsub.subscribe(**{self._channel: self._message_received}))
+        self._listener_thread = pubsub.run_in_thread(sleep_time=LISTEN_TIMEOUT)
+
+    def _message_received(self, message: dict) -> None:
+        """Hand a notification over to the loop - called in the listening thread."""
+        try:
+            game_id, version = decode_change(message['data'])
+        except ValueError:
+            return
+        self._loop.call_soon_threadsafe(self._deliver, game_id, version)
+
+    def publish(self, game_id: str, version: int) -> None:
+        """Publish a notification in the background."""
+        self._loop.run_in_executor(None, self._redis.publish, self._channel,
+                                   encode_change(game_id, version))
+
+    def close(self) -> None:
+        """Stop listening."""
+        if self._listener_thread is not None:
+            self._listener_thread.stop()
+            self._listener_thread = None
@@ -0,0 +1,196 @@
+"""
+Bus relayed by a broker listening on a Unix socket, for processes sharing a host.
+
+Every process connects to the broker and writes its notifications, one line each, to the socket.
+The broker copies every complete line it reads to all connected processes, the writer included.
+
+Run the broker with ``planningpoker-bus-broker /path/to/bus.sock``.
+"""
+import sys
+import abc
+import asyncio
+import logging
+
+import click
+
+from planningpoker.bus.base import BaseBus, encode_change, decode_change
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts to (re)connect to the broker.
+RECONNECT_INTERVAL = 1.0
+
+
+class LineProtocol(asyncio.Protocol, metaclass=abc.ABCMeta):
+
+    """Splits incoming data into lines and passes complete ones, as a single chunk, on."""
+
+    def __init__(self):
+        """Start with nothing received."""
+        self.transport = None
+        self._buffer = b''
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        """Keep the transport."""
+        self.transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        """Pass on all complete lines received so far."""
+        data = self._buffer + data
+        end = data.rfind(b'\n') + 1
+        self._buffer = data[end:]
+        if end:
+            self.lines_received(data[:end])
+
+    @abc.abstractmethod
+    def lines_received(self, lines: bytes) -> None:
+        """Handle a chunk of line feed-terminated lines."""
+
+
+class BrokerProtocol(LineProtocol):
+
+    """A process connected to the broker."""
+
+    def __init__(self, broker: 'UnixBusBroker'):
+        """Remember the broker."""
+        super().__init__()
+        self._broker = broker
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        """Start relaying notifications to the process."""
+        super().connection_made(transport)
+        self._broker.connections.add(self)
+
+    def connection_lost(self, exc: (Exception, None)) -> None:
+        """Stop relaying notifications to the process."""
+        self._broker.connections.discard(self)
+
+    def lines_received(self, lines: bytes) -> None:
+        """Relay notifications to every connected process."""
+        for connection in self._broker.connections:
+            connection.transport.write(lines)
+
+
+class UnixBusBroker:
+
+    """Relays notifications among processes connected to a Unix socket."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, path: str):
+        """
+        Prepare the broker.
+
+        :param path: path of the socket to listen on
+        """
+        self._loop = loop
+        self._path = path
+        self._server = None
+        self.connections = set()
+
+    async def start(self) -> None:
+        """Start listening."""
+        self._server = await self._loop.create_unix_server(lambda: BrokerProtocol(self),
+                                                           self._path)
+
+    def close(self) -> None:
+        """Stop listening and disconnect all processes."""
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self.connections):
+            connection.transport.close()
+
+
+class ClientProtocol(LineProtocol):
+
+    """Connection of a ``UnixBus`` to the broker."""
+
+    def __init__(self, bus: 'UnixBus'):
+        """Remember the bus."""
+        super().__init__()
+        self._bus = bus
+
+    def connection_lost(self, exc: (Exception, None)) -> None:
+        """Let the bus reconnect."""
+        self._bus._connection_lost()
+
+    def lines_received(self, lines: bytes) -> None:
+        """Deliver notifications, skipping malformed ones."""
+        for line in lines.splitlines():
+            try:
+                game_id, version = decode_change(line)
+            except ValueError:
+                continue
+            self._bus._deliver(game_id, version)
+
+
+class UnixBus(BaseBus):
+
+    """
+    A bus for processes on one host, connected to a ``UnixBusBroker``.
+
+    Reconnects to the broker every ``RECONNECT_INTERVAL`` seconds until it succeeds, so processes
+    may start before the broker and survive its restarts.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, path: str):
+        """
+        Prepare the bus.
+
+        :param path: path of the broker's socket
+        """
+        super().__init__(loop)
+        self._path = path
+        self._protocol = None
+        self._reconnect_handle = None
+        self._closed = False
+
+    async def start(self) -> None:
+        """Connect to the broker or schedule reconnecting if it does not listen yet."""
+        try:
+            _, self._protocol = await self._loop.create_unix_connection(
+                lambda: ClientProtocol(self), self._path)
+        except OSError as e:
+            logger.warning('Cannot connect to the bus broker at %s: %s', self._path, e)
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        """Try connecting again later, unless closed."""
+        if not self._closed:
+            self._reconnect_handle = self._loop.call_later(RECONNECT_INTERVAL, self._reconnect)
+
+    def _reconnect(self) -> None:
+        """Start connecting in the background."""
+        self._reconnect_handle = None
+        self._loop.create_task(self.start())
+
+    def _connection_lost(self) -> None:
+        """Forget the connection and reconnect."""
+        self._protocol = None
+        self._schedule_reconnect()
+
+    def publish(self, game_id: str, version: int) -> None:
+        """Send a notification to the broker; it is lost if not connected."""
+        if self._protocol is not None:
+            self._protocol.transport.write(encode_change(game_id, version))
+
+    def close(self) -> None:
+        """Disconnect and stop reconnecting."""
+        self._closed = True
+        if self._reconnect_handle is not None:
+            self._reconnect_handle.cancel()
+            self._reconnect_handle = None
+        if self._protocol is not None:
+            self._protocol.transport.close()
+
+
+@click.command()
+@click.argument('socket_path', type=click.Path())
+def broker_entry(socket_path):
+    """Run the broker of the unix:// notification bus, listening on SOCKET_PATH."""
+    loop = asyncio.get_event_loop()
+    broker = UnixBusBroker(loop, socket_path)
+    loop.run_until_complete(broker.start())
+    print('Bus broker listening on %s' % socket_path, file=sys.stderr)
+    try:
+        loop.run_forever()
+    finally:
+        broker.close()
@@ -0,0 +1,41 @@
+"""Notification bus selection by URI."""
+import asyncio
+from urllib.parse import urlsplit
+
+from planningpoker.bus.base import BaseBus
+from planningpoker.bus.memory import MemoryBus
+from planningpoker.bus.unix import UnixBus
+
+DEFAULT_BUS_URI = 'memory://'
+
+
+def bus_from_uri(loop: asyncio.AbstractEventLoop, uri: str) -> BaseBus:
+    """
+    Instantiate the notification bus described by a URI.
+
+    Supported URIs:
+        - ``memory://`` - ``MemoryBus``, notifying only the process itself
+        - ``unix:///relative/path``, ``unix:////absolute/path`` - ``UnixBus`` connecting to
+          the broker listening on the socket
+        - ``redis://[:password@]host[:port][/db]`` - ``RedisBus``, requires the ``redis`` package
+
+    :raise ValueError: if the URI does not describe a supported bus
+    """
+    scheme = urlsplit(uri).scheme
+
+    if uri in ('memory:', 'memory://'):
+        return MemoryBus(loop)
+
+    if scheme == 'unix':
+        prefix = 'unix:///'
+        path = uri[len(prefix):]
+        if not uri.startswith(prefix) or path == '':
+            raise ValueError('unix URIs must have the form %spath, got %r.' % (prefix, uri))
+        return UnixBus(loop, path)
+
+    if scheme == 'redis':
+        # Optional dependency.
+        from planningpoker.bus.redis import RedisBus
+        return RedisBus.from_url(loop, uri)
+
+    raise ValueError('Unsupported bus URI: %r.' % uri)
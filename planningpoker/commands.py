@@ -0,0 +1,183 @@
+"""
+Game commands, shared by the HTTP views and the WebSocket command channel.
+
+A command validates its parameters, checks the client's permissions and mutates the game. Failures
+are reported with ``CommandError``, carrying the message and the HTTP status the views respond
+with - so a command means the same whichever way it arrives.
+"""
+from decimal import Decimal
+
+from planningpoker.cards import coerce_card
+from planningpoker.persistence import BaseAsyncPersistence
+from planningpoker.persistence.exceptions import (
+    RoundExists, NoSuchGame, NoSuchRound, RoundFinalized, NoActivePoll, PlayerNotInGame,
+    IllegalEstimation
+)
+
+
+class CommandError(Exception):
+
+    """A command rejected, with the reason for the client."""
+
+    def __init__(self, message: str, status: int):
+        """
+        Store the reason.
+
+        :param message: error message for the client
+        :param status: HTTP status code corresponding to the error
+        """
+        super().__init__(message, status)
+        self.message = message
+        self.status = status
+
+
+async def ensure_moderator(persistence: BaseAsyncPersistence, game_id: str,
+                           client_id: (str, None)) -> None:
+    """
+    Check if the client is the moderator of the game.
+
+    :raise CommandError: if it is not
+    """
+    if client_id is None or not await persistence.client_owns_game(game_id, client_id):
+        raise CommandError('The user is not the moderator of this game.', 403)
+
+
+def get_round_name(params: dict, missing_message: str = 'Must specify the round.') -> str:
+    """
+    Return the name of the round a command refers to.
+
+    :param missing_message: the error message if there is no name
+    :raise CommandError: if there is none or it's not a string
+    """
+    try:
+        round_name = params['round_name']
+    except KeyError:
+        raise CommandError(missing_message, 400)
+    if not isinstance(round_name, str):
+        raise CommandError('The round name must be a string.', 400)
+    return round_name
+
+
+def get_vote(params: dict) -> (str, Decimal):
+    """
+    Return the card a vote is cast for.
+
+    :raise CommandError: if there is none or it's not a string or a number
+    """
+    try:
+        vote = params['vote']
+    except KeyError:
+        raise CommandError('Must provide an estimation.', 400)
+    if not isinstance(vote, (str, int, float, Decimal)) or isinstance(vote, bool):
+        raise CommandError('The estimation voted for is invalid.', 400)
+    return coerce_card(vote)
+
+
+async def add_round(persistence: BaseAsyncPersistence, game_id: str, client_id: (str, None),
+                    params: dict, *, owner_verified: bool = False) -> None:
+    """
+    Add a round named ``params['round_name']`` to the game.
+
+    :param owner_verified: skip checking if the client is the moderator, as it has been checked
+    """
+    round_name = get_round_name(params, 'Must specify the name.')
+    if len(round_name) < 1:
+        raise CommandError('The name must not be empty.', 400)
+
+    if not owner_verified:
+        await ensure_moderator(persistence, game_id, client_id)
+
+    try:
+        await persistence.add_round(game_id, round_name)
+    except RoundExists:
+        raise CommandError('Round with this name already exists.', 409)
+    # No point to catch NoSuchGame because we cannot sensibly handle situation when there is a game
+    # in a session but not in the storage. Let's better 500.
+
+
+async def add_poll(persistence: BaseAsyncPersistence, game_id: str, client_id: (str, None),
+                   params: dict, *, owner_verified: bool = False) -> None:
+    """Add a poll to the round ``params['round_name']``; ``owner_verified`` as in ``add_round``."""
+    round_name = get_round_name(params)
+    if not owner_verified:
+        await ensure_moderator(persistence, game_id, client_id)
+
+    try:
+        await persistence.add_poll(game_id, round_name)
+    except NoSuchRound:
+        raise CommandError('Round does not exist.', 404)
+    except RoundFinalized:
+        raise CommandError('This round is finalized.', 409)
+
+
+async def finalize_round(persistence: BaseAsyncPersistence, game_id: str,
+                         client_id: (str, None), params: dict, *,
+                         owner_verified: bool = False) -> None:
+    """Finalize the round ``params['round_name']``; ``owner_verified`` as in ``add_round``."""
+    round_name = get_round_name(params)
+    if not owner_verified:
+        await ensure_moderator(persistence, game_id, client_id)
+
+    try:
+        await persistence.finalize_round(game_id, round_name)
+    except NoSuchRound:
+        raise CommandError('Round does not exist.', 404)
+    except NoActivePoll:
+        raise CommandError('There is no active poll in this round.', 404)
+    except RoundFinalized:
+        raise CommandError('This round has already been finalized.', 409)
+
+
+async def cast_vote(persistence: BaseAsyncPersistence, game_id: str, client_id: (str, None),
+                    params: dict) -> None:
+    """Vote for ``params['vote']`` in the active poll of the round ``params['round_name']``."""
+    round_name = get_round_name(params)
+    vote = get_vote(params)
+
+    try:
+        await persistence.cast_vote(game_id, round_name, client_id, vote)
+    except NoSuchGame:
+        raise CommandError('There is no such game.', 404)
+    except NoSuchRound:
+        raise CommandError('There is no such round in the game.', 404)
+    except NoActivePoll:
+        raise CommandError('There is no active poll in this round.', 404)
+    except RoundFinalized:
+        raise CommandError('The round is finalized.', 409)
+    except IllegalEstimation:
+        raise CommandError('The estimation voted for is invalid.', 400)
+    except PlayerNotInGame:
+        raise CommandError('Cannot vote until the name is provided.', 401)
+
+
+# Commands of the game moderator, by name.
+MODERATOR_COMMANDS = {
+    'add_round': add_round,
+    'add_poll': add_poll,
+    'finalize_round': finalize_round,
+}
+
+# Commands accepted over the WebSocket command channel, by name.
+COMMANDS = dict(MODERATOR_COMMANDS, cast_vote=cast_vote)
+
+
+async def execute(persistence: BaseAsyncPersistence, game_id: str, client_id: (str, None),
+                  params: dict, available: dict = COMMANDS, **options) -> dict:
+    """
+    Run the command named by ``params['command']`` with the rest of ``params``.
+
+    :param available: commands to choose from, by name
+    :param options: keyword arguments to pass to the command
+    :return: the HTTP status corresponding to the result under the 'status' key and, on failure,
+        the error message under the 'error' key
+    """
+    command_name = params.get('command')
+    command = available.get(command_name) if isinstance(command_name, str) else None
+    if command is None:
+        return {'status': 400, 'error': 'Unknown command.'}
+
+    try:
+        await command(persistence, game_id, client_id, params, **options)
+    except CommandError as e:
+        return {'status': e.status, 'error': e.message}
+    return {'status': 200}
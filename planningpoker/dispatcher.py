@@ -0,0 +1,269 @@
+"""
+Front dispatcher of the multi-process deployment.
+
+Accepts all HTTP traffic and forwards each request over a Unix socket to the worker process owning
+the game from the request path. Requests not bound to a game are spread among workers
+round-robin. Request and response bodies are streamed and WebSockets are relayed message by
+message.
+
+``/status`` and ``/metrics`` add up the responses of all workers and ``/admin/profiler`` is sent
+to every worker. ``/admin/analytics`` merges the analytics columns of the games each worker owns
+and analyzes them in the dispatcher.
+"""
+import asyncio
+import itertools
+from contextlib import contextmanager
+
+import aiohttp
+from aiohttp import web, hdrs
+from aiohttp.multidict import CIMultiDict
+
+from planningpoker.json import json_response, loads_or_empty
+from planningpoker.metrics import CONTENT_TYPE, render_gauges, sum_metrics
+from planningpoker.sharding import path_shard
+
+# Headers describing a single connection rather than the request or response.
+HOP_BY_HOP_HEADERS = frozenset(h.upper() for h in (
+    hdrs.CONNECTION, hdrs.KEEP_ALIVE, hdrs.PROXY_AUTHENTICATE, hdrs.PROXY_AUTHORIZATION, hdrs.TE,
+    hdrs.TRAILER, hdrs.TRANSFER_ENCODING, hdrs.UPGRADE, hdrs.CONTENT_LENGTH,
+    hdrs.CONTENT_ENCODING,
+))
+
+
+class Dispatcher:
+
+    """
+    Forwards requests to workers listening on Unix sockets.
+
+    Connections to every worker are pooled by a connector of its own, but every request is sent
+    with a new client session: sessions keep cookies set by responses and send them with later
+    requests, overriding the cookies of whichever client made those.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, worker_sockets: list):
+        """
+        Create a connector per worker.
+
+        :param worker_sockets: paths of the workers' Unix sockets, in the order of shard indices
+        """
+        self._loop = loop
+        self._worker_sockets = worker_sockets
+        self._connectors = [aiohttp.UnixConnector(path, loop=loop) for path in worker_sockets]
+        self._round_robin = itertools.cycle(range(len(worker_sockets)))
+
+    def close(self) -> None:
+        """Close connections to workers."""
+        for connector in self._connectors:
+            connector.close()
+
+    @contextmanager
+    def _session(self, shard: int):
+        """Return a client session for a single request to a worker, using its connector."""
+        session = aiohttp.ClientSession(connector=self._connectors[shard], loop=self._loop)
+        try:
+            yield session
+        finally:
+            session.detach()  # Leaves the connector, with the response's connection, open.
+
+    def _shard(self, request: web.Request) -> int:
+        """Pick the worker for a request."""
+        shard = path_shard(request.path, len(self._connectors))
+        return next(self._round_robin) if shard is None else shard
+
+    async def forward(self, request: web.Request) -> web.StreamResponse:
+        """Forward a request to its worker and stream the response back."""
+        shard = self._shard(request)
+        if request.headers.get(hdrs.UPGRADE, '').lower() == 'websocket':
+            return await self.forward_websocket(request, shard)
+
+        headers = CIMultiDict((name, value) for name, value in request.headers.items()
+                              if name.upper() not in HOP_BY_HOP_HEADERS)
+        try:
+            with self._session(shard) as session:
+                # The body is streamed, so e.g. a backlog upload is never held in memory whole.
+                upstream = await session.request(
+                    request.method, 'http://worker' + request.path_qs,
+                    data=request.content if request.has_body else None,
+                    chunked=True if request.has_body else None,
+                    headers=headers, allow_redirects=False)
+        except aiohttp.ClientError:
+            return json_response({'error': 'The worker is unavailable.'}, status=502)
+
+        try:
+            response = web.StreamResponse(
+                status=upstream.status, reason=upstream.reason,
+                headers=CIMultiDict((name, value) for name, value in upstream.headers.items()
+                                    if name.upper() not in HOP_BY_HOP_HEADERS))
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            while True:
+                chunk = await upstream.content.readany()
+                if not chunk:
+                    break
+                response.write(chunk)
+                await response.drain()
+            await response.write_eof()
+        except Exception:
+            # E.g. the client went away in the middle of a stream - drop the worker connection.
+            upstream.close()
+            raise
+        await upstream.release()
+        return response
+
+    async def forward_websocket(self, request: web.Request, shard: int) -> web.StreamResponse:
+        """Open a WebSocket to the worker and relay messages both ways until either side closes."""
+        # Client sessions of 0.21 cannot pass headers to ``ws_connect``, so every relayed socket
+        # gets a session of its own, sending the client's cookies.
+        headers = {}
+        if hdrs.COOKIE in request.headers:
+            headers[hdrs.COOKIE] = request.headers[hdrs.COOKIE]
+        session = aiohttp.ClientSession(
+            connector=aiohttp.UnixConnector(self._worker_sockets[shard], loop=self._loop),
+            headers=headers, loop=self._loop)
+        try:
+            try:
+                upstream = await session.ws_connect('http://worker' + request.path_qs)
+            except aiohttp.WSServerHandshakeError as e:
+                return json_response({'error': 'The worker refused the WebSocket.'}, status=e.code)
+            except aiohttp.ClientError:
+                return json_response({'error': 'The worker is unavailable.'}, status=502)
+
+            downstream = web.WebSocketResponse()
+            await downstream.prepare(request)
+            relays = [self._loop.create_task(relay(upstream, downstream)),
+                      self._loop.create_task(relay(downstream, upstream))]
+            try:
+                await asyncio.wait(relays, loop=self._loop, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in relays:
+                    task.cancel()
+                await upstream.close()
+                await downstream.close()
+            return downstream
+        finally:
+            session.close()
+
+    async def _query_workers(self, path: str) -> list:
+        """
+        GET a path from every worker.
+
+        :return: bodies of the responses, in the order of shard indices; None for workers which
+            are down or fail to respond
+        """
+        texts = []
+        for shard in range(len(self._connectors)):
+            try:
+                with self._session(shard) as session:
+                    upstream = await session.get('http://worker' + path)
+                text = await upstream.text()
+            except aiohttp.ClientError:
+                text = None
+            else:
+                if upstream.status != 200:
+                    text = None
+            texts.append(text)
+        return texts
+
+    async def get_status(self, request: web.Request) -> web.Response:
+        """Respond with the sum of the status counters of workers, counting the unavailable ones."""
+        status = {'unavailable_workers': 0}
+        for text in await self._query_workers('/status'):
+            counters = loads_or_empty(text) if text is not None else None
+            if not isinstance(counters, dict):
+                status['unavailable_workers'] += 1
+                continue
+            for key, value in counters.items():
+                status[key] = status.get(key, 0) + value
+        return json_response(status)
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        """Respond with the sum of the metrics of workers, counting the unavailable ones."""
+        texts = await self._query_workers('/metrics')
+        available = [text for text in texts if text is not None]
+        unavailable = render_gauges({
+            'unavailable_workers': ('Worker processes not responding to the dispatcher.',
+                                    len(texts) - len(available)),
+        })
+        return web.Response(body=(sum_metrics(available) + '\n'.join(unavailable) + '\n').encode(),
+                            headers={'Content-Type': CONTENT_TYPE})
+
+    async def get_analytics(self, request: web.Request) -> web.Response:
+        """
+        Respond with analytics of the games of all workers.
+
+        Workers respond with the columns of the games of their shards, which are merged and
+        analyzed in the default executor. Analytics of some of the games would be misleading, so
+        an unavailable worker fails the request.
+        """
+        try:
+            from planningpoker import analytics
+        except ImportError:
+            return json_response({'error': 'Analytics require the numpy package.'}, status=501)
+
+        headers = {}
+        if hdrs.AUTHORIZATION in request.headers:
+            headers[hdrs.AUTHORIZATION] = request.headers[hdrs.AUTHORIZATION]
+        builder = analytics.ColumnsBuilder()
+        for shard in range(len(self._connectors)):
+            try:
+                with self._session(shard) as session:
+                    upstream = await session.get('http://worker/admin/analytics/columns',
+                                                 headers=headers)
+                text = await upstream.text()
+            except aiohttp.ClientError:
+                return json_response({'error': 'The worker is unavailable.'}, status=502)
+            if upstream.status != 200:
+                return json_response(loads_or_empty(text), status=upstream.status)
+            builder.merge(loads_or_empty(text))
+        report = await self._loop.run_in_executor(None, analytics.analyze, builder.build())
+        return json_response(report)
+
+    async def fan_out(self, request: web.Request) -> web.Response:
+        """
+        Forward a request to every worker, e.g. to turn the profilers of all of them on.
+
+        Responds with ``{"workers": [...]}`` - the JSON responses of workers in the order of shard
+        indices, None for the unavailable ones - or with the first error response of a worker.
+        """
+        headers = CIMultiDict((name, value) for name, value in request.headers.items()
+                              if name.upper() not in HOP_BY_HOP_HEADERS)
+        body = await request.read()
+        responses = []
+        for shard in range(len(self._connectors)):
+            try:
+                with self._session(shard) as session:
+                    upstream = await session.request(
+                        request.method, 'http://worker' + request.path_qs, data=body,
+                        headers=headers, allow_redirects=False)
+                text = await upstream.text()
+            except aiohttp.ClientError:
+                responses.append(None)
+                continue
+            if upstream.status != 200:
+                return json_response(loads_or_empty(text), status=upstream.status)
+            responses.append(loads_or_empty(text))
+        if all(response is None for response in responses):
+            return json_response({'error': 'The workers are unavailable.'}, status=502)
+        return json_response({'workers': responses})
+
+
+async def relay(source, target) -> None:
+    """Pass messages from one WebSocket to another until the source is closed."""
+    async for message in source:
+        if message.tp == aiohttp.MsgType.text:
+            target.send_str(message.data)
+        elif message.tp == aiohttp.MsgType.binary:
+            target.send_bytes(message.data)
+
+
+def make_dispatcher_app(loop: asyncio.AbstractEventLoop, worker_sockets: list) -> web.Application:
+    """Create the dispatcher application."""
+    dispatcher = Dispatcher(loop, worker_sockets)
+    app = web.Application(loop=loop)
+    app.router.add_route('GET', '/status', dispatcher.get_status)
+    app.router.add_route('GET', '/metrics', dispatcher.get_metrics)
+    app.router.add_route('GET', '/admin/analytics', dispatcher.get_analytics)
+    app.router.add_route('*', '/admin/profiler', dispatcher.fan_out)
+    app.router.add_route('*', '/{path:.*}', dispatcher.forward)
+    app.on_shutdown.append(lambda app: dispatcher.close())
+    return app
@@ -0,0 +1,148 @@
+"""
+Request metrics in the Prometheus text exposition format.
+
+Every request is counted by the name of its route, the class of its response status and its
+latency. Counters of all routes are allocated up front, in fixed-size arrays, so recording a request
+allocates nothing and takes a few array increments. The event loop runs one middleware at a time,
+so the counters need no locks.
+
+Metrics are kept per process. The dispatcher of a multi-process deployment serves the sum of all
+workers' metrics.
+"""
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Upper bounds of latency histogram buckets, in seconds. Slower requests land in the +Inf bucket.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# Route name of requests not matching any named route, e.g. 404s.
+UNMATCHED_ROUTE = 'unmatched'
+
+# Value of the Content-Type header of the exposition format.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+PREFIX = 'planningpoker_'
+
+
+class RouteMetrics:
+
+    """Counters of requests matching a route."""
+
+    __slots__ = ('statuses', 'buckets', 'latency_sum')
+
+    def __init__(self, buckets_count: int):
+        """
+        Zero the counters.
+
+        :param buckets_count: the number of finite latency buckets
+        """
+        self.statuses = array('Q', [0]) * len(STATUS_CLASSES)  # Requests by status class.
+        # Requests by latency bucket, not cumulative; the last bucket is +Inf.
+        self.buckets = array('Q', [0]) * (buckets_count + 1)
+        self.latency_sum = 0.0
+
+
+class RequestMetrics:
+
+    """Counters of requests of all routes of an application."""
+
+    def __init__(self, route_names, buckets: tuple = LATENCY_BUCKETS):
+        """
+        Allocate counters of all routes.
+
+        :param route_names: names of the application routes
+        :param buckets: ascending upper bounds of latency buckets, in seconds
+        """
+        self.buckets = tuple(buckets)
+        self.routes = OrderedDict(
+            (name, RouteMetrics(len(self.buckets)))
+            for name in sorted(set(route_names) | {UNMATCHED_ROUTE}))
+
+    def observe(self, route_name: (str, None), status: int, latency: float) -> None:
+        """
+        Count a request.
+
+        :param route_name: the name of the matched route; None or an unknown name count as
+            ``UNMATCHED_ROUTE``
+        :param status: the response status code
+        :param latency: seconds it took to respond
+        """
+        route = self.routes.get(route_name)
+        if route is None:
+            route = self.routes[UNMATCHED_ROUTE]
+        route.statuses[min(max(status // 100, 1), len(STATUS_CLASSES)) - 1] += 1
+        route.buckets[bisect_left(self.buckets, latency)] += 1
+        route.latency_sum += latency
+
+    def render(self) -> list:
+        """Return lines of request counters in the Prometheus text format."""
+        requests = PREFIX + 'requests_total'
+        duration = PREFIX + 'request_duration_seconds'
+        lines = ['# HELP %s Requests by route and response status class.' % requests,
+                 '# TYPE %s counter' % requests]
+        for name, route in self.routes.items():
+            label = escape_label(name)
+            for status_class, count in zip(STATUS_CLASSES, route.statuses):
+                lines.append('%s{route="%s",status="%s"} %d' % (requests, label, status_class,
+                                                                count))
+
+        lines += ['# HELP %s Request latency by route.' % duration,
+                  '# TYPE %s histogram' % duration]
+        for name, route in self.routes.items():
+            label = escape_label(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), route.buckets):
+                cumulative += count
+                lines.append('%s_bucket{route="%s",le="%s"} %d' % (duration, label, bound,
+                                                                   cumulative))
+            lines.append('%s_sum{route="%s"} %r' % (duration, label, route.latency_sum))
+            lines.append('%s_count{route="%s"} %d' % (duration, label, cumulative))
+        return lines
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value of the text format."""
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render_gauges(gauges: dict) -> list:
+    """
+    Return lines of gauges in the Prometheus text format.
+
+    :param gauges: gauge names, without the prefix, to their help texts and values
+    """
+    lines = []
+    for name, (help_text, value) in gauges.items():
+        lines += ['# HELP %s%s %s' % (PREFIX, name, help_text),
+                  '# TYPE %s%s gauge' % (PREFIX, name),
+                  '%s%s %s' % (PREFIX, name, value)]
+    return lines
+
+
+def sum_metrics(texts: list) -> str:
+    """
+    Add up metrics of several processes, sample by sample.
+
+    :param texts: outputs of processes rendering the same metrics
+    :return: a text with the comments of the first process and samples summed over all of them
+    """
+    lines = []
+    samples = {}
+    for index, text in enumerate(texts):
+        for line in text.splitlines():
+            if not line or line.startswith('#'):
+                if index == 0:
+                    lines.append(line)
+                continue
+            series, value = line.rsplit(' ', 1)
+            value = float(value) if '.' in value or 'e' in value else int(value)
+            if series in samples:
+                samples[series] += value
+            else:
+                samples[series] = value
+                lines.append(series)
+    return ''.join('%s %r\n' % (line, samples[line]) if line in samples else line + '\n'
+                   for line in lines)
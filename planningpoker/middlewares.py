@@ -0,0 +1,62 @@
+"""Application middlewares."""
+import time
+
+from aiohttp import web
+
+from planningpoker.json import json_response
+from planningpoker.persistence.exceptions import GameExpired
+
+
+async def metrics_middleware(app, handler):
+    """
+    Count requests in ``app['metrics']`` by route, status class and latency.
+
+    Meant to be the outermost middleware, to time the others too. Streamed responses are timed
+    until the whole stream is sent. Exceptions other than HTTP ones count as 500s.
+    """
+    metrics = app['metrics']
+
+    async def middleware_handler(request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            metrics.observe(request.match_info.route.name, status, time.perf_counter() - start)
+
+    return middleware_handler
+
+
+async def profiling_middleware(app, handler):
+    """
+    Profile sampled requests with ``app['profiler']``, if it is enabled.
+
+    Meant to run outside the session middleware, so that decrypting session cookies is profiled.
+    """
+    profiler = app['profiler']
+    if not profiler.enabled:
+        return handler
+
+    async def middleware_handler(request):
+        route_name = request.match_info.route.name
+        if profiler.should_profile(route_name):
+            return await profiler.profile(route_name, handler, request)
+        return await handler(request)
+
+    return middleware_handler
+
+
+async def expired_games_middleware(app, handler):
+    """Respond with 410 Gone to requests for games removed for being idle, whatever the view."""
+    async def middleware_handler(request):
+        try:
+            return await handler(request)
+        except GameExpired:
+            return json_response({'error': 'The game has expired.'}, status=410)
+
+    return middleware_handler
@@ -5,3 +5,7 @@ Concrete implementations are to be injected into each view.
 """
 from planningpoker.persistence.base import BasePersistence
 from planningpoker.persistence.memory import ProcessMemoryPersistence
+from planningpoker.persistence.journal import JournaledMemoryPersistence
+from planningpoker.persistence.sqlite import SQLitePersistence
+from planningpoker.persistence.asynchronous import BaseAsyncPersistence, AsyncPersistenceAdapter
+from planningpoker.persistence.uri import backend_from_uri, DEFAULT_PERSISTENCE_URI
@@ -0,0 +1,321 @@
+"""
+Awaitable persistence API.
+
+Views talk to storage only through ``BaseAsyncPersistence`` so that a backend doing disk or network
+I/O cannot stall the event loop for every other game served by the process.
+"""
+import abc
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Executor
+
+from planningpoker.json import dump_to_json_bytes
+from planningpoker.bus import BaseBus, MemoryBus
+from planningpoker.persistence.base import BasePersistence
+from planningpoker.persistence.changes import GameChanges
+from planningpoker.persistence.exceptions import GameError
+
+
+class BaseAsyncPersistence(abc.ABC):
+
+    """
+    Base awaitable persistence backend.
+
+    Mirrors the ``planningpoker.persistence.base.BasePersistence`` contract: every method is
+    a coroutine taking the same arguments and raising the same exceptions as its synchronous
+    counterpart.
+
+    Implementations also provide ``epoch``, a string identifying the sequence of game versions
+    (see ``BasePersistence.get_epoch``), and ``changes``, a
+    ``planningpoker.persistence.changes.GameChanges`` notified of mutations - also the ones made
+    by other processes sharing the backend and a notification bus.
+    """
+
+    @abc.abstractmethod
+    async def games_count(self) -> int:
+        """Return games count."""
+
+    @abc.abstractmethod
+    async def game_ids(self) -> list:
+        """Return IDs of all games. See ``BasePersistence.game_ids``."""
+
+    @abc.abstractmethod
+    async def totals(self) -> dict:
+        """Return numbers of players, rounds and polls. See ``BasePersistence.totals``."""
+
+    @abc.abstractmethod
+    async def evicted_games_count(self) -> int:
+        """Return the number of games removed for being idle."""
+
+    @abc.abstractmethod
+    async def evict_expired_games(self) -> list:
+        """
+        Remove idle games and wake clients waiting for them to change.
+
+        See ``BasePersistence.evict_expired_games``.
+        """
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """Make all mutations durable and release the backend. See ``BasePersistence.close``."""
+
+    @abc.abstractmethod
+    async def add_game(self, game_id: str, moderator_id: str, moderator_name: str,
+                       cards: list) -> None:
+        """Register a game. See ``BasePersistence.add_game``."""
+
+    @abc.abstractmethod
+    async def add_player(self, game_id, player_id: str, player_name: str) -> None:
+        """Register a player in a game. See ``BasePersistence.add_player``."""
+
+    @abc.abstractmethod
+    async def add_round(self, game_id: str, round_name: str) -> None:
+        """Add next round to a game. See ``BasePersistence.add_round``."""
+
+    @abc.abstractmethod
+    async def add_rounds(self, game_id: str, round_names: list) -> None:
+        """Add many rounds to a game at once. See ``BasePersistence.add_rounds``."""
+
+    @abc.abstractmethod
+    async def add_poll(self, game_id: str, round_name: str) -> None:
+        """Create a poll in a round. See ``BasePersistence.add_poll``."""
+
+    @abc.abstractmethod
+    async def finalize_round(self, game_id: str, round_name: str) -> None:
+        """Finalize the round. See ``BasePersistence.finalize_round``."""
+
+    @abc.abstractmethod
+    async def cast_vote(self, game_id: str, round_name: str, voter_id: str,
+                        estimation: str) -> None:
+        """Cast a vote for the current poll. See ``BasePersistence.cast_vote``."""
+
+    @abc.abstractmethod
+    async def serialize_game(self, game_id: str) -> dict:
+        """Fetch and serialize all game's public data. See ``BasePersistence.serialize_game``."""
+
+    @abc.abstractmethod
+    async def export_votes(self, game_id: str):
+        """Return an iterator of all votes in the game. See ``BasePersistence.export_votes``."""
+
+    @abc.abstractmethod
+    async def finalized_polls(self, game_id: str):
+        """Return last polls of finalized rounds. See ``BasePersistence.finalized_polls``."""
+
+    @abc.abstractmethod
+    async def get_game_version(self, game_id: str) -> int:
+        """Return the version of a game. See ``BasePersistence.get_game_version``."""
+
+    @abc.abstractmethod
+    async def encode_game(self, game_id: str) -> (int, bytes):
+        """
+        Serialize a game and encode it to JSON.
+
+        :return: the version of the game and the UTF-8 encoded JSON of its public data
+        :raise NoSuchGame: if there is no game with such ID
+        """
+
+    @abc.abstractmethod
+    async def client_owns_game(self, game_id: str, client_id: str) -> bool:
+        """Check if a client moderates the game. See ``BasePersistence.client_owns_game``."""
+
+
+class AsyncPersistenceAdapter(BaseAsyncPersistence):
+
+    """
+    Awaitable facade over a synchronous ``BasePersistence`` backend.
+
+    Backends declaring themselves non-blocking (``blocking = False``) are called directly on the
+    event loop - hopping threads would only add latency to calls that never wait for I/O. Blocking
+    backends are called in ``executor``, so they must be safe to use from its threads.
+
+    Encoded games are cached along with their versions, so a game is serialized and encoded once
+    per change no matter how many requests read it. A cached entry is outdated as soon as
+    the backend reports a newer version - mutations made by other processes included.
+
+    ``epoch`` is the one of the backend, read once - when the adapter is created.
+
+    After every successful mutation made through the adapter, the new version of the game is
+    published on ``bus``. ``changes`` is notified of versions newer than the last one the adapter
+    knows of - published by this process or any other on the bus - waking clients waiting for
+    the game to change. Cached encodings of older versions are dropped.
+    """
+
+    def __init__(self, backend: BasePersistence, *, loop: asyncio.AbstractEventLoop = None,
+                 executor: Executor = None, bus: BaseBus = None,
+                 encoded_games_cache_size: int = 1024, known_versions_size: int = 4096):
+        """
+        Wrap a synchronous backend.
+
+        :param backend: the synchronous persistence backend to delegate to
+        :param loop: the event loop to run the blocking calls for; defaults to the current loop
+        :param executor: executor to run blocking backends' calls in; ``None`` means the loop's
+            default executor
+        :param bus: the started notification bus shared with other processes; ``None`` means
+            a ``MemoryBus`` of the adapter's own
+        :param encoded_games_cache_size: how many most recently read encoded games to keep
+        :param known_versions_size: how many most recently changed games to remember the last
+            version of
+        """
+        self.backend = backend
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._executor = executor
+        self._encoded_games = OrderedDict()
+        self._encoded_games_cache_size = encoded_games_cache_size
+        self.epoch = backend.get_epoch()
+        self.changes = GameChanges(self._loop)
+        self._known_versions = OrderedDict()
+        self._known_versions_size = known_versions_size
+        self.bus = bus if bus is not None else MemoryBus(self._loop)
+        self.bus.add_listener(self.game_changed)
+
+    async def _call(self, method, *args):
+        """Call a backend method without blocking the event loop."""
+        if not self.backend.blocking:
+            return method(*args)
+        return await self._loop.run_in_executor(self._executor, method, *args)
+
+    async def _mutate(self, method, game_id: str, *args):
+        """Call a backend method mutating a game and announce the new version of the game."""
+        result = await self._call(method, game_id, *args)
+        try:
+            version = await self.get_game_version(game_id)
+        except GameError:
+            return result  # Removed right after the mutation - nobody to tell about it.
+        # Not waiting for the bus to deliver the notification back to this process.
+        self.game_changed(game_id, version)
+        self.bus.publish(game_id, version)
+        return result
+
+    def game_changed(self, game_id: str, version: int) -> None:
+        """Take note of a version of a game and notify ``changes`` if it is a new one."""
+        known_version = self._known_versions.get(game_id)
+        if known_version is not None and known_version >= version:
+            return
+        self._known_versions[game_id] = version
+        self._known_versions.move_to_end(game_id)
+        if len(self._known_versions) > self._known_versions_size:
+            self._known_versions.popitem(last=False)
+
+        cached = self._encoded_games.get(game_id)
+        if cached is not None and cached[0] < version:
+            del self._encoded_games[game_id]
+        self.changes.notify(game_id)
+
+    def _get_games_count(self) -> int:
+        """Read the backend's ``games_count`` property - a callable to pass to an executor."""
+        return self.backend.games_count
+
+    async def games_count(self) -> int:
+        """Return games count."""
+        return await self._call(self._get_games_count)
+
+    async def game_ids(self) -> list:
+        """Return IDs of all games."""
+        return await self._call(self.backend.game_ids)
+
+    async def totals(self) -> dict:
+        """Return the numbers of players, rounds and polls of all games."""
+        return await self._call(self.backend.totals)
+
+    def _get_evicted_games_count(self) -> int:
+        """Read the backend's ``evicted_games_count`` - a callable to pass to an executor."""
+        return self.backend.evicted_games_count
+
+    async def evicted_games_count(self) -> int:
+        """Return the number of games removed for being idle."""
+        return await self._call(self._get_evicted_games_count)
+
+    async def evict_expired_games(self) -> list:
+        """
+        Remove games idle for longer than their time to live.
+
+        Clients waiting for the removed games to change are woken, to find out the games are gone.
+        """
+        evicted = await self._call(self.backend.evict_expired_games)
+        for game_id in evicted:
+            self._known_versions.pop(game_id, None)
+            self._encoded_games.pop(game_id, None)
+            self.changes.notify(game_id)
+        return evicted
+
+    async def close(self) -> None:
+        """Make all mutations durable and release the backend."""
+        await self._call(self.backend.close)
+
+    async def add_game(self, game_id: str, moderator_id: str, moderator_name: str,
+                       cards: list) -> None:
+        """Register a game."""
+        return await self._call(self.backend.add_game, game_id, moderator_id, moderator_name,
+                                cards)
+
+    async def add_player(self, game_id, player_id: str, player_name: str) -> None:
+        """Register a player in a game."""
+        return await self._mutate(self.backend.add_player, game_id, player_id, player_name)
+
+    async def add_round(self, game_id: str, round_name: str) -> None:
+        """Add next round to a game."""
+        return await self._mutate(self.backend.add_round, game_id, round_name)
+
+    async def add_rounds(self, game_id: str, round_names: list) -> None:
+        """Add many rounds to a game at once."""
+        return await self._mutate(self.backend.add_rounds, game_id, round_names)
+
+    async def add_poll(self, game_id: str, round_name: str) -> None:
+        """Create a poll in a round."""
+        return await self._mutate(self.backend.add_poll, game_id, round_name)
+
+    async def finalize_round(self, game_id: str, round_name: str) -> None:
+        """Accept the current poll and finalize the round."""
+        return await self._mutate(self.backend.finalize_round, game_id, round_name)
+
+    async def cast_vote(self, game_id: str, round_name: str, voter_id: str,
+                        estimation: str) -> None:
+        """Cast a vote for the current poll."""
+        return await self._mutate(self.backend.cast_vote, game_id, round_name, voter_id,
+                                  estimation)
+
+    async def serialize_game(self, game_id: str) -> dict:
+        """Fetch and serialize all game's public data."""
+        return await self._call(self.backend.serialize_game, game_id)
+
+    async def export_votes(self, game_id: str):
+        """Return an iterator of all votes in the game, consistent as of the call."""
+        return await self._call(self.backend.export_votes, game_id)
+
+    async def finalized_polls(self, game_id: str):
+        """Return the last polls of the finalized rounds of a game, as compact arrays."""
+        return await self._call(self.backend.finalized_polls, game_id)
+
+    async def get_game_version(self, game_id: str) -> int:
+        """Return the version of a game."""
+        return await self._call(self.backend.get_game_version, game_id)
+
+    async def encode_game(self, game_id: str) -> (int, bytes):
+        """
+        Serialize a game and encode it to JSON, or take it from the cache if it did not change.
+
+        :return: the version of the game and the UTF-8 encoded JSON of its public data
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        # The version is read before serializing - a mutation in between makes the cached entry
+        # look older than it is, which only costs an encode.
+        version = await self.get_game_version(game_id)
+        try:
+            cached_version, encoded = self._encoded_games[game_id]
+        except KeyError:
+            pass
+        else:
+            if cached_version == version:
+                self._encoded_games.move_to_end(game_id)
+                return version, encoded
+
+        encoded = dump_to_json_bytes(await self.serialize_game(game_id))
+        self._encoded_games[game_id] = version, encoded
+        self._encoded_games.move_to_end(game_id)
+        if len(self._encoded_games) > self._encoded_games_cache_size:
+            self._encoded_games.popitem(last=False)
+        return version, encoded
+
+    async def client_owns_game(self, game_id: str, client_id: str) -> bool:
+        """Check if a client is the moderator of the game."""
+        return await self._call(self.backend.client_owns_game, game_id, client_id)
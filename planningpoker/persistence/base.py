@@ -1,5 +1,53 @@
 """Base for persistence backends."""
 import abc
+from array import array
+from collections import namedtuple
+
+from planningpoker.random_id import get_random_id
+
+# A vote in the history of a game. ``poll`` is the number of the poll in its round, from 1.
+VoteRecord = namedtuple('VoteRecord', ['round_name', 'finalized', 'poll', 'player_name',
+                                       'estimation'])
+
+# Typecode of arrays of player slots, card indices and counts: unsigned ints, at least 16 bits, 32
+# on all common platforms.
+VOTES_TYPECODE = 'I'
+
+# The last polls of the finalized rounds of a game, for analytics. ``round_polls`` and
+# ``round_votes`` are the numbers of polls and of votes in the last poll of each finalized round,
+# in the rounds order; ``votes`` are the votes of those polls - alternating player slots and card
+# indices, round after round. All three are arrays of ``VOTES_TYPECODE``.
+FinalizedPolls = namedtuple('FinalizedPolls', ['cards', 'round_polls', 'round_votes', 'votes'])
+
+
+def iter_serialized_votes(serialized_game: dict):
+    """Yield a ``VoteRecord`` for every vote of a serialized game, round by round."""
+    for round_name in serialized_game['rounds_order']:
+        round = serialized_game['rounds'][round_name]
+        for poll_number, poll in enumerate(round['polls'], 1):
+            for player_name, estimation in poll.items():
+                yield VoteRecord(round_name, round['finalized'], poll_number, player_name,
+                                 estimation)
+
+
+def serialized_finalized_polls(serialized_game: dict) -> FinalizedPolls:
+    """Return ``FinalizedPolls`` of a serialized game."""
+    cards = serialized_game['cards']
+    card_indices = {card: index for index, card in enumerate(cards)}
+    player_slots = {name: slot for slot, name in enumerate(serialized_game['players'])}
+    round_polls = array(VOTES_TYPECODE)
+    round_votes = array(VOTES_TYPECODE)
+    votes = array(VOTES_TYPECODE)
+    for round_name in serialized_game['rounds_order']:
+        round = serialized_game['rounds'][round_name]
+        if not round['finalized']:
+            continue
+        round_polls.append(len(round['polls']))
+        round_votes.append(len(round['polls'][-1]))
+        for player_name, estimation in round['polls'][-1].items():
+            votes.append(player_slots[player_name])
+            votes.append(card_indices[estimation])
+    return FinalizedPolls(cards, round_polls, round_votes, votes)
 
 
 class BasePersistence(abc.ABC):
@@ -8,13 +56,58 @@ class BasePersistence(abc.ABC):
     Base persistence backend.
 
     For reference implementation see ``planningpoker.persistence.memory.ProcessMemoryPersistence``.
+
+    Views use backends through ``planningpoker.persistence.asynchronous.AsyncPersistenceAdapter``,
+    which runs the calls of backends that may wait for I/O in an executor. Backends that never
+    block, e.g. the ones keeping all state in process memory, should set ``blocking`` to False.
+
+    Backends that remove idle games set ``expiry_interval`` to how often (in seconds)
+    ``evict_expired_games`` should be called; the defaults describe a backend keeping games forever.
     """
 
+    blocking = True
+    expiry_interval = None
+    evicted_games_count = 0
+    _epoch = None
+
+    def get_epoch(self) -> str:
+        """
+        Return a string identifying the sequence of game versions in the store.
+
+        Combined with a game version, the epoch identifies a state of the game, so it must change
+        whenever versions may repeat with different states - e.g. after a journaled backend lost
+        its last mutations in a crash. Backends shared by processes keep the epoch in the store,
+        so that ETags and event IDs given by one process are valid in all of them. The default is
+        random for every instance of the backend, fitting backends private to a process.
+        """
+        if self._epoch is None:
+            self._epoch = get_random_id(4)
+        return self._epoch
+
     @property
     @abc.abstractmethod
     def games_count(self) -> int:
         """Return games count."""
 
+    @abc.abstractmethod
+    def game_ids(self) -> list:
+        """Return IDs of all games, in no particular order."""
+
+    @abc.abstractmethod
+    def totals(self) -> dict:
+        """Return the numbers of players, rounds and polls of all games, by those names."""
+
+    def evict_expired_games(self) -> list:
+        """
+        Remove games idle for longer than their time to live.
+
+        :return: IDs of the games removed
+        """
+        return []
+
+    def close(self) -> None:
+        """Make all mutations durable and release the backend's threads and connections."""
+
     @abc.abstractmethod
     def add_game(self, game_id: str, moderator_id: str, moderator_name: str, cards: list) -> None:
         """
@@ -51,6 +144,20 @@ class BasePersistence(abc.ABC):
         :raise RoundExists: if there is already a round with such name in the game
         """
 
+    @abc.abstractmethod
+    def add_rounds(self, game_id: str, round_names: list) -> None:
+        """
+        Add many rounds to a game at once, in order.
+
+        Either all rounds are added - as a single write, bumping the game version once - or none.
+
+        :param game_id: existing game's unique ID
+        :param round_names: user-provided names of the new rounds
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with one of the names in the game or
+            a name is repeated
+        """
+
     @abc.abstractmethod
     def add_poll(self, game_id: str, round_name: str) -> None:
         """
@@ -109,6 +216,41 @@ class BasePersistence(abc.ABC):
         :raise NoSuchGame: if there is no game with such ID
         """
 
+    def export_votes(self, game_id: str):
+        """
+        Return an iterator of all votes in the game as ``VoteRecord`` objects, round by round.
+
+        The game is read at the call, in one consistent read - mutations made while iterating do
+        not affect the iterator. Iterating does no I/O.
+
+        Backends may override it to take a snapshot cheaper than the serialized game.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        return iter_serialized_votes(self.serialize_game(game_id))
+
+    def finalized_polls(self, game_id: str) -> FinalizedPolls:
+        """
+        Return the last polls of the finalized rounds of a game, as compact arrays.
+
+        Backends may override it to read the votes without serializing the game.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        return serialized_finalized_polls(self.serialize_game(game_id))
+
+    @abc.abstractmethod
+    def get_game_version(self, game_id: str) -> int:
+        """
+        Return the version of a game.
+
+        The version of a new game is 1 and every successful mutation of the game increments it,
+        so a serialized game tagged with the version read *before* serializing is never older
+        than the tag says - though it may be newer.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+
     @abc.abstractmethod
     def client_owns_game(self, game_id: str, client_id: str) -> bool:
         """
@@ -0,0 +1,63 @@
+"""
+Waiting for games to change.
+
+All clients waiting for a change of a game share one future, resolved by the persistence layer
+right after a mutation of the game. Clients also share timeouts: every deadline is rounded up to
+a multiple of ``timeout_resolution``, so there is a single timer per such multiple rather than per
+waiting client.
+"""
+import asyncio
+import math
+import weakref
+
+
+class GameChanges:
+
+    """Futures resolved when games change."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, timeout_resolution: float = 1.0):
+        """
+        Start with nobody waiting.
+
+        :param timeout_resolution: timeouts are up to that many seconds longer than requested
+        """
+        self._loop = loop
+        self._timeout_resolution = timeout_resolution
+        # Futures nobody waits for any more are simply garbage collected.
+        self._changes = weakref.WeakValueDictionary()
+        self._timeouts = {}
+
+    def changed(self, game_id: str) -> asyncio.Future:
+        """
+        Return a future resolved at the next change of the game.
+
+        Get the future before checking the state of the game - that way no change can slip in
+        between the check and the wait.
+        """
+        try:
+            return self._changes[game_id]
+        except KeyError:
+            future = self._changes[game_id] = asyncio.Future(loop=self._loop)
+            return future
+
+    def notify(self, game_id: str) -> None:
+        """Wake everybody waiting for a change of the game."""
+        future = self._changes.pop(game_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def timeout(self, delay: float) -> asyncio.Future:
+        """Return a future resolved in at least ``delay`` seconds, shared with similar timeouts."""
+        slot = math.ceil((self._loop.time() + delay) / self._timeout_resolution)
+        try:
+            return self._timeouts[slot]
+        except KeyError:
+            future = self._timeouts[slot] = asyncio.Future(loop=self._loop)
+            self._loop.call_at(slot * self._timeout_resolution, self._expire, slot)
+            return future
+
+    def _expire(self, slot: int) -> None:
+        """Resolve a shared timeout."""
+        future = self._timeouts.pop(slot)
+        if not future.done():
+            future.set_result(None)
@@ -79,6 +79,13 @@ class NoSuchGame(GameError):
     message = 'The game with ID {s.game_id} does not exist.'
 
 
+class GameExpired(GameError):
+
+    """Raised if a game was removed after being idle for too long."""
+
+    message = 'The game with ID {s.game_id} has expired.'
+
+
 class RoundExists(RoundError):
 
     """Raised if there is a round name collision within a game."""
@@ -0,0 +1,351 @@
+"""
+Process memory persistence surviving restarts.
+
+The state is recovered from the newest snapshot and the operation log written after it.
+
+The log is split into segments, each named after the sequence number of its first record
+(``journal-<seq>.log``); a record's sequence number is its position in the history of all
+mutations. A snapshot is named after the sequence number of the last record it includes
+(``snapshot-<seq>.json``). Segments are rotated when a snapshot is taken and on every start, so
+no segment ever ends in the middle of what a snapshot covers. Records are one JSON array per line:
+the operation code followed by the arguments of the mutating call.
+"""
+import os
+import re
+import time
+import types
+import functools
+import threading
+
+import simplejson
+
+from planningpoker.persistence.memory import ProcessMemoryPersistence
+from planningpoker.persistence.model import Game
+
+SEGMENT_NAME = 'journal-{:020d}.log'
+SNAPSHOT_NAME = 'snapshot-{:020d}.json'
+SEGMENT_PATTERN = re.compile(r'^journal-(\d{20})\.log$')
+SNAPSHOT_PATTERN = re.compile(r'^snapshot-(\d{20})\.json$')
+
+# Operation codes of journal records, shortened to keep the log compact.
+OPERATIONS = {
+    'add_game': 'g',
+    'add_player': 'p',
+    'add_round': 'r',
+    'add_rounds': 'R',
+    'add_poll': 'o',
+    'finalize_round': 'f',
+    'cast_vote': 'v',
+    'evict_game': 'x',
+}
+
+
+def list_files(directory: str, pattern) -> list:
+    """Return sorted ``(sequence number, path)`` pairs of matching files in a directory."""
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match is not None:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def fsync_directory(directory: str) -> None:
+    """Make renames and deletions of files in a directory durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_games(games: dict) -> str:
+    """Encode games, by their IDs, as a snapshot."""
+    return simplejson.dumps({game_id: game.dump() for game_id, game in games.items()},
+                            ensure_ascii=False)
+
+
+class JournalWriter:
+
+    """
+    Background thread appending journal records and writing snapshots.
+
+    Records are buffered in memory and written out every ``commit_interval`` seconds with a single
+    fsync for the whole group. Snapshots are written from the same thread, in order with
+    the records.
+    """
+
+    def __init__(self, directory: str, first_seq: int, commit_interval: float):
+        """
+        Open a new segment and start the writer thread.
+
+        :param directory: directory of the journal
+        :param first_seq: sequence number of the first record to append
+        :param commit_interval: how often (in seconds) to write and fsync buffered records
+        """
+        self._directory = directory
+        self._commit_interval = commit_interval
+        self._segment = open(os.path.join(directory, SEGMENT_NAME.format(first_seq)), 'a',
+                             encoding='utf-8')
+        fsync_directory(directory)
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, record: str) -> None:
+        """Buffer a record, to be made durable within ``commit_interval``."""
+        with self._lock:
+            self._pending.append(record)
+
+    def snapshot(self, seq: int, encode_state: types.FunctionType) -> None:
+        """
+        Write a snapshot, rotate the log and delete files made obsolete by the snapshot.
+
+        :param seq: sequence number of the last record reflected in the state
+        :param encode_state: function returning the encoded state, called in the writer thread
+        """
+        with self._lock:
+            self._pending.append((seq, encode_state))
+        self._wakeup.set()
+
+    def flush(self) -> None:
+        """Block until everything appended so far is durable."""
+        done = threading.Event()
+        with self._lock:
+            self._pending.append(done)
+        self._wakeup.set()
+        done.wait()
+
+    def close(self) -> None:
+        """Flush and stop the writer thread."""
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._segment.close()
+
+    def _run(self) -> None:
+        """Write pending records in groups until stopped."""
+        while not self._stopping:
+            self._wakeup.wait(self._commit_interval)
+            self._wakeup.clear()
+            self._write_pending()
+        self._write_pending()
+
+    def _write_pending(self) -> None:
+        """Write out everything buffered so far."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        flushed = []
+        dirty = False
+        for item in pending:
+            if isinstance(item, str):
+                self._segment.write(item)
+                dirty = True
+            elif isinstance(item, threading.Event):
+                flushed.append(item)
+            else:
+                self._sync()
+                dirty = False
+                self._write_snapshot(*item)
+
+        if dirty:
+            self._sync()
+        for done in flushed:
+            done.set()
+
+    def _sync(self) -> None:
+        """Flush the current segment to disk."""
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+
+    def _write_snapshot(self, seq: int, encode_state: types.FunctionType) -> None:
+        """Atomically write a snapshot, open a new segment and delete obsolete files."""
+        path = os.path.join(self._directory, SNAPSHOT_NAME.format(seq))
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot:
+            snapshot.write(encode_state())
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.rename(temporary_path, path)
+
+        self._segment.close()
+        self._segment = open(os.path.join(self._directory, SEGMENT_NAME.format(seq + 1)), 'a',
+                             encoding='utf-8')
+        fsync_directory(self._directory)
+
+        for snapshot_seq, snapshot_path in list_files(self._directory, SNAPSHOT_PATTERN):
+            if snapshot_seq < seq:
+                os.remove(snapshot_path)
+        for segment_seq, segment_path in list_files(self._directory, SEGMENT_PATTERN):
+            if segment_seq <= seq:
+                # Rotation happens only at snapshots and restarts, so every segment starting
+                # before the new one is covered by this snapshot.
+                os.remove(segment_path)
+
+
+class JournaledMemoryPersistence(ProcessMemoryPersistence):
+
+    """
+    ``ProcessMemoryPersistence`` recovering its state after restarts.
+
+    Each successful mutation is appended to an operation log; a snapshot of the whole state is
+    taken every ``snapshot_every`` mutations. Records are made durable in groups in a background
+    thread, so a crash loses at most the mutations from the last ``commit_interval`` seconds.
+
+    A snapshot copies the games in the calling thread - that's what makes it consistent - and is
+    encoded and written to disk in the background, so the event loop only pays for the copy.
+
+    Opened with ``read_only``, e.g. by a tool reading the journal of a running application,
+    the backend only recovers the state: nothing in the directory is written, truncated or
+    rotated, and later mutations are kept in memory only.
+
+    Not thread-safe.
+    """
+
+    def __init__(self, directory: str, *, commit_interval: float = 0.01,
+                 snapshot_every: int = 100000, game_ttl: float = None,
+                 clock: types.FunctionType = time.monotonic, read_only: bool = False):
+        """
+        Recover the state from the directory (creating it if needed) and start journaling.
+
+        Recovered games' idle time counts from the recovery.
+
+        :param directory: directory to keep the journal and snapshots in
+        :param commit_interval: how often (in seconds) to fsync the journal
+        :param snapshot_every: number of mutations between snapshots
+        :param game_ttl: see ``ProcessMemoryPersistence``
+        :param clock: see ``ProcessMemoryPersistence``
+        :param read_only: only recover the state, leaving the directory as it is
+        :raise ValueError: if the directory does not exist and ``read_only`` is set
+        """
+        super().__init__(game_ttl=game_ttl, clock=clock)
+        if read_only and not os.path.isdir(directory):
+            raise ValueError('There is no journal directory %r.' % directory)
+        os.makedirs(directory, exist_ok=True)
+        self._snapshot_every = snapshot_every
+        self._seq = self._recover(directory, truncate=not read_only)
+        # Evictions replayed from the journal happened in previous processes.
+        self.evicted_games_count = 0
+        self._unsnapshotted = 0
+        self._journal = None
+        if not read_only:
+            self._journal = JournalWriter(directory, self._seq + 1, commit_interval)
+
+    def _recover(self, directory: str, truncate: bool = True) -> int:
+        """
+        Load the newest snapshot and replay the log written after it.
+
+        A record that cannot be decoded ends its segment - it's what a crash in the middle of
+        a write leaves behind - and is truncated, unless ``truncate`` is False.
+
+        :return: sequence number of the last replayed record
+        """
+        seq = 0
+        snapshots = list_files(directory, SNAPSHOT_PATTERN)
+        if snapshots:
+            seq, snapshot_path = snapshots[-1]
+            with open(snapshot_path, encoding='utf-8') as snapshot:
+                self._load_games(snapshot.read())
+            if self._expiry is not None:
+                for game_id in self._games:
+                    self._expiry.touch(game_id)
+
+        replay = {code: getattr(ProcessMemoryPersistence, operation)
+                  for operation, code in OPERATIONS.items()}
+        loads = simplejson.loads
+        for segment_seq, segment_path in list_files(directory, SEGMENT_PATTERN):
+            record_seq = segment_seq - 1
+            valid_length = 0
+            with open(segment_path, 'rb') as segment:
+                for line in segment:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('Unterminated record.')
+                        record = loads(line.decode(), use_decimal=True)
+                    except ValueError:
+                        # Cut the torn write off, so that records appended later are readable.
+                        if truncate:
+                            os.truncate(segment_path, valid_length)
+                        break
+                    valid_length += len(line)
+                    record_seq += 1
+                    if record_seq > seq:
+                        code, *args = record
+                        replay[code](self, *args)
+                        seq = record_seq
+
+        return seq
+
+    def _load_games(self, encoded: str) -> None:
+        """Restore the complete state from ``encode_games`` output."""
+        self._games = {game_id: Game.load(dumped) for game_id, dumped
+                       in simplejson.loads(encoded, use_decimal=True).items()}
+
+    def _log(self, operation: str, *args) -> None:
+        """Journal a successful mutation and take a snapshot if it's time to."""
+        if self._journal is None:
+            return
+        self._seq += 1
+        self._journal.append(
+            simplejson.dumps([OPERATIONS[operation]] + list(args), ensure_ascii=False) + '\n')
+
+        self._unsnapshotted += 1
+        if self._unsnapshotted >= self._snapshot_every:
+            self._unsnapshotted = 0
+            games = {game_id: game.copy() for game_id, game in self._games.items()}
+            self._journal.snapshot(self._seq, functools.partial(encode_games, games))
+
+    def flush(self) -> None:
+        """Block until all mutations so far are durable."""
+        if self._journal is not None:
+            self._journal.flush()
+
+    def close(self) -> None:
+        """Make all mutations durable and stop journaling."""
+        if self._journal is not None:
+            self._journal.close()
+
+    def add_game(self, game_id: str, moderator_id: str, moderator_name: str, cards: list) -> None:
+        """Register a game and journal it."""
+        super().add_game(game_id, moderator_id, moderator_name, cards)
+        self._log('add_game', game_id, moderator_id, moderator_name, cards)
+
+    def add_player(self, game_id, player_id: str, player_name: str) -> None:
+        """Register a player in a game and journal it."""
+        super().add_player(game_id, player_id, player_name)
+        self._log('add_player', game_id, player_id, player_name)
+
+    def add_round(self, game_id: str, round_name: str) -> None:
+        """Add next round to a game and journal it."""
+        super().add_round(game_id, round_name)
+        self._log('add_round', game_id, round_name)
+
+    def add_rounds(self, game_id: str, round_names: list) -> None:
+        """Add many rounds to a game and journal them as a single record."""
+        super().add_rounds(game_id, round_names)
+        self._log('add_rounds', game_id, round_names)
+
+    def add_poll(self, game_id: str, round_name: str) -> None:
+        """Create a poll and journal it."""
+        super().add_poll(game_id, round_name)
+        self._log('add_poll', game_id, round_name)
+
+    def finalize_round(self, game_id: str, round_name: str) -> None:
+        """Finalize a round and journal it."""
+        super().finalize_round(game_id, round_name)
+        self._log('finalize_round', game_id, round_name)
+
+    def cast_vote(self, game_id: str, round_name: str, voter_id: str, estimation: str) -> None:
+        """Cast a vote and journal it."""
+        super().cast_vote(game_id, round_name, voter_id, estimation)
+        self._log('cast_vote', game_id, round_name, voter_id, estimation)
+
+    def evict_game(self, game_id: str) -> None:
+        """Remove a game and journal it, so that it does not come back after a restart."""
+        super().evict_game(game_id)
+        self._log('evict_game', game_id)
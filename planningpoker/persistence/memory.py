@@ -1,7 +1,13 @@
 """In-memory persistence backend implementation."""
-from planningpoker.persistence.base import BasePersistence
+import time
+import types
+from collections import OrderedDict
+
+from planningpoker.timing_wheel import TimingWheel
+from planningpoker.persistence.base import BasePersistence, FinalizedPolls
+from planningpoker.persistence.model import Game, Round
 from planningpoker.persistence.exceptions import (
-    GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
+    GameExists, GameExpired, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
     IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame,
 )
 
@@ -16,55 +22,58 @@ class ProcessMemoryPersistence(BasePersistence):
 
     Not thread-safe.
 
-    The complete state is kept in the `self._games` dict.
-
-    Schema:
-        self._games = {
-            '<game-id>': {  # Game dict.
-                'players': {'123fd1d9da37c': 'Beatrice', ...},  # Map of player IDs to player name.
-                                                                # Includes the moderator.
-                'moderator_id': 'wqsqw123',  # ID of the game owner.
-                'cards': [1, 3, 5, 8, 13, ...],  # A list of possible estimations.
-                'rounds_order': ['<name-of-the-first-round>', ...],  # Rounds in order.
-                'rounds': {
-                    '<name-of-the-first-round>': {  # A round object.
-                        'polls': [  # List of polls in the round.
-                            {  # Results of a poll.
-                                '<player-1>': 40,
-                                '<player-3>': 13,
-                                ...
-                            },
-                            ...
-                        ],
-                        'finalized': False,  # True means no more polls can be added and the
-                                             # result of the last poll is the result of the
-                                             # round.
-                    ...
-                }
-            }
-            ...
-        }
+    The complete state is kept in the `self._games` dict, mapping game IDs to
+    ``planningpoker.persistence.model.Game`` objects. See that module for the layout.
 
-    We don't use OrderedDicts to keep JSON serialization trivial.
+    With ``game_ttl`` set, games not accessed for that long are removed by
+    ``evict_expired_games``. IDs of the most recently removed games are remembered, so that asking
+    for them raises ``GameExpired`` rather than ``NoSuchGame``.
     """
 
-    def __init__(self):
-        """Instantiate the memory persistence with no games."""
-        self._games = {}
+    blocking = False
+
+    # Expiry is checked this many times per TTL, so games live at most 1/64 of the TTL too long.
+    EXPIRY_CHECKS_PER_TTL = 64
+    # How many IDs of removed games to remember.
+    MAX_TOMBSTONES = 100000
 
-    def _get_game(self, game_id: str) -> None:
+    def __init__(self, *, game_ttl: float = None, clock: types.FunctionType = time.monotonic):
         """
-        Find a game.
+        Instantiate the memory persistence with no games.
+
+        :param game_ttl: seconds since the last access after which a game may be removed;
+            ``None`` keeps games forever
+        :param clock: function returning the current time in seconds
+        """
+        self._games = {}
+        self._tombstones = OrderedDict()
+        self.evicted_games_count = 0
+        if game_ttl is None:
+            self._expiry = None
+        else:
+            self.expiry_interval = game_ttl / self.EXPIRY_CHECKS_PER_TTL
+            self._expiry = TimingWheel(game_ttl, self.expiry_interval, clock)
+
+    def _get_game(self, game_id: str) -> Game:
+        """
+        Find a game and postpone its expiry.
 
         :param game_id: existing game's unique ID
         :raise NoSuchGame: if there is no game with such ID
+        :raise GameExpired: if the game has been removed for being idle
         """
         try:
-            return self._games[game_id]
+            game = self._games[game_id]
         except KeyError:
+            if game_id in self._tombstones:
+                raise GameExpired(game_id)
             raise NoSuchGame(game_id)
 
-    def _get_round(self, game_id: str, round_name: str, ensure_active: bool = False) -> None:
+        if self._expiry is not None:
+            self._expiry.touch(game_id)
+        return game
+
+    def _get_round(self, game_id: str, round_name: str, ensure_active: bool = False) -> Round:
         """
         Find a round.
 
@@ -76,11 +85,11 @@ class ProcessMemoryPersistence(BasePersistence):
         :raise RoundFinalized: if the round has already been finalized and `ensure_active` is True
         """
         try:
-            round = self._get_game(game_id)['rounds'][round_name]
+            round = self._get_game(game_id).rounds[round_name]
         except KeyError:
             raise NoSuchRound(game_id, round_name)
 
-        if ensure_active and round['finalized'] is True:
+        if ensure_active and round.finalized is True:
             raise RoundFinalized(game_id, round_name)
 
         return round
@@ -90,11 +99,24 @@ class ProcessMemoryPersistence(BasePersistence):
         """Return games count."""
         return len(self._games)
 
+    def game_ids(self) -> list:
+        """Return IDs of all games, in no particular order."""
+        return list(self._games)
+
+    def totals(self) -> dict:
+        """Return the numbers of players, rounds and polls of all games, counted in one pass."""
+        players = rounds = polls = 0
+        for game in self._games.values():
+            players += len(game.player_names)
+            rounds += len(game.rounds_order)
+            polls += sum(len(round.polls) for round in game.rounds.values())
+        return {'players': players, 'rounds': rounds, 'polls': polls}
+
     def add_game(self, game_id: str, moderator_id: str, moderator_name: str, cards: list) -> None:
         """
         Register a game.
 
-        Insert into the games dict a key of the new game ID with the value of the new game dict.
+        Insert into the games dict a key of the new game ID with the value of the new game.
 
         :param game_id: game's unique ID
         :param moderator_id: the ID that identifies the game owner
@@ -105,13 +127,41 @@ class ProcessMemoryPersistence(BasePersistence):
         if game_id in self._games:
             raise GameExists(game_id)
 
-        self._games[game_id] = {
-            'players': {moderator_id: moderator_name},
-            'moderator_id': moderator_id,
-            'cards': cards,
-            'rounds_order': [],
-            'rounds': {},
-        }
+        self._games[game_id] = Game(moderator_id, moderator_name, cards)
+        self._tombstones.pop(game_id, None)
+        if self._expiry is not None:
+            self._expiry.touch(game_id)
+
+    def evict_game(self, game_id: str) -> None:
+        """
+        Remove a game, remembering that it expired.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        try:
+            del self._games[game_id]
+        except KeyError:
+            raise NoSuchGame(game_id)
+        if self._expiry is not None:
+            self._expiry.discard(game_id)
+
+        self._tombstones[game_id] = True
+        if len(self._tombstones) > self.MAX_TOMBSTONES:
+            self._tombstones.popitem(last=False)
+        self.evicted_games_count += 1
+
+    def evict_expired_games(self) -> list:
+        """
+        Remove games idle for longer than ``game_ttl``.
+
+        :return: IDs of the games removed
+        """
+        if self._expiry is None:
+            return []
+        expired = self._expiry.advance()
+        for game_id in expired:
+            self.evict_game(game_id)
+        return expired
 
     def add_player(self, game_id, player_id: str, player_name: str) -> None:
         """
@@ -126,15 +176,13 @@ class ProcessMemoryPersistence(BasePersistence):
         """
         game = self._get_game(game_id)
 
-        # Players list cannot be a set because that wouldn't serialize to JSON easily.
-        # After all, how many players are we going to have? Especially on deployments using
-        # process memory to keep state.
-        if player_id in game['players']:
+        if player_id in game.player_slots:
             raise PlayerAlreadyRegistered(game_id, player_name)
-        if player_name in game['players'].values():
+        if player_name in game.name_slots:
             raise PlayerNameTaken(game_id, player_name)
 
-        game['players'][player_id] = player_name
+        game.add_player(player_id, player_name)
+        game.version += 1
 
     def add_round(self, game_id: str, round_name: str) -> None:
         """
@@ -148,14 +196,32 @@ class ProcessMemoryPersistence(BasePersistence):
         :raise RoundExists: if there is already a round with such name in the game
         """
         game = self._get_game(game_id)
-        if round_name in game['rounds']:
+        if round_name in game.rounds:
             raise RoundExists(game_id, round_name)
 
-        game['rounds_order'].append(round_name)
-        game['rounds'][round_name] = {
-            'finalized': False,
-            'polls': []
-        }
+        game.add_round(round_name)
+        game.version += 1
+
+    def add_rounds(self, game_id: str, round_names: list) -> None:
+        """
+        Add many rounds to a game at once, in order.
+
+        :param game_id: existing game's unique ID
+        :param round_names: user-provided names of the new rounds
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with one of the names in the game or
+            a name is repeated
+        """
+        game = self._get_game(game_id)
+        new_names = set()
+        for round_name in round_names:
+            if round_name in game.rounds or round_name in new_names:
+                raise RoundExists(game_id, round_name)
+            new_names.add(round_name)
+
+        for round_name in round_names:
+            game.add_round(round_name)
+        game.version += 1
 
     def add_poll(self, game_id: str, round_name: str) -> None:
         """
@@ -170,7 +236,9 @@ class ProcessMemoryPersistence(BasePersistence):
         :raise RoundFinalized: if the round has already been finalized
         """
         round = self._get_round(game_id, round_name, ensure_active=True)
-        round['polls'].append({})
+        game = self._games[game_id]
+        game.add_poll(round)
+        game.version += 1
 
     def finalize_round(self, game_id: str, round_name: str) -> None:
         """
@@ -184,9 +252,11 @@ class ProcessMemoryPersistence(BasePersistence):
         :raise RoundFinalized: if the round has already been finalized
         """
         round = self._get_round(game_id, round_name, ensure_active=True)
-        if round['polls'] == []:
+        if round.polls == []:
             raise NoActivePoll(game_id, round_name)
-        round['finalized'] = True
+        round.finalized = True
+        round.polls[-1].close()
+        self._games[game_id].version += 1
 
     def cast_vote(self, game_id: str, round_name: str, voter_id: str, estimation: str) -> None:
         """
@@ -207,20 +277,23 @@ class ProcessMemoryPersistence(BasePersistence):
         """
         round = self._get_round(game_id, round_name, ensure_active=True)
         try:
-            latest_poll = round['polls'][-1]
+            latest_poll = round.polls[-1]
         except IndexError:
             raise NoActivePoll(game_id, round_name)
 
         game = self._get_game(game_id)
-        if estimation not in game['cards']:
+        try:
+            card_index = game.card_index(estimation)
+        except ValueError:
             raise IllegalEstimation(game_id, estimation)
 
         try:
-            voter_name = game['players'][voter_id]
+            voter_slot = game.player_slots[voter_id]
         except KeyError:
             raise PlayerNotInGame(game_id, voter_id)
 
-        latest_poll[voter_name] = estimation
+        latest_poll.cast(voter_slot, card_index)
+        game.version += 1
 
     def serialize_game(self, game_id: str) -> dict:
         """
@@ -231,12 +304,38 @@ class ProcessMemoryPersistence(BasePersistence):
         """
         game = self._get_game(game_id)
         return {
-            'players': list(game['players'].values()),
-            'cards': game['cards'],
-            'rounds_order': game['rounds_order'],
-            'rounds': game['rounds'],
+            'players': list(game.player_names),
+            'cards': game.cards,
+            'rounds_order': game.rounds_order,
+            'rounds': game.serialize_rounds(),
         }
 
+    def export_votes(self, game_id: str):
+        """
+        Return an iterator of all votes in the game as ``VoteRecord`` objects, round by round.
+
+        Only the compact arrays of votes are copied when called, not the serialized game.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        return self._get_game(game_id).export_votes()
+
+    def finalized_polls(self, game_id: str) -> FinalizedPolls:
+        """
+        Return the last polls of the finalized rounds of a game, as compact arrays.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        return self._get_game(game_id).finalized_polls()
+
+    def get_game_version(self, game_id: str) -> int:
+        """
+        Return the version of a game, incremented by every mutation.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        return self._get_game(game_id).version
+
     def client_owns_game(self, game_id: str, client_id: str) -> bool:
         """
         Check if a client is the moderator of the game.
@@ -246,4 +345,4 @@ class ProcessMemoryPersistence(BasePersistence):
         :return: True if a client is the moderator of the game
         """
         game = self._get_game(game_id)
-        return game['moderator_id'] == client_id
+        return game.moderator_id == client_id
@@ -0,0 +1,436 @@
+"""
+Redis persistence backend implementation.
+
+Requires the ``redis`` package (``pip install planningpoker[redis]``).
+"""
+from decimal import Decimal
+
+import simplejson
+from redis import StrictRedis
+
+from planningpoker.random_id import get_random_id
+from planningpoker.persistence.base import BasePersistence
+from planningpoker.persistence.exceptions import (
+    GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
+    IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame,
+)
+from planningpoker.statistics import numeric_order, poll_statistics
+
+# Every script validates the operation and applies it atomically. On failure it returns the name of
+# the exception to raise, on success - nothing (or the requested data).
+# Every successful mutation increments the 'version' field of the game hash.
+# Keys are always: 1: game hash, 2: players hash, 3: player names hash, 4: players order list,
+# 5: rounds order list, 6: polls counts hash, 7: finalized rounds hash, 8: votes hash,
+# 9: votes order list. All of them share the game ID as the hash tag - no script touches keys of
+# other slots of a Redis cluster.
+
+ADD_GAME = '''
+if redis.call('EXISTS', KEYS[1]) == 1 then return 'GameExists' end
+redis.call('HSET', KEYS[1], 'moderator_id', ARGV[1])
+redis.call('HSET', KEYS[1], 'cards', ARGV[3])
+redis.call('HSET', KEYS[1], 'version', 1)
+for i = 4, #ARGV do redis.call('HSET', KEYS[1], 'card:' .. ARGV[i], 1) end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[1])
+redis.call('RPUSH', KEYS[4], ARGV[2])
+return false
+'''
+
+ADD_PLAYER = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'NoSuchGame' end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then return 'PlayerAlreadyRegistered' end
+if redis.call('HEXISTS', KEYS[3], ARGV[2]) == 1 then return 'PlayerNameTaken' end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[1])
+redis.call('RPUSH', KEYS[4], ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+ADD_ROUND = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'NoSuchGame' end
+if redis.call('HEXISTS', KEYS[6], ARGV[1]) == 1 then return 'RoundExists' end
+redis.call('HSET', KEYS[6], ARGV[1], 0)
+redis.call('RPUSH', KEYS[5], ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+# Fails with the exception name and the (1-based) position of the first taken or repeated name.
+ADD_ROUNDS = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'NoSuchGame' end
+local seen = {}
+for i = 1, #ARGV do
+  if seen[ARGV[i]] or redis.call('HEXISTS', KEYS[6], ARGV[i]) == 1 then
+    return {'RoundExists', i}
+  end
+  seen[ARGV[i]] = true
+end
+for i = 1, #ARGV do
+  redis.call('HSET', KEYS[6], ARGV[i], 0)
+  redis.call('RPUSH', KEYS[5], ARGV[i])
+end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+# Shared prologue of scripts operating on an active round; leaves the polls count in `polls`.
+ACTIVE_ROUND = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'NoSuchGame' end
+local polls = redis.call('HGET', KEYS[6], ARGV[1])
+if not polls then return 'NoSuchRound' end
+if redis.call('HEXISTS', KEYS[7], ARGV[1]) == 1 then return 'RoundFinalized' end
+polls = tonumber(polls)
+'''
+
+ADD_POLL = ACTIVE_ROUND + '''
+redis.call('HINCRBY', KEYS[6], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+FINALIZE_ROUND = ACTIVE_ROUND + '''
+if polls == 0 then return 'NoActivePoll' end
+redis.call('HSET', KEYS[7], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+CAST_VOTE = ACTIVE_ROUND + '''
+if polls == 0 then return 'NoActivePoll' end
+if redis.call('HEXISTS', KEYS[1], 'card:' .. ARGV[4]) == 0 then return 'IllegalEstimation' end
+local voter_name = redis.call('HGET', KEYS[2], ARGV[2])
+if not voter_name then return 'PlayerNotInGame' end
+local vote = cjson.encode({ARGV[1], polls - 1, voter_name})
+if redis.call('HSET', KEYS[8], vote, ARGV[3]) == 1 then redis.call('RPUSH', KEYS[9], vote) end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+return false
+'''
+
+# HMGETs fields in chunks - unpacking a whole list of them fails once it outgrows the Lua stack
+# (about 8000 elements).
+SERIALIZE_GAME = '''
+local function hmget(key, fields)
+  local values = {}
+  for first = 1, #fields, 500 do
+    local chunk = redis.call('HMGET', key, unpack(fields, first, math.min(first + 499, #fields)))
+    for i = 1, #chunk do values[first + i - 1] = chunk[i] end
+  end
+  return values
+end
+local cards = redis.call('HGET', KEYS[1], 'cards')
+if not cards then return 'NoSuchGame' end
+local rounds = redis.call('LRANGE', KEYS[5], 0, -1)
+local votes_order = redis.call('LRANGE', KEYS[9], 0, -1)
+return {cards, redis.call('LRANGE', KEYS[4], 0, -1), rounds, hmget(KEYS[6], rounds),
+        hmget(KEYS[7], rounds), votes_order, hmget(KEYS[8], votes_order)}
+'''
+
+
+def card_key(card) -> str:
+    """
+    Return a string equal for cards that compare equal in Python.
+
+    Lets the scripts check if an estimation is one of the game cards the way
+    ``ProcessMemoryPersistence`` does it - ``Decimal(1) == 1 == Decimal('1.0')``.
+    """
+    if isinstance(card, (int, float, Decimal)) and not isinstance(card, bool):
+        number = Decimal(card)
+        return 'n:%s' % (number.normalize() if number != 0 else 0)
+    return 's:%s' % card
+
+
+class RedisPersistence(BasePersistence):
+
+    """
+    Persistence backed by Redis.
+
+    Each game is kept in a few hashes and lists sharing the game ID as the hash tag, so they land
+    in the same slot of a Redis cluster. Every operation is a single Lua script call - one round
+    trip during which Redis checks the validation rules and applies the change atomically. That
+    allows multiple application processes to share games.
+
+    Keys of games are also added to a set of all games, after the game is created - with
+    a command of its own, as the set is in another slot.
+
+    Thread-safe, as long as the client is.
+    """
+
+    def __init__(self, client: StrictRedis, *, prefix: str = 'planningpoker'):
+        """
+        Register the Lua scripts and read the epoch, setting it if the database has none.
+
+        :param client: Redis client created with ``decode_responses=True``
+        :param prefix: prefix of all the keys used by the backend
+        """
+        self._client = client
+        self._prefix = prefix
+        self._add_game = client.register_script(ADD_GAME)
+        self._add_player = client.register_script(ADD_PLAYER)
+        self._add_round = client.register_script(ADD_ROUND)
+        self._add_rounds = client.register_script(ADD_ROUNDS)
+        self._add_poll = client.register_script(ADD_POLL)
+        self._finalize_round = client.register_script(FINALIZE_ROUND)
+        self._cast_vote = client.register_script(CAST_VOTE)
+        self._serialize_game = client.register_script(SERIALIZE_GAME)
+        client.set(self._epoch_key, get_random_id(4), nx=True)
+        self._epoch = client.get(self._epoch_key)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisPersistence':
+        """Connect to Redis given a ``redis://`` URL."""
+        return cls(StrictRedis.from_url(url, decode_responses=True), **kwargs)
+
+    @property
+    def _games_key(self) -> str:
+        """Return the key of the set of all games."""
+        return '%s:games' % self._prefix
+
+    @property
+    def _epoch_key(self) -> str:
+        """Return the key of the epoch shared by all processes using the database."""
+        return '%s:epoch' % self._prefix
+
+    def _keys(self, game_id: str) -> list:
+        """Return the keys of the game's data structures, in the order expected by scripts."""
+        game = '%s:{%s}' % (self._prefix, game_id)
+        return [
+            game,
+            game + ':players',
+            game + ':player_names',
+            game + ':players_order',
+            game + ':rounds_order',
+            game + ':polls',
+            game + ':finalized',
+            game + ':votes',
+            game + ':votes_order',
+        ]
+
+    @property
+    def games_count(self) -> int:
+        """Return games count."""
+        return self._client.scard(self._games_key)
+
+    def close(self) -> None:
+        """Disconnect from Redis - every mutation is durable as soon as its script returns."""
+        self._client.connection_pool.disconnect()
+
+    def game_ids(self) -> list:
+        """Return IDs of all games, in no particular order, read without blocking the server."""
+        prefix_length = len(self._prefix) + 2  # The set holds game keys: prefix:{game_id}.
+        return [key[prefix_length:-1] for key in self._client.sscan_iter(self._games_key)]
+
+    def totals(self) -> dict:
+        """
+        Return the numbers of players, rounds and polls of all games.
+
+        Sizes of every game's structures are read in one pipelined round trip.
+        """
+        pipeline = self._client.pipeline(transaction=False)
+        for game_key in self._client.sscan_iter(self._games_key):
+            pipeline.hlen(game_key + ':players')
+            pipeline.llen(game_key + ':rounds_order')
+            pipeline.hvals(game_key + ':polls')
+        sizes = pipeline.execute()
+        return {
+            'players': sum(sizes[0::3]),
+            'rounds': sum(sizes[1::3]),
+            'polls': sum(int(polls) for game_polls in sizes[2::3] for polls in game_polls),
+        }
+
+    def add_game(self, game_id: str, moderator_id: str, moderator_name: str, cards: list) -> None:
+        """
+        Register a game.
+
+        :param game_id: game's unique ID
+        :param moderator_id: the ID that identifies the game owner
+        :param moderator_name: the name of the game moderator that the players will see
+        :param cards: a list of possible estimations in this game
+        :raise GameExists: if a game with such ID already exists
+        """
+        keys = self._keys(game_id)
+        args = [moderator_id, moderator_name, simplejson.dumps(cards)]
+        if self._add_game(keys, args + [card_key(c) for c in cards]):
+            raise GameExists(game_id)
+        self._client.sadd(self._games_key, keys[0])
+
+    def add_player(self, game_id, player_id: str, player_name: str) -> None:
+        """
+        Register a player in a game.
+
+        :param game_id: game's unique ID to add a player to
+        :param player_id: player's unique ID
+        :param player_name: player's name to use in this game
+        :raise NoSuchGame: if there is no game with given ID
+        :raise PlayerNameTaken: if there is already a player with such name in the game
+        :raise PlayerAlreadyRegistered: if the player already belongs to the game
+        """
+        error = self._add_player(self._keys(game_id), [player_id, player_name])
+        if error == 'NoSuchGame':
+            raise NoSuchGame(game_id)
+        if error == 'PlayerAlreadyRegistered':
+            raise PlayerAlreadyRegistered(game_id, player_name)
+        if error == 'PlayerNameTaken':
+            raise PlayerNameTaken(game_id, player_name)
+
+    def add_round(self, game_id: str, round_name: str) -> None:
+        """
+        Add next round to a game.
+
+        :param game_id: existing game's unique ID
+        :param round_name: user-provided name of the new round
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with such name in the game
+        """
+        error = self._add_round(self._keys(game_id), [round_name])
+        if error == 'NoSuchGame':
+            raise NoSuchGame(game_id)
+        if error == 'RoundExists':
+            raise RoundExists(game_id, round_name)
+
+    def add_rounds(self, game_id: str, round_names: list) -> None:
+        """
+        Add many rounds to a game at once, in order.
+
+        :param game_id: existing game's unique ID
+        :param round_names: user-provided names of the new rounds
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with one of the names in the game or
+            a name is repeated
+        """
+        error = self._add_rounds(self._keys(game_id), round_names)
+        if error == 'NoSuchGame':
+            raise NoSuchGame(game_id)
+        if error:
+            _, position = error
+            raise RoundExists(game_id, round_names[position - 1])
+
+    @staticmethod
+    def _raise_round_error(error: (str, None), game_id: str, round_name: str) -> None:
+        """Raise the exception named by a script operating on a round, if any."""
+        if error == 'NoSuchGame':
+            raise NoSuchGame(game_id)
+        if error is not None:
+            raise {
+                'NoSuchRound': NoSuchRound,
+                'RoundFinalized': RoundFinalized,
+                'NoActivePoll': NoActivePoll,
+            }[error](game_id, round_name)
+
+    def add_poll(self, game_id: str, round_name: str) -> None:
+        """
+        Create a poll where players can cast votes.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the round to add a poll to
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise RoundFinalized: if the round has already been finalized
+        """
+        self._raise_round_error(self._add_poll(self._keys(game_id), [round_name]),
+                                game_id, round_name)
+
+    def finalize_round(self, game_id: str, round_name: str) -> None:
+        """
+        Accept the current poll and finalize the round.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the round to finalize
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise NoActivePoll: if there no active poll in the round
+        :raise RoundFinalized: if the round has already been finalized
+        """
+        self._raise_round_error(self._finalize_round(self._keys(game_id), [round_name]),
+                                game_id, round_name)
+
+    def cast_vote(self, game_id: str, round_name: str, voter_id: str, estimation: str) -> None:
+        """
+        Cast a vote for the current poll.
+
+        The vote can be changed until the end of the poll.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the new round
+        :param voter_id: ID of the voter (not to be disclosed)
+        :param estimation: the estimation the voter votes for
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise NoActivePoll: if there no active poll in the round
+        :raise RoundFinalized: if the round has already been finalized
+        :raise IllegalEstimation: if the voter voted for a card that doesn't take a part in the game
+        :raise PlayerNotInGame: if the voter ID does not map to any player
+        """
+        error = self._cast_vote(
+            self._keys(game_id),
+            [round_name, voter_id, simplejson.dumps(estimation), card_key(estimation)])
+        if error == 'IllegalEstimation':
+            raise IllegalEstimation(game_id, estimation)
+        if error == 'PlayerNotInGame':
+            raise PlayerNotInGame(game_id, voter_id)
+        self._raise_round_error(error, game_id, round_name)
+
+    def serialize_game(self, game_id: str) -> dict:
+        """
+        Fetch and serialize all game's data to a dict.
+
+        :raise NoSuchGame: if there is no game with such ID
+        :return: a dict loselessly serializable to JSON
+        """
+        result = self._serialize_game(self._keys(game_id))
+        if result == 'NoSuchGame':
+            raise NoSuchGame(game_id)
+        cards, players, rounds_order, polls, finalized, votes_order, votes = result
+
+        cards = simplejson.loads(cards, use_decimal=True)
+        # Votes are stored as cast; they are given as the cards they are equal to, e.g. 1 for 1.0.
+        cards_by_key = {card_key(card): card for card in cards}
+        rounds = {
+            round_name: {'polls': [{} for _ in range(int(polls_count))],
+                         'finalized': finalized_flag is not None}
+            for round_name, polls_count, finalized_flag in zip(rounds_order, polls, finalized)
+        }
+        histograms = {round_name: [[0] * len(cards) for _ in range(int(polls_count))]
+                      for round_name, polls_count in zip(rounds_order, polls)}
+        card_indices = {card: index for index, card in enumerate(cards)}
+        for vote, estimation in zip(votes_order, votes):
+            round_name, poll, player_name = simplejson.loads(vote)
+            estimation = cards_by_key[card_key(simplejson.loads(estimation, use_decimal=True))]
+            rounds[round_name]['polls'][poll][player_name] = estimation
+            histograms[round_name][poll][card_indices[estimation]] += 1
+
+        order = numeric_order(cards)
+        for round_name, round in rounds.items():
+            round['statistics'] = [poll_statistics(histogram, cards, order)
+                                   for histogram in histograms[round_name]]
+
+        return {
+            'players': players,
+            'cards': cards,
+            'rounds_order': rounds_order,
+            'rounds': rounds,
+        }
+
+    def get_game_version(self, game_id: str) -> int:
+        """
+        Return the version of a game, incremented by every mutation.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        version = self._client.hget(self._keys(game_id)[0], 'version')
+        if version is None:
+            raise NoSuchGame(game_id)
+        return int(version)
+
+    def client_owns_game(self, game_id: str, client_id: str) -> bool:
+        """
+        Check if a client is the moderator of the game.
+
+        :param game_id: unique ID of the game to check for ownership
+        :param client_id: ID of the client
+        :return: True if a client is the moderator of the game
+        """
+        moderator_id = self._client.hget(self._keys(game_id)[0], 'moderator_id')
+        if moderator_id is None:
+            raise NoSuchGame(game_id)
+        return moderator_id == str(client_id)
@@ -0,0 +1,597 @@
+"""SQLite persistence backend implementation."""
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import simplejson
+
+from planningpoker.random_id import get_random_id
+from planningpoker.persistence.base import BasePersistence, FinalizedPolls, VOTES_TYPECODE
+from planningpoker.persistence.exceptions import (
+    GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
+    IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame,
+)
+from planningpoker.statistics import numeric_order, poll_statistics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    moderator_id TEXT NOT NULL,
+    cards TEXT NOT NULL,  -- JSON list of possible estimations.
+    version INTEGER NOT NULL DEFAULT 1  -- Incremented by every mutation of the game.
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (game_id, player_id),
+    UNIQUE (game_id, name)
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    game_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,  -- Index in the game's rounds order.
+    polls INTEGER NOT NULL DEFAULT 0,  -- Number of polls in the round.
+    finalized INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (game_id, name)
+);
+CREATE TABLE IF NOT EXISTS votes (
+    game_id TEXT NOT NULL,
+    round_name TEXT NOT NULL,
+    poll INTEGER NOT NULL,  -- Index of the poll within the round.
+    player_name TEXT NOT NULL,
+    estimation TEXT NOT NULL,  -- JSON-encoded card.
+    PRIMARY KEY (game_id, round_name, poll, player_name)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+# Schema changes, in order. ``PRAGMA user_version`` of a database is the number of them applied.
+MIGRATIONS = [
+    # Games get versions, the existing ones starting at 1.
+    'ALTER TABLE games ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+]
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Create missing tables and apply the migrations the database has not had yet."""
+    # Tables created here already have the latest schema.
+    connection.executescript(SCHEMA)
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        applied = connection.execute('PRAGMA user_version').fetchone()[0]
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(games)')]
+        if applied == 0 and 'version' in columns:
+            # Just created, or created with versions but before migrations were counted.
+            applied = len(MIGRATIONS)
+        for statement in MIGRATIONS[applied:]:
+            connection.execute(statement)
+        connection.execute('PRAGMA user_version = %d' % len(MIGRATIONS))
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def dump_value(value) -> str:
+    """Encode a card or a list of cards losslessly, ``Decimal`` included."""
+    return simplejson.dumps(value)
+
+
+def load_value(text: str):
+    """Decode a value encoded by ``dump_value``."""
+    return simplejson.loads(text, use_decimal=True)
+
+
+class SQLitePersistence(BasePersistence):
+
+    """
+    Persistence backed by an SQLite database file.
+
+    All mutations are funneled to a single writer thread which applies them in groups, one
+    transaction per group - one fsync is shared by the whole group of mutations instead of being
+    paid by each vote. A mutation alone in the queue is committed right away; while others are
+    queued with it, the group collects mutations for up to ``commit_interval`` seconds. Every
+    mutation runs in its own savepoint, so a mutation failing validation does not affect others
+    committed together with it. Callers block until the transaction holding their mutation is
+    committed.
+
+    Reads are served from a pool of connections; WAL journaling lets them run concurrently with
+    the writer.
+
+    Thread-safe.
+    """
+
+    def __init__(self, path: str, *, commit_interval: float = 0.005, max_batch_size: int = 1000,
+                 readers: int = 4):
+        """
+        Open (and create if needed) the database and start the writer thread.
+
+        :param path: database file path
+        :param commit_interval: how long (in seconds) a group of queued mutations may wait for more
+        :param max_batch_size: maximum number of mutations committed together
+        :param readers: number of pooled read connections
+        """
+        self._path = path
+        self._commit_interval = commit_interval
+        self._max_batch_size = max_batch_size
+
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode = WAL')
+        migrate(connection)
+        # Commits are durable, so versions never repeat - the epoch is kept for good.
+        connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+                           (get_random_id(4),))
+        self._epoch = connection.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+        self._mutations = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, args=(connection,),
+                                        name='sqlite-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection managing transactions explicitly."""
+        connection = sqlite3.connect(self._path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA synchronous = FULL')
+        return connection
+
+    def close(self) -> None:
+        """Commit pending mutations, stop the writer thread and close all connections."""
+        self._mutations.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+    def _write_loop(self, connection: sqlite3.Connection) -> None:
+        """Apply queued mutations in groups until ``None`` is dequeued."""
+        running = True
+        while running:
+            batch = [self._mutations.get()]
+            deadline = time.monotonic() + self._commit_interval
+            while batch[-1] is not None and len(batch) < self._max_batch_size:
+                # Waiting pays off only under load - a lone mutation has no one to share with.
+                timeout = max(deadline - time.monotonic(), 0) if len(batch) > 1 else 0
+                try:
+                    batch.append(self._mutations.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if batch:
+                self._commit_batch(connection, batch)
+
+        connection.close()
+
+    @staticmethod
+    def _commit_batch(connection: sqlite3.Connection, batch: list) -> None:
+        """Apply a group of mutations in one transaction and resolve their futures."""
+        outcomes = []
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            for mutation, args, future in batch:
+                connection.execute('SAVEPOINT mutation')
+                try:
+                    result = mutation(connection, *args)
+                except Exception as e:
+                    connection.execute('ROLLBACK TO mutation')
+                    future.set_exception(e)
+                else:
+                    outcomes.append((future, result))
+                connection.execute('RELEASE mutation')
+            connection.execute('COMMIT')
+        except Exception as e:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            for future, _ in outcomes:
+                future.set_exception(e)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future, result in outcomes:
+                future.set_result(result)
+
+    def _write(self, mutation, *args):
+        """
+        Queue a mutation for the writer thread and wait until it's committed.
+
+        :param mutation: a function taking a connection and ``args``
+        :return: what ``mutation`` returned
+        :raise: what ``mutation`` raised
+        """
+        future = Future()
+        self._mutations.put((mutation, args, future))
+        return future.result()
+
+    @contextmanager
+    def _read(self):
+        """Borrow a pooled connection and read within a transaction, getting a consistent view."""
+        connection = self._readers.get()
+        try:
+            connection.execute('BEGIN')
+            try:
+                yield connection
+            finally:
+                connection.execute('COMMIT')
+        finally:
+            self._readers.put(connection)
+
+    @staticmethod
+    def _get_game(connection: sqlite3.Connection, game_id: str) -> tuple:
+        """
+        Find a game.
+
+        :return: a tuple of the moderator ID and decoded cards
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        row = connection.execute('SELECT moderator_id, cards FROM games WHERE game_id = ?',
+                                 (game_id,)).fetchone()
+        if row is None:
+            raise NoSuchGame(game_id)
+        moderator_id, cards = row
+        return moderator_id, load_value(cards)
+
+    @staticmethod
+    def _bump_version(connection: sqlite3.Connection, game_id: str) -> None:
+        """Increment the version of a mutated game."""
+        connection.execute('UPDATE games SET version = version + 1 WHERE game_id = ?', (game_id,))
+
+    @classmethod
+    def _get_round(cls, connection: sqlite3.Connection, game_id: str, round_name: str,
+                   ensure_active: bool = False) -> int:
+        """
+        Find a round.
+
+        :return: number of polls in the round
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise RoundFinalized: if the round has already been finalized and `ensure_active` is True
+        """
+        cls._get_game(connection, game_id)
+        row = connection.execute('SELECT polls, finalized FROM rounds '
+                                 'WHERE game_id = ? AND name = ?',
+                                 (game_id, round_name)).fetchone()
+        if row is None:
+            raise NoSuchRound(game_id, round_name)
+        polls, finalized = row
+        if ensure_active and finalized:
+            raise RoundFinalized(game_id, round_name)
+        return polls
+
+    @property
+    def games_count(self) -> int:
+        """Return games count."""
+        with self._read() as connection:
+            [count] = connection.execute('SELECT count(*) FROM games').fetchone()
+        return count
+
+    def game_ids(self) -> list:
+        """Return IDs of all games, in no particular order."""
+        with self._read() as connection:
+            return [game_id for game_id, in connection.execute('SELECT game_id FROM games')]
+
+    def totals(self) -> dict:
+        """Return the numbers of players, rounds and polls of all games."""
+        with self._read() as connection:
+            [players] = connection.execute('SELECT count(*) FROM players').fetchone()
+            rounds, polls = connection.execute(
+                'SELECT count(*), coalesce(sum(polls), 0) FROM rounds').fetchone()
+        return {'players': players, 'rounds': rounds, 'polls': polls}
+
+    def add_game(self, game_id: str, moderator_id: str, moderator_name: str, cards: list) -> None:
+        """
+        Register a game.
+
+        :param game_id: game's unique ID
+        :param moderator_id: the ID that identifies the game owner
+        :param moderator_name: the name of the game moderator that the players will see
+        :param cards: a list of possible estimations in this game
+        :raise GameExists: if a game with such ID already exists
+        """
+        self._write(self._add_game, game_id, moderator_id, moderator_name, cards)
+
+    @staticmethod
+    def _add_game(connection, game_id, moderator_id, moderator_name, cards):
+        """Insert the game and its moderator as the first player."""
+        try:
+            connection.execute('INSERT INTO games (game_id, moderator_id, cards) VALUES (?, ?, ?)',
+                               (game_id, moderator_id, dump_value(cards)))
+        except sqlite3.IntegrityError:
+            raise GameExists(game_id)
+        connection.execute('INSERT INTO players (game_id, player_id, name) VALUES (?, ?, ?)',
+                           (game_id, moderator_id, moderator_name))
+
+    def add_player(self, game_id, player_id: str, player_name: str) -> None:
+        """
+        Register a player in a game.
+
+        :param game_id: game's unique ID to add a player to
+        :param player_id: player's unique ID
+        :param player_name: player's name to use in this game
+        :raise NoSuchGame: if there is no game with given ID
+        :raise PlayerNameTaken: if there is already a player with such name in the game
+        :raise PlayerAlreadyRegistered: if the player already belongs to the game
+        """
+        self._write(self._add_player, game_id, player_id, player_name)
+
+    @classmethod
+    def _add_player(cls, connection, game_id, player_id, player_name):
+        """Validate and insert the player."""
+        cls._get_game(connection, game_id)
+        registered = connection.execute('SELECT 1 FROM players WHERE game_id = ? AND player_id = ?',
+                                        (game_id, player_id)).fetchone()
+        if registered is not None:
+            raise PlayerAlreadyRegistered(game_id, player_name)
+        try:
+            connection.execute('INSERT INTO players (game_id, player_id, name) VALUES (?, ?, ?)',
+                               (game_id, player_id, player_name))
+        except sqlite3.IntegrityError:
+            raise PlayerNameTaken(game_id, player_name)
+        cls._bump_version(connection, game_id)
+
+    def add_round(self, game_id: str, round_name: str) -> None:
+        """
+        Add next round to a game.
+
+        :param game_id: existing game's unique ID
+        :param round_name: user-provided name of the new round
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with such name in the game
+        """
+        self._write(self._add_round, game_id, round_name)
+
+    @classmethod
+    def _add_round(cls, connection, game_id, round_name):
+        """Validate and append the round to the game."""
+        cls._get_game(connection, game_id)
+        try:
+            connection.execute(
+                'INSERT INTO rounds (game_id, name, position) '
+                'SELECT ?, ?, count(*) FROM rounds WHERE game_id = ?',
+                (game_id, round_name, game_id))
+        except sqlite3.IntegrityError:
+            raise RoundExists(game_id, round_name)
+        cls._bump_version(connection, game_id)
+
+    def add_rounds(self, game_id: str, round_names: list) -> None:
+        """
+        Add many rounds to a game at once, in order.
+
+        :param game_id: existing game's unique ID
+        :param round_names: user-provided names of the new rounds
+        :raise NoSuchGame: if there is no game with such ID
+        :raise RoundExists: if there is already a round with one of the names in the game or
+            a name is repeated
+        """
+        self._write(self._add_rounds, game_id, round_names)
+
+    @classmethod
+    def _add_rounds(cls, connection, game_id, round_names):
+        """Validate all names against the game's rounds in one pass and append the rounds."""
+        cls._get_game(connection, game_id)
+        taken = {name for name, in connection.execute(
+            'SELECT name FROM rounds WHERE game_id = ?', (game_id,))}
+        first_position = len(taken)
+        for round_name in round_names:
+            if round_name in taken:
+                raise RoundExists(game_id, round_name)
+            taken.add(round_name)
+
+        connection.executemany(
+            'INSERT INTO rounds (game_id, name, position) VALUES (?, ?, ?)',
+            ((game_id, round_name, first_position + index)
+             for index, round_name in enumerate(round_names)))
+        cls._bump_version(connection, game_id)
+
+    def add_poll(self, game_id: str, round_name: str) -> None:
+        """
+        Create a poll where players can cast votes.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the round to add a poll to
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise RoundFinalized: if the round has already been finalized
+        """
+        self._write(self._add_poll, game_id, round_name)
+
+    @classmethod
+    def _add_poll(cls, connection, game_id, round_name):
+        """Validate the round and bump its polls counter."""
+        cls._get_round(connection, game_id, round_name, ensure_active=True)
+        connection.execute('UPDATE rounds SET polls = polls + 1 WHERE game_id = ? AND name = ?',
+                           (game_id, round_name))
+        cls._bump_version(connection, game_id)
+
+    def finalize_round(self, game_id: str, round_name: str) -> None:
+        """
+        Accept the current poll and finalize the round.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the round to finalize
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise NoActivePoll: if there no active poll in the round
+        :raise RoundFinalized: if the round has already been finalized
+        """
+        self._write(self._finalize_round, game_id, round_name)
+
+    @classmethod
+    def _finalize_round(cls, connection, game_id, round_name):
+        """Validate and mark the round finalized."""
+        if cls._get_round(connection, game_id, round_name, ensure_active=True) == 0:
+            raise NoActivePoll(game_id, round_name)
+        connection.execute('UPDATE rounds SET finalized = 1 WHERE game_id = ? AND name = ?',
+                           (game_id, round_name))
+        cls._bump_version(connection, game_id)
+
+    def cast_vote(self, game_id: str, round_name: str, voter_id: str, estimation: str) -> None:
+        """
+        Cast a vote for the current poll.
+
+        The vote can be changed until the end of the poll.
+
+        :param game_id: existing game's unique id
+        :param round_name: user-provided name of the new round
+        :param voter_id: ID of the voter (not to be disclosed)
+        :param estimation: the estimation the voter votes for
+        :raise NoSuchGame: if there is no game with such ID
+        :raise NoSuchRound: if there is no round with such name within the game
+        :raise NoActivePoll: if there no active poll in the round
+        :raise RoundFinalized: if the round has already been finalized
+        :raise IllegalEstimation: if the voter voted for a card that doesn't take a part in the game
+        :raise PlayerNotInGame: if the voter ID does not map to any player
+        """
+        self._write(self._cast_vote, game_id, round_name, voter_id, estimation)
+
+    @classmethod
+    def _cast_vote(cls, connection, game_id, round_name, voter_id, estimation):
+        """Validate and store or replace the vote in the latest poll."""
+        polls = cls._get_round(connection, game_id, round_name, ensure_active=True)
+        if polls == 0:
+            raise NoActivePoll(game_id, round_name)
+
+        _, cards = cls._get_game(connection, game_id)
+        if estimation not in cards:
+            raise IllegalEstimation(game_id, estimation)
+        estimation = cards[cards.index(estimation)]  # E.g. the card 1 for a vote for 1.0.
+
+        voter = connection.execute('SELECT name FROM players WHERE game_id = ? AND player_id = ?',
+                                   (game_id, voter_id)).fetchone()
+        if voter is None:
+            raise PlayerNotInGame(game_id, voter_id)
+        [voter_name] = voter
+
+        # Not using 'INSERT OR REPLACE' to keep the position of a changed vote within the poll.
+        vote_key = (game_id, round_name, polls - 1, voter_name)
+        updated = connection.execute(
+            'UPDATE votes SET estimation = ? '
+            'WHERE game_id = ? AND round_name = ? AND poll = ? AND player_name = ?',
+            (dump_value(estimation),) + vote_key)
+        if updated.rowcount == 0:
+            connection.execute(
+                'INSERT INTO votes (game_id, round_name, poll, player_name, estimation) '
+                'VALUES (?, ?, ?, ?, ?)',
+                vote_key + (dump_value(estimation),))
+        cls._bump_version(connection, game_id)
+
+    def serialize_game(self, game_id: str) -> dict:
+        """
+        Fetch and serialize all game's data to a dict.
+
+        :raise NoSuchGame: if there is no game with such ID
+        :return: a dict loselessly serializable to JSON
+        """
+        with self._read() as connection:
+            _, cards = self._get_game(connection, game_id)
+            players = connection.execute(
+                'SELECT name FROM players WHERE game_id = ? ORDER BY rowid', (game_id,))
+            rounds = connection.execute(
+                'SELECT name, polls, finalized FROM rounds WHERE game_id = ? ORDER BY position',
+                (game_id,)).fetchall()
+            votes = connection.execute(
+                'SELECT round_name, poll, player_name, estimation FROM votes WHERE game_id = ? '
+                'ORDER BY rowid', (game_id,))
+
+            serialized_rounds = {
+                name: {'polls': [{} for _ in range(polls)], 'finalized': bool(finalized)}
+                for name, polls, finalized in rounds
+            }
+            histograms = {name: [[0] * len(cards) for _ in range(polls)]
+                          for name, polls, _ in rounds}
+            card_indices = {card: index for index, card in enumerate(cards)}
+            for round_name, poll, player_name, estimation in votes:
+                estimation = load_value(estimation)
+                serialized_rounds[round_name]['polls'][poll][player_name] = estimation
+                histograms[round_name][poll][card_indices[estimation]] += 1
+
+            order = numeric_order(cards)
+            for name, round in serialized_rounds.items():
+                round['statistics'] = [poll_statistics(histogram, cards, order)
+                                       for histogram in histograms[name]]
+
+            return {
+                'players': [name for name, in players],
+                'cards': cards,
+                'rounds_order': [name for name, _, _ in rounds],
+                'rounds': serialized_rounds,
+            }
+
+    def finalized_polls(self, game_id: str) -> FinalizedPolls:
+        """
+        Return the last polls of the finalized rounds of a game, as compact arrays.
+
+        Reads the votes with a single query, without serializing the game.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        with self._read() as connection:
+            _, cards = self._get_game(connection, game_id)
+            player_slots = {name: slot for slot, (name,) in enumerate(connection.execute(
+                'SELECT name FROM players WHERE game_id = ? ORDER BY rowid', (game_id,)))}
+            # Rounds whose last poll has no votes get a row of NULLs.
+            rows = connection.execute(
+                'SELECT rounds.position, rounds.polls, votes.player_name, votes.estimation '
+                'FROM rounds LEFT JOIN votes ON votes.game_id = rounds.game_id '
+                'AND votes.round_name = rounds.name AND votes.poll = rounds.polls - 1 '
+                'WHERE rounds.game_id = ? AND rounds.finalized '
+                'ORDER BY rounds.position, votes.rowid', (game_id,)).fetchall()
+
+        # Encoded cards to their indices, so estimations need not be decoded one by one.
+        card_indices = {dump_value(card): index for index, card in enumerate(cards)}
+        round_polls = array(VOTES_TYPECODE)
+        round_votes = array(VOTES_TYPECODE)
+        votes = array(VOTES_TYPECODE)
+        last_position = None
+        for position, polls, player_name, estimation in rows:
+            if position != last_position:
+                last_position = position
+                round_polls.append(polls)
+                round_votes.append(0)
+            if player_name is not None:
+                round_votes[-1] += 1
+                card_index = card_indices.get(estimation)
+                if card_index is None:  # Stored before votes became the game's cards, e.g. 1.0.
+                    card_index = card_indices[estimation] = cards.index(load_value(estimation))
+                votes.append(player_slots[player_name])
+                votes.append(card_index)
+        return FinalizedPolls(cards, round_polls, round_votes, votes)
+
+    def get_game_version(self, game_id: str) -> int:
+        """
+        Return the version of a game, incremented by every mutation.
+
+        :raise NoSuchGame: if there is no game with such ID
+        """
+        with self._read() as connection:
+            row = connection.execute('SELECT version FROM games WHERE game_id = ?',
+                                     (game_id,)).fetchone()
+        if row is None:
+            raise NoSuchGame(game_id)
+        [version] = row
+        return version
+
+    def client_owns_game(self, game_id: str, client_id: str) -> bool:
+        """
+        Check if a client is the moderator of the game.
+
+        :param game_id: unique ID of the game to check for ownership
+        :param client_id: ID of the client
+        :return: True if a client is the moderator of the game
+        """
+        with self._read() as connection:
+            moderator_id, _ = self._get_game(connection, game_id)
+        return moderator_id == str(client_id)
@@ -0,0 +1,80 @@
+"""Persistence backend selection by URI."""
+from urllib.parse import urlsplit
+import posixpath
+
+from planningpoker.sharding import Shard
+from planningpoker.persistence.base import BasePersistence
+from planningpoker.persistence.memory import ProcessMemoryPersistence
+from planningpoker.persistence.journal import JournaledMemoryPersistence
+from planningpoker.persistence.sqlite import SQLitePersistence
+
+DEFAULT_PERSISTENCE_URI = 'memory://'
+
+
+def _local_path(uri: str) -> str:
+    """
+    Extract the path from a URI of the form ``scheme:///path``.
+
+    :raise ValueError: if the URI does not have such form
+    """
+    scheme = urlsplit(uri).scheme
+    prefix = scheme + ':///'
+    path = uri[len(prefix):]
+    if not uri.startswith(prefix) or path == '':
+        raise ValueError('%s URIs must have the form %spath, got %r.' % (scheme, prefix, uri))
+    return path
+
+
+def backend_from_uri(uri: str, *, game_ttl: float = None,
+                     read_only: bool = False) -> BasePersistence:
+    """
+    Instantiate the persistence backend described by a URI.
+
+    Supported URIs:
+        - ``memory://`` - ``ProcessMemoryPersistence``
+        - ``memory:///relative/path``, ``memory:////absolute/path`` -
+          ``JournaledMemoryPersistence`` keeping its journal in the directory
+        - ``sqlite:///relative/path.sqlite3``, ``sqlite:////absolute/path.sqlite3`` -
+          ``SQLitePersistence``
+        - ``redis://[:password@]host[:port][/db]`` - ``RedisPersistence``, requires the ``redis``
+          package
+
+    :param game_ttl: seconds since the last access after which games are removed; supported only
+        by the memory backends, ``None`` keeps games forever
+    :param read_only: open a journal only to read the state, e.g. of a running application -
+        see ``JournaledMemoryPersistence``
+    :raise ValueError: if the URI does not describe a supported backend or the backend does not
+        support ``game_ttl``
+    """
+    scheme = urlsplit(uri).scheme
+
+    if scheme == 'memory':
+        if uri in ('memory:', 'memory://'):
+            return ProcessMemoryPersistence(game_ttl=game_ttl)
+        return JournaledMemoryPersistence(_local_path(uri), game_ttl=game_ttl,
+                                          read_only=read_only)
+
+    if scheme in ('sqlite', 'redis') and game_ttl is not None:
+        raise ValueError('Game expiry is supported only by memory:// backends.')
+
+    if scheme == 'sqlite':
+        return SQLitePersistence(_local_path(uri))
+
+    if scheme == 'redis':
+        # Optional dependency.
+        from planningpoker.persistence.redis import RedisPersistence
+        return RedisPersistence.from_url(uri)
+
+    raise ValueError('Unsupported persistence URI: %r.' % uri)
+
+
+def shard_persistence_uri(uri: str, shard: Shard) -> str:
+    """
+    Return the URI of the backend for a worker serving a shard of games.
+
+    Backends storing state in the worker's memory get a journal directory per shard. Backends
+    storing state elsewhere are shared.
+    """
+    if urlsplit(uri).scheme == 'memory' and uri not in ('memory:', 'memory://'):
+        return posixpath.join(uri, 'shard-%d' % shard.index)
+    return uri
@@ -0,0 +1,179 @@
+"""
+Sampling request profiler.
+
+When enabled, one request in ``sample_every`` of each route runs under ``cProfile``. Stats of
+profiled requests are added up per route and written, as text reports, to a rotating file.
+
+The profiler is toggled at runtime - with ``SIGUSR2`` or the ``/admin/profiler`` endpoint. While it
+is disabled the middleware hands requests straight to the view, so it costs one attribute check
+per request.
+"""
+import io
+import pstats
+import cProfile
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+# Profile one request in this many of each route.
+PROFILE_EVERY = 100
+
+# Write the stats collected so far to the file after this many profiled requests.
+DUMP_EVERY = 100
+
+# Seconds after which a request stops being profiled, finished or not.
+PROFILE_TIME_LIMIT = 1.0
+
+# Routes holding their responses open for as long as clients watch a game - never profiled.
+LONG_LIVED_ROUTES = frozenset(['game_socket', 'game_events', 'get_changes'])
+
+# Functions listed in the report of each route.
+REPORT_FUNCTIONS = 30
+
+# Size of the file at which it's rotated and the number of rotated files to keep.
+MAX_FILE_BYTES = 10 * 1024 * 1024
+BACKUP_FILES = 5
+
+
+class RequestProfiler:
+
+    """
+    Profiles sampled requests and aggregates their stats per route.
+
+    Only one request is profiled at a time: ``cProfile`` hooks the whole thread, so the profile of
+    a request includes whatever other tasks run on the event loop while the request waits. Samples
+    falling on an already profiled request are skipped. Profiling stops after ``time_limit``
+    seconds, so a slow request does not keep the whole loop profiled.
+
+    Reports are formatted and written by a thread of the profiler, not on the event loop.
+    """
+
+    def __init__(self, loop, sample_every: int = PROFILE_EVERY, path: str = None, *,
+                 dump_every: int = DUMP_EVERY, time_limit: float = PROFILE_TIME_LIMIT,
+                 skipped_routes: frozenset = LONG_LIVED_ROUTES, max_bytes: int = MAX_FILE_BYTES,
+                 backup_count: int = BACKUP_FILES):
+        """
+        Create a disabled profiler.
+
+        :param sample_every: profile one request in this many of each route
+        :param path: the file to write reports to; None keeps them in memory only
+        :param dump_every: write reports after this many profiled requests
+        :param time_limit: seconds after which a request stops being profiled
+        :param skipped_routes: names of routes never to profile
+        :param max_bytes: size of the file at which it's rotated
+        :param backup_count: number of rotated files to keep
+        """
+        self._loop = loop
+        self.enabled = False
+        self.sample_every = sample_every
+        self.dump_every = dump_every
+        self.time_limit = time_limit
+        self.profiled_requests = 0
+        self._skipped_routes = skipped_routes
+        self._seen = Counter()  # Requests by route name, since enabled.
+        self._profiled = Counter()  # Profiled requests by route name, since the last dump.
+        self._stats = {}  # Route names to ``pstats.Stats``, since the last dump.
+        self._current = None  # The profile of the request being profiled.
+        self._file = None
+        self._writer = ThreadPoolExecutor(1)
+        if path is not None:
+            self._file = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                             delay=True)
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Turn profiling on or off, writing the stats collected so far when turning it off."""
+        if self.enabled and not enabled:
+            self.dump()
+        elif enabled and not self.enabled:
+            self._seen.clear()
+        self.enabled = enabled
+
+    def toggle(self) -> None:
+        """Turn profiling on if off and vice versa."""
+        self.set_enabled(not self.enabled)
+
+    def should_profile(self, route_name: (str, None)) -> bool:
+        """Count a request and tell if it's the one in ``sample_every`` to profile."""
+        if route_name in self._skipped_routes:
+            return False
+        self._seen[route_name] += 1
+        return self._current is None and self._seen[route_name] % self.sample_every == 0
+
+    async def profile(self, route_name: (str, None), handler, request):
+        """
+        Handle a request under the profiler and add its stats to the ones of the route.
+
+        Profiling stops once the request is handled or ``time_limit`` passes, whichever is first.
+        """
+        profile = self._current = cProfile.Profile()
+        profile.enable()
+        timer = self._loop.call_later(self.time_limit, self._finish, route_name, profile)
+        try:
+            return await handler(request)
+        finally:
+            timer.cancel()
+            self._finish(route_name, profile)
+
+    def _finish(self, route_name: (str, None), profile: cProfile.Profile) -> None:
+        """Stop profiling a request, unless stopped already, and add its stats to the route's."""
+        if self._current is not profile:
+            return
+        profile.disable()
+        self._current = None
+
+        stats = self._stats.get(route_name)
+        if stats is None:
+            self._stats[route_name] = pstats.Stats(profile)
+        else:
+            stats.add(profile)
+        self._profiled[route_name] += 1
+        self.profiled_requests += 1
+        if self.profiled_requests % self.dump_every == 0:
+            self.dump()
+
+    def report(self) -> str:
+        """Return the functions taking the most time in profiled requests of each route."""
+        return format_report(self._stats, self._profiled)
+
+    def dump(self) -> None:
+        """Have the report written to the file, if any, and start collecting stats anew."""
+        if not self._stats:
+            return
+        if self._file is not None:
+            self._loop.run_in_executor(self._writer, self._write, self._stats, self._profiled)
+        self._stats = {}
+        self._profiled = Counter()
+
+    def _write(self, stats: dict, profiled: Counter) -> None:
+        """Format a report and write it to the file - in the thread of the profiler."""
+        self._file.handle(logging.makeLogRecord({'msg': format_report(stats, profiled)}))
+
+    async def flush(self) -> None:
+        """Wait until reports dumped so far are written."""
+        await self._loop.run_in_executor(self._writer, lambda: None)
+
+    async def close(self) -> None:
+        """Write the stats collected so far and close the file."""
+        self.dump()
+        await self.flush()
+        self._writer.shutdown()
+        if self._file is not None:
+            self._file.close()
+
+
+def format_report(stats: dict, profiled: Counter) -> str:
+    """
+    Return the functions taking the most time in profiled requests of each route.
+
+    :param stats: route names to ``pstats.Stats`` of their requests
+    :param profiled: route names to the numbers of their profiled requests
+    """
+    buffer = io.StringIO()
+    for route_name in sorted(stats, key=str):
+        print('=== Route %s: %d profiled requests' % (route_name, profiled[route_name]),
+              file=buffer)
+        route_stats = stats[route_name]
+        route_stats.stream = buffer
+        route_stats.sort_stats('cumulative').print_stats(REPORT_FUNCTIONS)
+    return buffer.getvalue()
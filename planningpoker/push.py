@@ -0,0 +1,194 @@
+"""
+Pushing game updates to subscribed clients.
+
+A game with subscribers has a single publishing task. After every change of the game it encodes
+the update once and hands it to every subscription. A subscription holds only the latest update
+its client has not taken yet - a client too slow to keep up skips intermediate versions instead of
+queueing them.
+
+Updates are delivered as WebSocket messages and as Server-Sent Events. Each form is encoded at most
+once per update and shared by all subscriptions, so an idle subscriber costs one small object.
+"""
+import asyncio
+
+from planningpoker.json import dump_to_json, dump_with_encoded_values
+from planningpoker.persistence import BaseAsyncPersistence
+from planningpoker.persistence.exceptions import GameError
+
+# The last message of a subscription - the game was removed, e.g. for being idle.
+GONE_MESSAGE = dump_to_json({'type': 'gone'})
+GONE_EVENT = ('event: gone\ndata: %s\n\n' % GONE_MESSAGE).encode()
+
+
+class Update:
+
+    """An encoded game update, shared by all subscriptions."""
+
+    __slots__ = ('version', 'message', '_epoch', '_event')
+
+    def __init__(self, epoch: str, version: int, message: str):
+        """
+        Create an update.
+
+        :param epoch: the epoch of the persistence the game version comes from
+        :param message: the update as a JSON message
+        """
+        self.version = version
+        self.message = message
+        self._epoch = epoch
+        self._event = None
+
+    @property
+    def event(self) -> bytes:
+        """The update as a Server-Sent Event, encoded on first use."""
+        if self._event is None:
+            self._event = ('id: %s\nevent: game\ndata: %s\n\n' % (
+                event_id(self._epoch, self.version), self.message)).encode()
+        return self._event
+
+
+def event_id(epoch: str, version: int) -> str:
+    """Return the ID of the Server-Sent Event of a game version."""
+    return '%s-%d' % (epoch, version)
+
+
+def parse_event_id(last_event_id: (str, None), epoch: str) -> (int, None):
+    """
+    Return the game version a Server-Sent Event ID refers to.
+
+    :return: the version, or None if the ID is missing, malformed or from another epoch - the
+        version numbers of a different persistence say nothing about this one
+    """
+    if not last_event_id:
+        return None
+    id_epoch, _, version = last_event_id.strip().rpartition('-')
+    if id_epoch != epoch or not version.isdigit():
+        return None
+    return int(version)
+
+
+class Subscription:
+
+    """The latest update of a game not yet taken by a client."""
+
+    __slots__ = ('version', 'update', 'ended', '_waiter')
+
+    def __init__(self):
+        """Start with no update."""
+        self.version = None
+        self.update = None
+        self.ended = False
+        self._waiter = None
+
+    def _wake(self) -> None:
+        """Wake the client waiting in ``next``."""
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _time_out(self, timeout: asyncio.Future) -> None:
+        """Wake the client waiting in ``next`` when its timeout resolves."""
+        self._wake()
+
+    def offer(self, update: Update) -> None:
+        """Replace the pending update, unless the subscription has seen a newer one."""
+        if self.version is not None and self.version >= update.version:
+            return
+        self.version = update.version
+        self.update = update
+        self._wake()
+
+    def end(self) -> None:
+        """Mark that there will be no more updates, e.g. because the game expired."""
+        self.ended = True
+        self._wake()
+
+    async def next(self, loop: asyncio.AbstractEventLoop,
+                   timeout: asyncio.Future = None) -> (Update, None):
+        """
+        Wait for an update and take it.
+
+        :param timeout: a future that ends the wait when resolved, e.g. a shared timeout
+        :return: the update or None if there will be no more
+        :raise asyncio.TimeoutError: if ``timeout`` resolved before any update came
+        """
+        while self.update is None and not self.ended:
+            if timeout is not None and timeout.done():
+                raise asyncio.TimeoutError()
+            self._waiter = asyncio.Future(loop=loop)
+            if timeout is not None:
+                timeout.add_done_callback(self._time_out)
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timeout is not None:
+                    timeout.remove_done_callback(self._time_out)
+        update, self.update = self.update, None
+        return update
+
+
+def encode_update(epoch: str, version: int, encoded_game: bytes) -> Update:
+    """Encode a game update."""
+    return Update(epoch, version, dump_with_encoded_values({'type': 'game', 'version': version},
+                                                           game=encoded_game).decode())
+
+
+class GamePublisher:
+
+    """Publishes updates of games to their subscriptions."""
+
+    def __init__(self, persistence: BaseAsyncPersistence, loop: asyncio.AbstractEventLoop):
+        """Start with no subscriptions."""
+        self._persistence = persistence
+        self._loop = loop
+        self._subscriptions = {}
+        self._publishers = {}
+
+    def subscribe(self, game_id: str) -> Subscription:
+        """
+        Subscribe to updates of a game.
+
+        Updates are published on changes, so a subscriber wanting the current state should offer
+        it to the subscription itself - after subscribing, so that no change is missed.
+        """
+        subscription = Subscription()
+        try:
+            self._subscriptions[game_id].add(subscription)
+        except KeyError:
+            self._subscriptions[game_id] = {subscription}
+            self._publishers[game_id] = self._loop.create_task(self._publish(game_id))
+        return subscription
+
+    def unsubscribe(self, game_id: str, subscription: Subscription) -> None:
+        """Stop publishing to a subscription, and the game's publisher if it was the last one."""
+        subscriptions = self._subscriptions.get(game_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[game_id]
+            self._publishers.pop(game_id).cancel()
+
+    def close(self) -> None:
+        """Stop all publishers."""
+        for publisher in self._publishers.values():
+            publisher.cancel()
+        self._publishers.clear()
+        self._subscriptions.clear()
+
+    async def _publish(self, game_id: str) -> None:
+        """Publish every change of the game until cancelled or the game is gone."""
+        changes = self._persistence.changes
+        while True:
+            changed = changes.changed(game_id)
+            try:
+                version, encoded_game = await self._persistence.encode_game(game_id)
+            except GameError:
+                # Gone or expired - there will be no more changes.
+                for subscription in self._subscriptions[game_id]:
+                    subscription.end()
+                return
+            update = encode_update(self._persistence.epoch, version, encoded_game)
+            for subscription in self._subscriptions[game_id]:
+                subscription.offer(update)
+            await changed
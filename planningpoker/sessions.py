@@ -0,0 +1,124 @@
+"""
+Session storage caching decrypted cookies.
+
+Clients send the same session cookie with every request. Decrypting it - a Fernet HMAC check,
+an AES decryption and a JSON parse - costs more than most views, so recently seen cookies are kept
+decrypted in memory.
+"""
+import time
+from collections import OrderedDict
+
+from aiohttp_session import Session
+from aiohttp_session.cookie_storage import EncryptedCookieStorage
+
+# Most recently used cookies to keep decrypted.
+SESSION_CACHE_SIZE = 10000
+
+# Seconds to keep a decrypted cookie for.
+SESSION_CACHE_TTL = 300
+
+
+class CachingEncryptedCookieStorage(EncryptedCookieStorage):
+
+    """
+    ``EncryptedCookieStorage`` keeping the data of recently seen cookies decrypted.
+
+    Cookies themselves are the keys of an LRU cache, so only a cookie identical to one that was
+    decrypted before - or set by the storage - can hit it. Entries expire after ``ttl`` seconds or
+    when their cookie does - ``max_age`` seconds after the ``created`` time it holds - whichever is
+    first, so cookies past their age are decrypted again.
+
+    Sessions saved with the data their request's cookie already holds are not encrypted and set
+    again.
+
+    ``hits``, ``misses`` and ``skipped_saves`` count cookies found in the cache, cookies decrypted
+    and saves avoided.
+    """
+
+    def __init__(self, secret_key, *, cache_size: int = SESSION_CACHE_SIZE,
+                 ttl: float = SESSION_CACHE_TTL, clock=time.time, **kwargs):
+        """
+        Create the storage.
+
+        :param secret_key: the key to encrypt cookies with, as taken by ``EncryptedCookieStorage``
+        :param cache_size: the most cookies to keep decrypted
+        :param ttl: seconds to keep a decrypted cookie for
+        :param clock: function returning the current Unix time in seconds
+        :param kwargs: cookie parameters, as taken by ``EncryptedCookieStorage``
+        """
+        super().__init__(secret_key, **kwargs)
+        self._cache = OrderedDict()  # Cookies to their data and expiry times.
+        self._cache_size = cache_size
+        self._ttl = ttl
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.skipped_saves = 0
+
+    @property
+    def hit_rate(self) -> (float, None):
+        """Return the share of cookies found in the cache, None before any was looked up."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def _cached_data(self, cookie: str) -> (dict, None):
+        """Return the cached data of a cookie, unless it is missing or expired."""
+        try:
+            data, expiry = self._cache[cookie]
+        except KeyError:
+            return None
+        if expiry <= self._clock():
+            del self._cache[cookie]
+            return None
+        self._cache.move_to_end(cookie)
+        return data
+
+    def _cache_data(self, cookie: str, data: dict) -> None:
+        """Remember the decrypted data of a cookie, evicting the least recently used ones."""
+        expiry = self._clock() + self._ttl
+        if self.max_age is not None:
+            expiry = min(expiry, data['created'] + self.max_age)
+        self._cache[cookie] = data, expiry
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _session_data(session: Session) -> dict:
+        """Return a copy of the data of a session, as stored in its cookie."""
+        return {'created': session.created, 'session': dict(session)}
+
+    async def load_session(self, request) -> Session:
+        """Return the session from the cookie of the request, decrypting it if not cached."""
+        cookie = self.load_cookie(request)
+        if cookie is not None:
+            data = self._cached_data(cookie)
+            if data is not None:
+                self.hits += 1
+                return Session(None, data=data, new=False)
+
+        session = await super().load_session(request)
+        if cookie is not None:
+            self.misses += 1
+            if not session.new:
+                self._cache_data(cookie, self._session_data(session))
+        return session
+
+    async def save_session(self, request, response, session: Session) -> None:
+        """
+        Set the cookie with the session data, unless the request's cookie already holds it.
+
+        A new cookie is cached right away, so the next request with it need not decrypt it.
+        """
+        if session.empty or session.max_age is not None:
+            await super().save_session(request, response, session)
+            return
+
+        data = self._session_data(session)
+        cookie = self.load_cookie(request)
+        if cookie is not None and self._cached_data(cookie) == data:
+            self.skipped_saves += 1
+            return
+        await super().save_session(request, response, session)
+        morsel = response.cookies.get(self.cookie_name)
+        if morsel is not None:
+            self._cache_data(morsel.value, data)
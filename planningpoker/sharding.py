@@ -0,0 +1,50 @@
+"""
+Assigning games to worker processes.
+
+Every game is owned by exactly one worker - the one whose index is the game ID's hash modulo
+the number of workers. Workers create games only with IDs they own, so routing a request needs
+nothing but the game ID from its path.
+"""
+import re
+import types
+from collections import namedtuple
+from zlib import crc32
+
+from planningpoker.random_id import get_random_id
+
+Shard = namedtuple('Shard', ['index', 'count'])
+SINGLE_SHARD = Shard(0, 1)
+
+GAME_PATH_PATTERN = re.compile(r'^/game/(?P<game_id>[^/]+)')
+
+
+def game_shard(game_id: str, count: int) -> int:
+    """Return the index of the shard owning a game."""
+    return crc32(game_id.encode()) % count
+
+
+def get_shard_game_id(shard: Shard, get_id: types.FunctionType = get_random_id) -> str:
+    """
+    Get a random game ID owned by the shard.
+
+    Draws IDs until one hashes to the shard - ``shard.count`` draws are needed on average.
+
+    :param shard: the shard to get an ID for
+    :param get_id: function returning random IDs
+    """
+    while True:
+        game_id = get_id()
+        if shard.count == 1 or game_shard(game_id, shard.count) == shard.index:
+            return game_id
+
+
+def path_shard(path: str, count: int) -> (int, None):
+    """
+    Return the index of the shard that must handle a request to the path.
+
+    :return: shard index or None if any shard can handle it
+    """
+    match = GAME_PATH_PATTERN.match(path)
+    if match is None:
+        return None
+    return game_shard(match.group('game_id'), count)
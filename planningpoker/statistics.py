@@ -0,0 +1,69 @@
+"""
+Statistics of polls, computed from histograms of votes.
+
+A histogram holds the number of votes for each card of the game, by card index. Persistence
+backends keep them up to date as votes are cast, so statistics take time proportional to the
+number of cards, however many players vote.
+"""
+from decimal import Decimal
+
+
+def is_numeric(card) -> bool:
+    """Tell if a card is a finite number, such as numeric cards returned by ``coerce_cards``."""
+    if isinstance(card, Decimal):
+        return card.is_finite()
+    return isinstance(card, int) and not isinstance(card, bool)
+
+
+def numeric_order(cards: list) -> list:
+    """Return indices of numeric cards, sorted by their values."""
+    return sorted((index for index, card in enumerate(cards) if is_numeric(card)),
+                  key=cards.__getitem__)
+
+
+def poll_statistics(histogram, cards: list, order: list) -> dict:
+    """
+    Compute statistics of a poll.
+
+    Mean, median, min and max are taken over votes for numeric cards and are None if there are
+    none. The consensus means at least one vote was cast and all votes are for the same card.
+
+    :param histogram: the number of votes for each card, by card index
+    :param cards: cards of the game
+    :param order: indices of numeric cards, as returned by ``numeric_order``
+    :return: a dict of JSON-serializable values
+    """
+    count = sum(histogram)
+    numeric_counts = [(Decimal(cards[index]), histogram[index])
+                      for index in order if histogram[index]]
+    statistics = {
+        'count': count,
+        'histogram': list(histogram),
+        'consensus': count > 0 and max(histogram) == count,
+        'mean': None,
+        'median': None,
+        'min': None,
+        'max': None,
+    }
+    if not numeric_counts:
+        return statistics
+
+    numeric_count = sum(votes for _, votes in numeric_counts)
+    statistics['mean'] = sum(value * votes for value, votes in numeric_counts) / numeric_count
+    statistics['median'] = _median(numeric_counts, numeric_count)
+    statistics['min'] = numeric_counts[0][0]
+    statistics['max'] = numeric_counts[-1][0]
+    return statistics
+
+
+def _median(numeric_counts: list, numeric_count: int) -> Decimal:
+    """Return the median of sorted ``(value, number of votes)`` pairs."""
+    lower_position, upper_position = (numeric_count - 1) // 2, numeric_count // 2
+    lower = None
+    seen = 0
+    for value, votes in numeric_counts:
+        seen += votes
+        if lower is None and seen > lower_position:
+            lower = value
+        if seen > upper_position:
+            return lower if lower == value else (lower + value) / 2
@@ -0,0 +1,98 @@
+"""
+Expiring keys that have not been touched for a while.
+
+A hashed timing wheel: time is divided into ticks of ``resolution`` seconds and every key sits in
+the slot of the tick its deadline falls into (modulo the number of slots). Advancing the wheel
+only looks at the slots of the ticks that passed, so the cost does not depend on the total number
+of keys.
+
+Touching a key that is already on the wheel only records its new deadline - the key is moved to
+the right slot when the wheel reaches the slot it sits in. That keeps touching O(1), which matters
+because keys are touched far more often than they expire.
+"""
+import math
+import time
+import types
+
+
+class TimingWheel:
+
+    """Keys expiring ``timeout`` seconds after they were last touched."""
+
+    def __init__(self, timeout: float, resolution: float,
+                 clock: types.FunctionType = time.monotonic):
+        """
+        Create an empty wheel.
+
+        :param timeout: seconds after the last touch a key expires after
+        :param resolution: length of a tick in seconds; keys expire up to that much late
+        :param clock: function returning the current time in seconds
+        """
+        self.timeout = timeout
+        self.resolution = resolution
+        self._clock = clock
+        # A deadline is at most ``timeout`` plus one partial tick ahead; one more slot makes sure
+        # a key never lands in the slot being processed.
+        self._slots = [set() for _ in range(math.ceil(timeout / resolution) + 2)]
+        self._deadlines = {}
+        self._tick = self._current_tick()
+
+    def __len__(self) -> int:
+        """Return the number of keys on the wheel."""
+        return len(self._deadlines)
+
+    def __contains__(self, key) -> bool:
+        """Check if a key is on the wheel."""
+        return key in self._deadlines
+
+    def _current_tick(self) -> int:
+        """Return the number of the tick the clock is in."""
+        return int(self._clock() // self.resolution)
+
+    def _deadline_tick(self, deadline: float) -> int:
+        """Return the number of the first tick processing of which expires the deadline."""
+        return math.ceil(deadline / self.resolution)
+
+    def _schedule(self, key, deadline: float) -> None:
+        """Put a key in the slot of its deadline."""
+        self._slots[self._deadline_tick(deadline) % len(self._slots)].add(key)
+
+    def touch(self, key) -> None:
+        """Put a key on the wheel or postpone its expiry."""
+        deadline = self._clock() + self.timeout
+        if key not in self._deadlines:
+            self._schedule(key, deadline)
+        self._deadlines[key] = deadline
+
+    def discard(self, key) -> None:
+        """Take a key off the wheel if it's there."""
+        # The key stays in its slot until the wheel gets there and finds no deadline for it.
+        self._deadlines.pop(key, None)
+
+    def advance(self) -> list:
+        """
+        Process the ticks that passed since the last call.
+
+        :return: keys that expired, taken off the wheel
+        """
+        now_tick = self._current_tick()
+        slots_count = len(self._slots)
+        # After a long pause every slot is visited once - there's nothing more to find.
+        first_tick = max(self._tick + 1, now_tick - slots_count + 1)
+        self._tick = now_tick
+
+        expired = []
+        for tick in range(first_tick, now_tick + 1):
+            index = tick % slots_count
+            keys, self._slots[index] = self._slots[index], set()
+            for key in keys:
+                try:
+                    deadline = self._deadlines[key]
+                except KeyError:
+                    continue  # Discarded.
+                if self._deadline_tick(deadline) <= now_tick:
+                    del self._deadlines[key]
+                    expired.append(key)
+                else:
+                    self._schedule(key, deadline)
+        return expired
@@ -1 +1 @@
-from planningpoker.views import status, moderator, player  # noqa
+from planningpoker.views import status, game, moderator, player, push, export, admin  # noqa
@@ -0,0 +1,136 @@
+"""
+Views for the operators of the application, guarded by the admin token.
+
+Admin endpoints are enabled by the ``--admin-token`` option and require the token in
+the ``Authorization: Bearer <token>`` header.
+"""
+import asyncio
+import hmac
+
+from aiohttp import web, hdrs
+
+from planningpoker.routing import route
+from planningpoker.sharding import game_shard
+from planningpoker.json import json_response, loads_or_empty
+from planningpoker.persistence.exceptions import NoSuchGame
+
+# Games loaded between yielding to other tasks of the event loop.
+ANALYTICS_GAMES_BATCH = 100
+
+
+def check_admin(request) -> (web.Response, None):
+    """
+    Check if the request carries the admin token.
+
+    :return: the error response to return or None if the request is authorized
+    """
+    admin_token = request.app['admin_token']
+    if admin_token is None:
+        return json_response({'error': 'Admin endpoints are disabled.'}, status=404)
+    authorization = request.headers.get(hdrs.AUTHORIZATION, '')
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(),
+                                                             admin_token.encode()):
+        return json_response({'error': 'Invalid admin token.'}, status=403)
+    return None
+
+
+async def collect_columns(request, persistence, builder) -> None:
+    """
+    Add the finalized rounds of games of the request's shard to an ``analytics.ColumnsBuilder``.
+
+    Games are read through the persistence, a batch at a time. A shared backend holds the games of
+    every shard, so each worker collects only the games it owns.
+    """
+    shard = request.app['shard']
+    for number, game_id in enumerate(await persistence.game_ids(), 1):
+        if game_shard(game_id, shard.count) != shard.index:
+            continue
+        try:
+            builder.add_game(game_id, await persistence.finalized_polls(game_id))
+        except NoSuchGame:
+            continue  # Removed in the meantime.
+        if number % ANALYTICS_GAMES_BATCH == 0:
+            await asyncio.sleep(0)
+
+
+@route('GET', '/admin/analytics')
+async def get_analytics(request, persistence):
+    """
+    Respond with analytics of finalized rounds of all games.
+
+    The vectorized analysis runs in the default executor. With more than one worker process
+    the dispatcher serves this endpoint, merging the columns of all workers.
+    """
+    error = check_admin(request)
+    if error is not None:
+        return error
+    try:
+        from planningpoker import analytics
+    except ImportError:
+        return json_response({'error': 'Analytics require the numpy package.'}, status=501)
+
+    builder = analytics.ColumnsBuilder()
+    await collect_columns(request, persistence, builder)
+    report = await request.app.loop.run_in_executor(None, analytics.analyze, builder.build())
+    return json_response(report)
+
+
+@route('GET', '/admin/analytics/columns')
+async def get_analytics_columns(request, persistence):
+    """Respond with the dump of a ``ColumnsBuilder`` of the games of this worker's shard."""
+    error = check_admin(request)
+    if error is not None:
+        return error
+    try:
+        from planningpoker import analytics
+    except ImportError:
+        return json_response({'error': 'Analytics require the numpy package.'}, status=501)
+
+    builder = analytics.ColumnsBuilder()
+    await collect_columns(request, persistence, builder)
+    return json_response(builder.dump())
+
+
+def profiler_state(profiler) -> dict:
+    """Return the settings of the request profiler and its report of the stats collected so far."""
+    return {
+        'enabled': profiler.enabled,
+        'sample_every': profiler.sample_every,
+        'profiled_requests': profiler.profiled_requests,
+        'report': profiler.report(),
+    }
+
+
+@route('GET', '/admin/profiler')
+async def get_profiler(request, persistence):
+    """
+    Respond with the state of the request profiler.
+
+    With more than one worker process the dispatcher sends the request to every worker and
+    responds with their states as ``{"workers": [...]}``.
+    """
+    error = check_admin(request)
+    if error is not None:
+        return error
+    return json_response(profiler_state(request.app['profiler']))
+
+
+@route('POST', '/admin/profiler')
+async def set_profiler(request, persistence):
+    """
+    Turn the request profiler on or off, as requested by the ``enabled`` boolean.
+
+    With more than one worker process, the profilers of all workers - see ``get_profiler``.
+    """
+    error = check_admin(request)
+    if error is not None:
+        return error
+    json = await request.json(loads=loads_or_empty)
+    enabled = json.get('enabled') if isinstance(json, dict) else None
+    if not isinstance(enabled, bool):
+        return json_response({'error': 'The enabled flag must be a boolean.'}, status=400)
+
+    profiler = request.app['profiler']
+    profiler.set_enabled(enabled)
+    return json_response(profiler_state(profiler))
@@ -0,0 +1,73 @@
+"""Views exporting the history of games."""
+import io
+import csv
+from itertools import islice
+
+from aiohttp import web, hdrs
+
+from planningpoker.routing import route
+from planningpoker.json import json_response, dump_to_json
+from planningpoker.persistence.base import VoteRecord
+from planningpoker.persistence.exceptions import NoSuchGame
+
+# Votes formatted and written at a time.
+EXPORT_CHUNK_SIZE = 500
+
+
+def format_ndjson(records: list) -> str:
+    """Format vote records as lines of JSON objects."""
+    return ''.join(dump_to_json(record._asdict()) + '\n' for record in records)
+
+
+def format_csv(records: list) -> str:
+    """Format vote records as CSV rows."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(records)
+    return buffer.getvalue()
+
+
+# Formats by name: content type, header and the function formatting a chunk of records.
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', '', format_ndjson),
+    'csv': ('text/csv', format_csv([VoteRecord._fields]), format_csv),
+}
+
+
+@route('GET', '/game/{game_id}/export')
+async def export_game(request, persistence):
+    """
+    Stream every vote of the game, one line per vote, as NDJSON (the default) or CSV.
+
+    Votes come from a snapshot taken when the export starts; they are formatted and sent in chunks
+    of ``EXPORT_CHUNK_SIZE``, so the export as a whole is never held in memory.
+    """
+    game_id = request.match_info['game_id']
+    format_name = request.GET.get('format', 'ndjson')
+    try:
+        content_type, header, format_records = EXPORT_FORMATS[format_name]
+    except KeyError:
+        return json_response({'error': 'The format must be one of: %s.'
+                                       % ', '.join(sorted(EXPORT_FORMATS))}, status=400)
+    try:
+        records = await persistence.export_votes(game_id)
+    except NoSuchGame:
+        return json_response({'error': 'There is no such game.'}, status=404)
+
+    response = web.StreamResponse(headers={
+        hdrs.CONTENT_DISPOSITION: 'attachment; filename="game-%s.%s"' % (game_id, format_name),
+    })
+    response.content_type = content_type
+    response.charset = 'utf-8'
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    if header:
+        response.write(header.encode())
+    while True:
+        chunk = list(islice(records, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        response.write(format_records(chunk).encode())
+        await response.drain()
+    await response.write_eof()
+    return response
@@ -0,0 +1,110 @@
+"""Views and helpers for reading game state."""
+import asyncio
+
+from aiohttp import web, hdrs
+
+from planningpoker.routing import route
+from planningpoker.json import json_response, dump_with_encoded_values, encoded_json_response
+from planningpoker.persistence import BaseAsyncPersistence
+from planningpoker.persistence.exceptions import NoSuchGame
+
+# How long (in seconds) a request for changes waits before giving up with 204 No Content.
+CHANGES_TIMEOUT = 30
+
+
+def game_etag(persistence: BaseAsyncPersistence, version: int) -> str:
+    """Return the strong entity tag of a game version."""
+    return '"%s-%d"' % (persistence.epoch, version)
+
+
+def etag_matches(if_none_match: (str, None), etag: str) -> bool:
+    """
+    Check if an ``If-None-Match`` header value lists the entity tag.
+
+    Uses the weak comparison, as RFC 7232 requires for ``If-None-Match``.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for listed_etag in if_none_match.split(','):
+        listed_etag = listed_etag.strip()
+        if listed_etag.startswith('W/'):
+            listed_etag = listed_etag[2:]
+        if listed_etag == etag:
+            return True
+    return False
+
+
+async def game_response(persistence: BaseAsyncPersistence, game_id: str,
+                        data: dict = None) -> web.Response:
+    """
+    Respond with the game under the 'game' key, next to other data.
+
+    The game is encoded once per version, not once per response.
+
+    :param data: other JSON-serializable values to respond with
+    """
+    _, encoded_game = await persistence.encode_game(game_id)
+    return encoded_json_response(dump_with_encoded_values(data or {}, game=encoded_game))
+
+
+@route('GET', '/game/{game_id}')
+async def get_game(request, persistence):
+    """
+    Respond with the game and its version.
+
+    Supports conditional requests - if the client has the current version, it gets 304 with no
+    serializing or encoding done.
+    """
+    game_id = request.match_info['game_id']
+    try:
+        version = await persistence.get_game_version(game_id)
+    except NoSuchGame:
+        return json_response({'error': 'There is no such game.'}, status=404)
+
+    etag = game_etag(persistence, version)
+    if etag_matches(request.headers.get(hdrs.IF_NONE_MATCH), etag):
+        return web.Response(status=304, headers={hdrs.ETAG: etag})
+
+    return await versioned_game_response(persistence, game_id)
+
+
+async def versioned_game_response(persistence: BaseAsyncPersistence,
+                                  game_id: str) -> web.Response:
+    """Respond with the game, its version and its entity tag."""
+    version, encoded_game = await persistence.encode_game(game_id)
+    return encoded_json_response(
+        dump_with_encoded_values({'version': version}, game=encoded_game),
+        headers={hdrs.ETAG: game_etag(persistence, version)})
+
+
+@route('GET', '/game/{game_id}/changes')
+async def get_changes(request, persistence):
+    """
+    Respond with the game as soon as its version is greater than the ``since`` query parameter.
+
+    Waits up to ``CHANGES_TIMEOUT`` seconds and responds with 204 No Content if nothing changed.
+    """
+    game_id = request.match_info['game_id']
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        return json_response({'error': 'Must provide the version to wait for changes since.'},
+                             status=400)
+
+    timeout = persistence.changes.timeout(CHANGES_TIMEOUT)
+    while True:
+        changed = persistence.changes.changed(game_id)
+        try:
+            version = await persistence.get_game_version(game_id)
+        except NoSuchGame:
+            return json_response({'error': 'There is no such game.'}, status=404)
+        if version > since:
+            return await versioned_game_response(persistence, game_id)
+
+        # Unlike ``wait_for``, ``wait`` does not cancel the futures other clients share.
+        await asyncio.wait([changed, timeout], loop=request.app.loop,
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not changed.done():
+            return web.Response(status=204)
@@ -1,14 +1,17 @@
 """Views for the game moderator."""
 from aiohttp_session import get_session
 
+from planningpoker import backlog, commands
 from planningpoker.routing import route
-from planningpoker.random_id import get_random_id
+from planningpoker.sharding import get_shard_game_id
 from planningpoker.json import json_response, loads_or_empty
 from planningpoker.cards import coerce_cards
-from planningpoker.persistence.exceptions import (
-    RoundExists, NoSuchRound, RoundFinalized, NoActivePoll
-)
-from planningpoker.views.identity import client_owns_game, get_or_assign_id
+from planningpoker.persistence.exceptions import RoundExists
+from planningpoker.views.game import game_response
+from planningpoker.views.identity import get_id, get_or_assign_id
+
+# Most operations a single batch request may apply.
+MAX_BATCH_OPERATIONS = 500
 
 
 @route('POST', '/new_game')
@@ -35,10 +38,11 @@ async def add_game(request, persistence):
     moderator_session = await get_session(request)
     # Get or assign the moderator id:
     moderator_id = get_or_assign_id(moderator_session)
-    game_id = get_random_id()
-    persistence.add_game(game_id, moderator_id, moderator_name, coerce_cards(available_cards))
+    game_id = get_shard_game_id(request.app['shard'])
+    await persistence.add_game(game_id, moderator_id, moderator_name,
+                               coerce_cards(available_cards))
 
-    return json_response({'game_id': game_id, 'game': persistence.serialize_game(game_id)})
+    return await game_response(persistence, game_id, {'game_id': game_id})
 
 
 @route('POST', '/game/{game_id}/new_round')
@@ -46,66 +50,114 @@ async def add_round(request, persistence):
     """Add a round to the game."""
     game_id = request.match_info['game_id']
     json = await request.json(loads=loads_or_empty)
-
-    try:
-        round_name = json['round_name']
-    except KeyError:
-        return json_response({'error': 'Must specify the name.'}, status=400)
-
-    if len(round_name) < 1:
-        return json_response({'error': 'The name must not be empty.'}, status=400)
-
     user_session = await get_session(request)
-    if not client_owns_game(game_id, user_session, persistence):
-        return json_response({'error': 'The user is not the moderator of this game.'}, status=403)
 
     try:
-        persistence.add_round(game_id, round_name)
-    except RoundExists:
-        return json_response({'error': 'Round with this name already exists.'}, status=409)
-    # No point to catch NoSuchGame because we cannot sensibly handle situation when there is a game
-    # in a session but not in the storage. Let's better 500.
+        await commands.add_round(persistence, game_id, get_id(user_session), json)
+    except commands.CommandError as e:
+        return json_response({'error': e.message}, status=e.status)
 
-    return json_response({'game': persistence.serialize_game(game_id)})
+    return await game_response(persistence, game_id)
 
 
 @route('POST', '/game/{game_id}/round/{round_name}/new_poll')
 async def add_poll(request, persistence):
     """Add a poll to a round."""
     game_id = request.match_info['game_id']
-    round_name = request.match_info['round_name']
     user_session = await get_session(request)
 
-    if not client_owns_game(game_id, user_session, persistence):
-        return json_response({'error': 'The user is not the moderator of this game.'}, status=403)
-
     try:
-        persistence.add_poll(game_id, round_name)
-    except NoSuchRound:
-        return json_response({'error': 'Round does not exist.'}, status=404)
-    except RoundFinalized:
-        return json_response({'error': 'This round is finalized.'}, status=409)
+        await commands.add_poll(persistence, game_id, get_id(user_session), request.match_info)
+    except commands.CommandError as e:
+        return json_response({'error': e.message}, status=e.status)
 
-    return json_response({'game': persistence.serialize_game(game_id)})
+    return await game_response(persistence, game_id)
 
 
 @route('POST', '/game/{game_id}/round/{round_name}/finalize')
 async def finalize_round(request, persistence):
     """Finalize an owned round."""
     game_id = request.match_info['game_id']
-    round_name = request.match_info['round_name']
     user_session = await get_session(request)
 
-    if not client_owns_game(game_id, user_session, persistence):
-        return json_response({'error': 'The user is not the moderator of this game.'}, status=403)
+    try:
+        await commands.finalize_round(persistence, game_id, get_id(user_session),
+                                      request.match_info)
+    except commands.CommandError as e:
+        return json_response({'error': e.message}, status=e.status)
+
+    return await game_response(persistence, game_id)
+
+
+@route('POST', '/game/{game_id}/batch')
+async def batch(request, persistence):
+    """
+    Apply a list of moderator operations to the game, in order.
+
+    Operations are objects naming the command under the ``command`` key (``add_round``,
+    ``add_poll`` or ``finalize_round``) along with the parameters of the corresponding view.
+    A failed operation does not stop the following ones - every operation gets a result with
+    the status its view would respond with and, on failure, the error message. Malformed
+    operations - not objects, or with parameters of wrong types - fail the same way, with 400.
+    The moderator is checked once and the game is serialized once, after all operations.
+    """
+    game_id = request.match_info['game_id']
+    json = await request.json(loads=loads_or_empty)
+
+    operations = json.get('operations') if isinstance(json, dict) else None
+    if not isinstance(operations, list):
+        return json_response({'error': 'Must provide a list of operations.'}, status=400)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return json_response({'error': 'Cannot apply more than %d operations at once.'
+                                       % MAX_BATCH_OPERATIONS}, status=400)
 
+    user_session = await get_session(request)
+    client_id = get_id(user_session)
     try:
-        persistence.finalize_round(game_id, round_name)
-    except NoSuchRound:
-        return json_response({'error': 'Round does not exist.'}, status=404)
-    except NoActivePoll:
-        return json_response({'error': 'There is no active poll in this round.'}, status=404)
-    except RoundFinalized:
-        return json_response({'error': 'This round has already been finalized.'}, status=409)
-
-    return json_response({'game': persistence.serialize_game(game_id)})
+        await commands.ensure_moderator(persistence, game_id, client_id)
+    except commands.CommandError as e:
+        return json_response({'error': e.message}, status=e.status)
+
+    results = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            operation = {}
+        results.append(await commands.execute(
+            persistence, game_id, client_id, operation, commands.MODERATOR_COMMANDS,
+            owner_verified=True))
+
+    return await game_response(persistence, game_id, {'results': results})
+
+
+@route('POST', '/game/{game_id}/import_rounds')
+async def import_rounds(request, persistence):
+    """
+    Add rounds named in an uploaded backlog - see ``planningpoker.backlog`` for the formats.
+
+    The upload is streamed. All rounds are added at once, or none if any name is taken.
+    """
+    game_id = request.match_info['game_id']
+    user_session = await get_session(request)
+    try:
+        await commands.ensure_moderator(persistence, game_id, get_id(user_session))
+    except commands.CommandError as e:
+        return json_response({'error': e.message}, status=e.status)
+
+    parse_line = backlog.line_parser(request.content_type.lower())
+    if parse_line is None:
+        return json_response({'error': 'Upload CSV (text/csv) or NDJSON (application/x-ndjson).'},
+                             status=415)
+    try:
+        round_names = await backlog.read_round_names(request.content, parse_line)
+    except backlog.BacklogError as e:
+        return json_response({'error': str(e)}, status=400)
+    if not round_names:
+        return json_response({'error': 'No rounds to import.'}, status=400)
+
+    try:
+        await persistence.add_rounds(game_id, round_names)
+    except RoundExists as e:
+        return json_response({'error': 'Round with this name already exists.',
+                              'round_name': e.round_name}, status=409)
+
+    return await game_response(persistence, game_id, {'rounds_added': len(round_names)})
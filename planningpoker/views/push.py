@@ -0,0 +1,154 @@
+"""Views pushing game updates to clients."""
+import asyncio
+
+import aiohttp
+from aiohttp import web, hdrs
+from aiohttp_session import get_session
+
+from planningpoker import commands
+from planningpoker.routing import route
+from planningpoker.json import json_response, dump_to_json, loads_or_empty
+from planningpoker.push import (
+    Subscription, encode_update, parse_event_id, GONE_MESSAGE, GONE_EVENT
+)
+from planningpoker.persistence import BaseAsyncPersistence
+from planningpoker.persistence.exceptions import (
+    PersistenceError, NoSuchGame, GameError, GameExpired
+)
+from planningpoker.views.identity import get_id
+
+# Seconds between comments keeping an idle event stream from being closed by proxies.
+EVENTS_HEARTBEAT_INTERVAL = 15
+
+
+async def offer_current_state(persistence: BaseAsyncPersistence, game_id: str,
+                              subscription: Subscription) -> None:
+    """Offer the current state of the game as the first update of a subscription."""
+    try:
+        version, encoded_game = await persistence.encode_game(game_id)
+    except GameError:
+        subscription.end()
+    else:
+        subscription.offer(encode_update(persistence.epoch, version, encoded_game))
+
+
+async def send_updates(loop, socket: web.WebSocketResponse, subscription: Subscription) -> None:
+    """
+    Send updates to a socket until the subscription ends, then tell the client the game is gone.
+
+    Waits for the socket's buffer to drain after every update - updates published in the meantime
+    are coalesced in the subscription, so a slow client gets the latest state, not a backlog.
+    """
+    while True:
+        update = await subscription.next(loop)
+        if update is None:
+            socket.send_str(GONE_MESSAGE)
+            await socket.close()
+            return
+        socket.send_str(update.message)
+        await socket.drain()
+
+
+async def run_command(persistence: BaseAsyncPersistence, game_id: str,
+                      client_id: (str, None), frame: str) -> str:
+    """
+    Run a command sent in a WebSocket frame and return the frame with its result.
+
+    A command frame is a JSON object with the command name under the ``command`` key and its
+    parameters, as the corresponding HTTP view takes them, under their own keys. The result has
+    the HTTP status the view would respond with and, on failure, its error message. An ``id`` sent
+    with the command is returned with the result. A persistence error no command maps to a status
+    fails the command with status 500 instead of ending the socket.
+    """
+    params = loads_or_empty(frame)
+    if not isinstance(params, dict):
+        params = {}
+    result = {'type': 'result', 'id': params.get('id')}
+    try:
+        result.update(await commands.execute(persistence, game_id, client_id, params))
+    except GameExpired:
+        result.update(status=410, error='The game has expired.')
+    except PersistenceError as error:
+        result.update(status=500, error=str(error))
+    return dump_to_json(result)
+
+
+@route('GET', '/game/{game_id}/ws')
+async def game_socket(request, persistence):
+    """
+    Push updates of the game over a WebSocket, starting with its current state.
+
+    The client may send commands on the socket - see ``run_command``. They are run in order, on
+    behalf of the client identified once, by the session at connection time.
+    """
+    game_id = request.match_info['game_id']
+    try:
+        await persistence.get_game_version(game_id)
+    except NoSuchGame:
+        return json_response({'error': 'There is no such game.'}, status=404)
+    client_id = get_id(await get_session(request))
+
+    socket = web.WebSocketResponse()
+    await socket.prepare(request)
+
+    publisher = request.app['publisher']
+    subscription = publisher.subscribe(game_id)
+    await offer_current_state(persistence, game_id, subscription)
+    sending = request.app.loop.create_task(send_updates(request.app.loop, socket, subscription))
+    try:
+        async for message in socket:
+            if message.tp == aiohttp.MsgType.text:
+                result = await run_command(persistence, game_id, client_id, message.data)
+                if not socket.closed:
+                    socket.send_str(result)
+    finally:
+        sending.cancel()
+        publisher.unsubscribe(game_id, subscription)
+    return socket
+
+
+@route('GET', '/game/{game_id}/events')
+async def game_events(request, persistence):
+    """
+    Stream updates of the game as Server-Sent Events, starting with its current state.
+
+    Event IDs identify game versions. A client reconnecting with the ``Last-Event-ID`` of the
+    current version gets no event until the game changes again. A ``gone`` event ends the stream
+    of a game that was removed.
+    """
+    game_id = request.match_info['game_id']
+    try:
+        await persistence.get_game_version(game_id)
+    except NoSuchGame:
+        return json_response({'error': 'There is no such game.'}, status=404)
+
+    response = web.StreamResponse(headers={hdrs.CACHE_CONTROL: 'no-cache'})
+    response.content_type = 'text/event-stream'
+    response.charset = 'utf-8'
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    loop = request.app.loop
+    publisher = request.app['publisher']
+    subscription = publisher.subscribe(game_id)
+    # Updates not newer than the last event the client got are not offered at all.
+    subscription.version = parse_event_id(request.headers.get('Last-Event-ID'),
+                                          persistence.epoch)
+    await offer_current_state(persistence, game_id, subscription)
+    try:
+        while True:
+            try:
+                update = await subscription.next(
+                    loop, persistence.changes.timeout(EVENTS_HEARTBEAT_INTERVAL))
+            except asyncio.TimeoutError:
+                response.write(b':\n\n')
+            else:
+                if update is None:
+                    response.write(GONE_EVENT)
+                    break
+                response.write(update.event)
+            await response.drain()
+    finally:
+        publisher.unsubscribe(game_id, subscription)
+    await response.write_eof()
+    return response
@@ -1,8 +1,11 @@
 """Application status."""
+from collections import OrderedDict
+
 from aiohttp import web
 
 from planningpoker.routing import route
 from planningpoker.json import json_response
+from planningpoker.metrics import CONTENT_TYPE, render_gauges
 
 
 @route('HEAD', '/status')
@@ -12,6 +15,23 @@ def head_status(request, persistence):
 
 
 @route('GET', '/status')
-def get_status(request, persistence):
-    """Respond with OK and the number of games in response body."""
-    return json_response({'games_count': persistence.games_count})
+async def get_status(request, persistence):
+    """Respond with OK and the numbers of games and games removed for being idle."""
+    return json_response({
+        'games_count': await persistence.games_count(),
+        'evicted_games_count': await persistence.evicted_games_count(),
+    })
+
+
+@route('GET', '/metrics')
+async def get_metrics(request, persistence):
+    """Respond with request counters and sizes of the stored games, in the Prometheus format."""
+    totals = await persistence.totals()
+    lines = request.app['metrics'].render() + render_gauges(OrderedDict([
+        ('games', ('Games held by the storage backend.', await persistence.games_count())),
+        ('players', ('Players of all games.', totals['players'])),
+        ('rounds', ('Rounds of all games.', totals['rounds'])),
+        ('polls', ('Polls of all rounds.', totals['polls'])),
+    ]))
+    return web.Response(body=('\n'.join(lines) + '\n').encode(),
+                        headers={'Content-Type': CONTENT_TYPE})
@@ -24,8 +24,17 @@ TEST_REQUIREMENTS = [
     'requests==2.8.1',  # A synchronous HTTP client to use in tests.
     'mirakuru==0.6.1',  # Process executor.
     'port-for==0.3.1',
+    'redis==2.10.5',
+    'fakeredis[lua]==0.8.2',  # In-process Redis to test the Redis persistence backend against.
+    'numpy==1.11.1',
 ]
 
+# Optional dependencies of additional backends and features.
+EXTRAS_REQUIREMENTS = {
+    'redis': ['redis==2.10.5'],
+    'analytics': ['numpy==1.11.1'],
+}
+
 setup(
     name='planningpoker',
     version='0.0.1',
@@ -50,9 +59,13 @@ setup(
     packages=find_packages(exclude=['test']),
     install_requires=REQUIREMENTS,
     tests_require=TEST_REQUIREMENTS,
-    extras_require={'tests': TEST_REQUIREMENTS},
+    extras_require=dict(EXTRAS_REQUIREMENTS, tests=TEST_REQUIREMENTS),
     cmdclass={},
     entry_points={
-        'console_scripts': 'planningpoker=planningpoker.app:cli_entry'
+        'console_scripts': [
+            'planningpoker=planningpoker.app:cli_entry',
+            'planningpoker-bus-broker=planningpoker.bus.unix:broker_entry',
+            'planningpoker-analytics=planningpoker.analytics:analytics_entry',
+        ]
     },
 )
@@ -14,6 +14,9 @@ SITE_SCHEME = 'http'
 SITE_NETLOC = '%s:%s' % (HOST, PORT)
 SITE_ADDRESS = '%s://%s' % (SITE_SCHEME, SITE_NETLOC)
 EXECUTOR_TIMEOUT = 5
+SHARDED_WORKERS = 3
+GAME_TTL = 0.5
+ADMIN_TOKEN = 'admin-token'
 
 
 class BackendSession(Session):
@@ -61,16 +64,15 @@ class BackendSession(Session):
         return super().request(method, url, *args, **kwargs)
 
 
-@pytest.fixture
-def backend(request):
-    """Run application backend."""
+def run_backend(request, *options: str) -> None:
+    """Run application backend with extra command line options until the test ends."""
     executor = HTTPExecutor(
         [
             'planningpoker',
             '--host', '127.0.0.1',
             '--port', str(PORT),
-            '--cookie-secret-key', Fernet.generate_key().decode()
-        ],
+            '--cookie-secret-key', Fernet.generate_key().decode(),
+        ] + list(options),
         SITE_ADDRESS + '/status',
         timeout=EXECUTOR_TIMEOUT
     )
@@ -78,6 +80,30 @@ def backend(request):
     request.addfinalizer(executor.stop)
 
 
+@pytest.fixture
+def backend(request):
+    """Run application backend."""
+    run_backend(request)
+
+
+@pytest.fixture
+def sharded_backend(request):
+    """Run application backend with games sharded among ``SHARDED_WORKERS`` worker processes."""
+    run_backend(request, '--workers', str(SHARDED_WORKERS), '--admin-token', ADMIN_TOKEN)
+
+
+@pytest.fixture
+def expiring_backend(request):
+    """Run application backend removing games idle for ``GAME_TTL`` seconds."""
+    run_backend(request, '--game-ttl', str(GAME_TTL))
+
+
+@pytest.fixture
+def admin_backend(request):
+    """Run application backend with admin endpoints enabled by ``ADMIN_TOKEN``."""
+    run_backend(request, '--admin-token', ADMIN_TOKEN)
+
+
 def make_client() -> BackendSession:
     """Return a client session, not owning any game nor registered as a player."""
     return BackendSession(SITE_SCHEME, SITE_NETLOC)
@@ -0,0 +1,50 @@
+"""Test admin endpoints."""
+from conftest import ADMIN_TOKEN, make_client
+
+
+def test_analytics(admin_backend):
+    """Check if analytics of finalized rounds are served to requests with the admin token."""
+    moderator = make_client()
+    game_id = moderator.post('/new_game', json={'cards': [1, 2, '?'],
+                                                'moderator_name': 'M'}).json()['game_id']
+    moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'R'})
+    moderator.post('/game/%s/round/R/new_poll' % game_id)
+    moderator.post('/game/%s/round/R/vote' % game_id, json={'vote': 2})
+    moderator.post('/game/%s/round/R/finalize' % game_id)
+
+    analytics = make_client().get('/admin/analytics',
+                                  headers={'Authorization': 'Bearer %s' % ADMIN_TOKEN})
+    assert analytics.status_code == 200
+    report = analytics.json()
+    assert (report['games'], report['rounds'], report['votes']) == (1, 1, 1)
+    assert report['teams'][game_id]['mean_polls'] == 1
+    assert report['decks'] == [{'cards': [1, 2, '?'], 'games': 1, 'votes': [0, 1, 0]}]
+
+    for headers in [{}, {'Authorization': 'Bearer nope'}, {'Authorization': ADMIN_TOKEN}]:
+        assert make_client().get('/admin/analytics', headers=headers).status_code == 403
+
+
+def test_analytics_disabled(client):
+    """Check if admin endpoints are off without the admin token."""
+    analytics = client.get('/admin/analytics', headers={'Authorization': 'Bearer '})
+    assert analytics.status_code == 404
+
+
+def test_profiler(admin_backend):
+    """Check if the request profiler is turned on and off by the admin endpoint."""
+    admin = make_client()
+    admin.headers['Authorization'] = 'Bearer %s' % ADMIN_TOKEN
+    assert admin.get('/admin/profiler').json()['enabled'] is False
+    assert admin.post('/admin/profiler', json={'enabled': 'yes'}).status_code == 400
+
+    enabled = admin.post('/admin/profiler', json={'enabled': True})
+    assert enabled.status_code == 200
+    assert enabled.json()['enabled'] is True
+    for _ in range(enabled.json()['sample_every']):
+        admin.get('/status')
+    state = admin.get('/admin/profiler').json()
+    assert state['profiled_requests'] == 1
+    assert '=== Route get_status: 1 profiled requests' in state['report']
+
+    assert admin.post('/admin/profiler', json={'enabled': False}).json()['enabled'] is False
+    assert make_client().get('/admin/profiler').status_code == 403
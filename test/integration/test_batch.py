@@ -0,0 +1,60 @@
+"""Testing applying many moderator operations in one request."""
+
+
+def test_batch(game_id, moderator):
+    """Check if operations are applied in order, each with its own result."""
+    batch = moderator.post('/game/%s/batch' % game_id, json={'operations': [
+        {'command': 'add_round', 'round_name': 'Round 1'},
+        {'command': 'add_round', 'round_name': 'Round 2'},
+        {'command': 'add_round', 'round_name': 'Round 1'},
+        {'command': 'add_poll', 'round_name': 'Round 1'},
+        {'command': 'finalize_round', 'round_name': 'Round 1'},
+        {'command': 'add_poll', 'round_name': 'Round 3'},
+        {'command': 'cast_vote', 'round_name': 'Round 2', 'vote': 1},
+    ]})
+    assert batch.status_code == 200
+    assert batch.json()['results'] == [
+        {'status': 200},
+        {'status': 200},
+        {'status': 409, 'error': 'Round with this name already exists.'},
+        {'status': 200},
+        {'status': 200},
+        {'status': 404, 'error': 'Round does not exist.'},
+        {'status': 400, 'error': 'Unknown command.'},
+    ]
+    game = batch.json()['game']
+    assert game['rounds_order'] == ['Round 1', 'Round 2']
+    assert game['rounds']['Round 1']['polls'] == [{}]
+    assert game['rounds']['Round 1']['finalized'] is True
+
+
+def test_batch_malformed_operations(game_id, moderator):
+    """Check if operations with parameters of wrong types fail alone, without a server error."""
+    batch = moderator.post('/game/%s/batch' % game_id, json={'operations': [
+        {'command': 'add_round', 'round_name': 'Round 1'},
+        {'command': 'add_round', 'round_name': ['Round 2']},
+        {'command': 'add_poll', 'round_name': {'name': 'Round 1'}},
+        'add_poll',
+        {'command': 'add_poll', 'round_name': 'Round 1'},
+    ]})
+    assert batch.status_code == 200
+    assert batch.json()['results'] == [
+        {'status': 200},
+        {'status': 400, 'error': 'The round name must be a string.'},
+        {'status': 400, 'error': 'The round name must be a string.'},
+        {'status': 400, 'error': 'Unknown command.'},
+        {'status': 200},
+    ]
+    assert batch.json()['game']['rounds']['Round 1']['polls'] == [{}]
+
+
+def test_batch_errors(game_id, moderator, client):
+    """Check if requests without a list of operations or from non-moderators are rejected."""
+    assert moderator.post('/game/%s/batch' % game_id).status_code == 400
+    assert moderator.post('/game/%s/batch' % game_id,
+                          json={'operations': {'command': 'add_round'}}).status_code == 400
+
+    not_moderator = client.post('/game/%s/batch' % game_id, json={'operations': [
+        {'command': 'add_round', 'round_name': 'Round 1'},
+    ]})
+    assert not_moderator.status_code == 403
@@ -0,0 +1,40 @@
+"""Test waiting for changes of a game."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_changes_since_older_version(game_id, client):
+    """Check if a client behind the current version gets the game at once."""
+    changes = client.get('/game/%s/changes' % game_id, query={'since': 0})
+    assert changes.status_code == 200
+    assert changes.json()['version'] == 1
+    assert 'players' in changes.json()['game']
+
+
+def test_changes_wait_for_mutation(game_id, client, another_client, moderator):
+    """Check if clients waiting for a change are all woken by it."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        waiting = [
+            executor.submit(waiting_client.get, '/game/%s/changes' % game_id,
+                            query={'since': 1})
+            for waiting_client in [client, another_client]
+        ]
+        assert not any(response.done() for response in waiting)
+        moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Round 1'})
+
+        for response in waiting:
+            changes = response.result(timeout=5)
+            assert changes.status_code == 200
+            assert changes.json()['version'] == 2
+            assert changes.json()['game']['rounds_order'] == ['Round 1']
+
+
+def test_changes_errors(game_id, client):
+    """Check if invalid requests for changes are rejected."""
+    no_since = client.get('/game/%s/changes' % game_id)
+    assert no_since.status_code == 400
+
+    invalid_since = client.get('/game/%s/changes' % game_id, query={'since': 'x'})
+    assert invalid_since.status_code == 400
+
+    no_game = client.get('/game/no-such-game/changes', query={'since': 0})
+    assert no_game.status_code == 404
@@ -0,0 +1,29 @@
+"""Testing exporting the history of a game."""
+import csv
+
+
+def test_export(game_id, moderator, moderator_name, player, player_name):
+    """Check if every vote is exported, in both formats."""
+    moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Round 1'})
+    moderator.post('/game/%s/round/Round 1/new_poll' % game_id)
+    player.post('/game/%s/round/Round 1/vote' % game_id, json={'vote': 5})
+    moderator.post('/game/%s/round/Round 1/vote' % game_id, json={'vote': 8})
+
+    ndjson = moderator.get('/game/%s/export' % game_id)
+    assert ndjson.status_code == 200
+    assert ndjson.headers['Content-Type'].startswith('application/x-ndjson')
+    assert ndjson.headers['Transfer-Encoding'] == 'chunked'
+    assert len(ndjson.text.splitlines()) == 2
+
+    exported = moderator.get('/game/%s/export' % game_id, query={'format': 'csv'})
+    assert exported.headers['Content-Type'].startswith('text/csv')
+    rows = list(csv.DictReader(exported.text.splitlines()))
+    assert sorted((row['player_name'], row['estimation']) for row in rows) == \
+        sorted([(player_name, '5'), (moderator_name, '8')])
+    assert {row['round_name'] for row in rows} == {'Round 1'}
+
+
+def test_export_errors(game_id, client):
+    """Check if exports of unknown games or in unknown formats fail."""
+    assert client.get('/game/no-such-game/export').status_code == 404
+    assert client.get('/game/%s/export' % game_id, query={'format': 'xml'}).status_code == 400
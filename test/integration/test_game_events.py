@@ -0,0 +1,61 @@
+"""Test streaming game updates as Server-Sent Events."""
+import simplejson
+
+
+def read_event(lines) -> dict:
+    """Read the fields of the next event from an iterator of stream lines, skipping comments."""
+    event = {}
+    for line in lines:
+        if not line:
+            if event:
+                return event
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(': ')
+        event[field] = value
+    raise AssertionError('The stream ended.')
+
+
+def test_game_events(game_id, client, moderator):
+    """Check if a subscriber gets the current state and then every change."""
+    events = client.get('/game/%s/events' % game_id, stream=True)
+    try:
+        assert events.status_code == 200
+        assert events.headers['Content-Type'].startswith('text/event-stream')
+        lines = events.iter_lines(decode_unicode=True)
+
+        current = read_event(lines)
+        assert current['event'] == 'game'
+        assert current['id'].endswith('-1')
+        assert simplejson.loads(current['data'])['version'] == 1
+
+        moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Round 1'})
+        update = read_event(lines)
+        assert update['id'].endswith('-2')
+        assert simplejson.loads(update['data'])['game']['rounds_order'] == ['Round 1']
+    finally:
+        events.close()
+
+
+def test_game_events_resume(game_id, client, moderator):
+    """Check if a client reconnecting with the ID of the current version gets only new changes."""
+    events = client.get('/game/%s/events' % game_id, stream=True)
+    try:
+        last_event_id = read_event(events.iter_lines(decode_unicode=True))['id']
+    finally:
+        events.close()
+
+    events = client.get('/game/%s/events' % game_id, stream=True,
+                        headers={'Last-Event-ID': last_event_id})
+    try:
+        moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Round 1'})
+        update = read_event(events.iter_lines(decode_unicode=True))
+        assert simplejson.loads(update['data'])['version'] == 2
+    finally:
+        events.close()
+
+
+def test_game_events_no_such_game(client):
+    """Check if streaming events of an unknown game fails."""
+    assert client.get('/game/no-such-game/events').status_code == 404
@@ -0,0 +1,22 @@
+"""Test removing idle games."""
+import time
+
+from conftest import GAME_TTL, make_client
+
+
+def test_game_expiry(expiring_backend):
+    """Check if idle games are gone with 410 and counted in the status."""
+    moderator = make_client()
+    new_game = moderator.post('/new_game', json={'cards': [1, 2, 3], 'moderator_name': 'M'})
+    game_id = new_game.json()['game_id']
+
+    time.sleep(GAME_TTL * 2)
+
+    join_game = make_client().post('/game/%s/join' % game_id, json={'name': 'P'})
+    assert join_game.status_code == 410
+    assert join_game.json() == {'error': 'The game has expired.'}
+
+    new_round = moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'R'})
+    assert new_round.status_code == 410
+
+    assert moderator.get('/status').json() == {'games_count': 0, 'evicted_games_count': 1}
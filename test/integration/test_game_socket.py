@@ -0,0 +1,111 @@
+"""Test pushing game updates over a WebSocket."""
+import asyncio
+
+import aiohttp
+import pytest
+import simplejson
+
+from conftest import SITE_ADDRESS
+
+
+def test_game_socket(game_id, moderator):
+    """Check if a subscriber gets the current state and then every change."""
+    loop = asyncio.new_event_loop()
+
+    async def scenario():
+        session = aiohttp.ClientSession(loop=loop)
+        try:
+            socket = await session.ws_connect('%s/game/%s/ws' % (SITE_ADDRESS, game_id))
+            current = simplejson.loads((await socket.receive()).data)
+            assert current['type'] == 'game'
+            assert current['version'] == 1
+
+            await loop.run_in_executor(None, lambda: moderator.post(
+                '/game/%s/new_round' % game_id, json={'round_name': 'Round 1'}))
+            update = simplejson.loads((await socket.receive()).data)
+            assert update['version'] == 2
+            assert update['game']['rounds_order'] == ['Round 1']
+            await socket.close()
+        finally:
+            session.close()
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+def test_game_socket_no_such_game(backend):
+    """Check if subscribing to an unknown game fails."""
+    loop = asyncio.new_event_loop()
+    session = aiohttp.ClientSession(loop=loop)
+    try:
+        with pytest.raises(aiohttp.WSServerHandshakeError) as error:
+            loop.run_until_complete(session.ws_connect('%s/game/no-such-game/ws' % SITE_ADDRESS))
+        assert error.value.code == 404
+    finally:
+        session.close()
+        loop.close()
+
+
+def test_game_socket_commands(game_id, moderator):
+    """Check if commands sent on the socket are run on behalf of the connected client."""
+    loop = asyncio.new_event_loop()
+
+    async def scenario():
+        session = aiohttp.ClientSession(loop=loop, cookies=moderator.cookies.get_dict())
+        try:
+            socket = await session.ws_connect('%s/game/%s/ws' % (SITE_ADDRESS, game_id))
+            await socket.receive()  # The current state.
+
+            socket.send_str(simplejson.dumps(
+                {'id': 1, 'command': 'add_round', 'round_name': 'Round 1'}))
+            messages = [simplejson.loads((await socket.receive()).data) for _ in range(2)]
+            messages.sort(key=lambda message: message['type'])
+            assert messages[0]['version'] == 2
+            assert messages[1] == {'type': 'result', 'id': 1, 'status': 200}
+
+            socket.send_str(simplejson.dumps(
+                {'id': 2, 'command': 'add_round', 'round_name': 'Round 1'}))
+            assert simplejson.loads((await socket.receive()).data) == {
+                'type': 'result', 'id': 2, 'status': 409,
+                'error': 'Round with this name already exists.'}
+            await socket.close()
+        finally:
+            session.close()
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+def test_game_socket_vote_without_poll(game_id, game_round, moderator):
+    """Check if voting before the round has a poll fails the command but keeps the socket open."""
+    loop = asyncio.new_event_loop()
+
+    async def scenario():
+        session = aiohttp.ClientSession(loop=loop, cookies=moderator.cookies.get_dict())
+        try:
+            socket = await session.ws_connect('%s/game/%s/ws' % (SITE_ADDRESS, game_id))
+            await socket.receive()  # The current state.
+
+            socket.send_str(simplejson.dumps(
+                {'id': 1, 'command': 'cast_vote', 'round_name': game_round, 'vote': 1}))
+            assert simplejson.loads((await socket.receive()).data) == {
+                'type': 'result', 'id': 1, 'status': 404,
+                'error': 'There is no active poll in this round.'}
+
+            socket.send_str(simplejson.dumps(
+                {'id': 2, 'command': 'add_poll', 'round_name': game_round}))
+            messages = [simplejson.loads((await socket.receive()).data) for _ in range(2)]
+            messages.sort(key=lambda message: message['type'])
+            assert messages[1] == {'type': 'result', 'id': 2, 'status': 200}
+            await socket.close()
+        finally:
+            session.close()
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
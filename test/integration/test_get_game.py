@@ -0,0 +1,45 @@
+"""Test reading the game state."""
+
+
+def test_get_game(game_id, client, moderator_name, game_cards):
+    """Check if anybody knowing the game ID can read it."""
+    get_game = client.get('/game/%s' % game_id)
+    assert get_game.status_code == 200
+    assert get_game.json() == {
+        'version': 1,
+        'game': {
+            'players': [moderator_name],
+            'cards': game_cards,
+            'rounds_order': [],
+            'rounds': {},
+        },
+    }
+    assert get_game.headers['ETag'].startswith('"')
+
+
+def test_get_game_not_found(client):
+    """Check if an unknown game is reported as such."""
+    get_game = client.get('/game/no-such-game')
+    assert get_game.status_code == 404
+    assert get_game.json() == {'error': 'There is no such game.'}
+
+
+def test_get_game_conditional(game_id, client, moderator):
+    """Check if a client having the current version of the game gets 304."""
+    etag = client.get('/game/%s' % game_id).headers['ETag']
+
+    not_modified = client.get('/game/%s' % game_id, headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == etag
+    assert not_modified.content == b''
+
+    listed = client.get('/game/%s' % game_id, headers={'If-None-Match': '"x", W/%s' % etag})
+    assert listed.status_code == 304
+
+    moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Round 1'})
+
+    modified = client.get('/game/%s' % game_id, headers={'If-None-Match': etag})
+    assert modified.status_code == 200
+    assert modified.headers['ETag'] != etag
+    assert modified.json()['version'] == 2
+    assert modified.json()['game']['rounds_order'] == ['Round 1']
@@ -0,0 +1,32 @@
+"""Testing importing rounds from uploaded backlogs."""
+
+
+def test_import_rounds(game_id, moderator):
+    """Check if all rounds from a backlog are added, after the existing ones."""
+    moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'Warm-up'})
+    imported = moderator.post('/game/%s/import_rounds' % game_id,
+                              data='ticket,round_name\nABC-1,Log in\nABC-2,Log out\n'.encode(),
+                              headers={'Content-Type': 'text/csv'})
+    assert imported.status_code == 200
+    assert imported.json()['rounds_added'] == 2
+    assert imported.json()['game']['rounds_order'] == ['Warm-up', 'Log in', 'Log out']
+
+    imported = moderator.post('/game/%s/import_rounds' % game_id,
+                              data=b'"Sign up"\n{"round_name": "Log in"}\n',
+                              headers={'Content-Type': 'application/x-ndjson'})
+    assert imported.status_code == 409
+    assert imported.json()['round_name'] == 'Log in'
+    game = moderator.get('/game/%s' % game_id).json()['game']
+    assert game['rounds_order'] == ['Warm-up', 'Log in', 'Log out']
+
+
+def test_import_rounds_errors(game_id, moderator, client):
+    """Check if invalid uploads and uploads by non-moderators are rejected."""
+    def upload(session, data, content_type):
+        return session.post('/game/%s/import_rounds' % game_id, data=data,
+                            headers={'Content-Type': content_type})
+
+    assert upload(moderator, b'{"round_name": "R"}', 'application/json').status_code == 415
+    assert upload(moderator, b'ticket\nABC-1\n', 'text/csv').status_code == 400
+    assert upload(moderator, b'', 'application/x-ndjson').status_code == 400
+    assert upload(client, b'"R"\n', 'application/x-ndjson').status_code == 403
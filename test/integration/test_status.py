@@ -5,10 +5,27 @@ def test_status_resource(client):
     """Check if the resource respond to get with current games count."""
     get_status = client.get('/status')
     assert get_status.status_code == 200
-    assert get_status.json() == {'games_count': 0}
+    assert get_status.json() == {'games_count': 0, 'evicted_games_count': 0}
 
     client.post('/new_game', json={'cards': [1, 2, 3], 'moderator_name': 'Y.'})
 
     get_status_with_a_game = client.get('/status')
     assert get_status_with_a_game.status_code == 200
-    assert get_status_with_a_game.json() == {'games_count': 1}
+    assert get_status_with_a_game.json() == {'games_count': 1, 'evicted_games_count': 0}
+
+
+def test_metrics_resource(client):
+    """Check if the resource counts requests by route and reports sizes of games."""
+    client.post('/new_game', json={'cards': [1, 2, 3], 'moderator_name': 'Y.'})
+    client.get('/game/nonexistent')
+
+    get_metrics = client.get('/metrics')
+    assert get_metrics.status_code == 200
+    assert get_metrics.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    metrics = get_metrics.text.splitlines()
+    assert 'planningpoker_requests_total{route="add_game",status="2xx"} 1' in metrics
+    assert 'planningpoker_requests_total{route="get_game",status="4xx"} 1' in metrics
+    assert 'planningpoker_request_duration_seconds_count{route="add_game"} 1' in metrics
+    assert 'planningpoker_games 1' in metrics
+    assert 'planningpoker_players 1' in metrics
+    assert 'planningpoker_rounds 0' in metrics
@@ -0,0 +1,103 @@
+"""Test the multi-process deployment, games sharded among workers behind a dispatcher."""
+from conftest import ADMIN_TOKEN, SHARDED_WORKERS, make_client, make_player
+
+
+def test_sharded_games(sharded_backend):
+    """Play multiple games, likely landing on different workers."""
+    moderator = make_client()
+    game_ids = []
+    for _ in range(SHARDED_WORKERS * 3):
+        new_game = moderator.post('/new_game', json={'cards': [1, 2, 3], 'moderator_name': 'M'})
+        assert new_game.status_code == 200
+        game_ids.append(new_game.json()['game_id'])
+
+    for game_id in game_ids:
+        player = make_player(game_id, 'P')
+        new_round = moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'R'})
+        assert new_round.status_code == 200
+        new_poll = moderator.post('/game/%s/round/R/new_poll' % game_id)
+        assert new_poll.status_code == 200
+        vote = player.post('/game/%s/round/R/vote' % game_id, json={'vote': 2})
+        assert vote.status_code == 200
+        assert vote.json()['game']['rounds']['R']['polls'] == [{'P': 2}]
+
+    status = moderator.get('/status')
+    assert status.status_code == 200
+    assert status.json()['games_count'] == len(game_ids)
+    assert status.json()['unavailable_workers'] == 0
+
+    metrics = moderator.get('/metrics').text.splitlines()
+    assert 'planningpoker_games %d' % len(game_ids) in metrics
+    assert 'planningpoker_unavailable_workers 0' in metrics
+    assert ('planningpoker_requests_total{route="cast_vote",status="2xx"} %d' % len(game_ids)
+            in metrics)
+
+    assert moderator.get('/').status_code == 200
+
+
+def test_profiler_of_every_worker(sharded_backend):
+    """Check if the profiler is toggled in every worker at once."""
+    admin = make_client()
+    authorization = {'Authorization': 'Bearer ' + ADMIN_TOKEN}
+    assert admin.post('/admin/profiler', json={'enabled': True}).status_code == 403
+
+    enabled = admin.post('/admin/profiler', json={'enabled': True}, headers=authorization)
+    assert enabled.status_code == 200
+    assert [worker['enabled'] for worker in enabled.json()['workers']] == [True] * SHARDED_WORKERS
+
+    state = admin.get('/admin/profiler', headers=authorization)
+    assert [worker['enabled'] for worker in state.json()['workers']] == [True] * SHARDED_WORKERS
+
+
+def test_clients_keep_their_identities(sharded_backend):
+    """Check if the dispatcher passes every client's own session on, not one a worker set before."""
+    first, second = make_client(), make_client()
+    games = {}
+    for moderator in [first, second] * SHARDED_WORKERS:
+        new_game = moderator.post('/new_game', json={'cards': [1, 2, 3], 'moderator_name': 'M'})
+        assert new_game.status_code == 200
+        games.setdefault(moderator, []).append(new_game.json()['game_id'])
+
+    for moderator, other in [(first, second), (second, first)]:
+        for number, game_id in enumerate(games[moderator]):
+            round_name = 'R%d' % number
+            assert moderator.post('/game/%s/new_round' % game_id,
+                                  json={'round_name': round_name}).status_code == 200
+            assert other.post('/game/%s/new_round' % game_id,
+                              json={'round_name': round_name + '-other'}).status_code == 403
+
+
+def test_import_rounds_through_dispatcher(sharded_backend):
+    """Check if a backlog upload is streamed to the worker of the game."""
+    moderator = make_client()
+    game_id = moderator.post('/new_game', json={'cards': [1, 2],
+                                                'moderator_name': 'M'}).json()['game_id']
+    backlog = ''.join('"Ticket %d"\n' % number for number in range(2000)).encode()
+    imported = moderator.post('/game/%s/import_rounds' % game_id, data=iter([backlog]),
+                              headers={'Content-Type': 'application/x-ndjson'})
+    assert imported.status_code == 200
+    assert imported.json()['rounds_added'] == 2000
+
+
+def test_analytics_of_every_worker(sharded_backend):
+    """Check if analytics cover the games of all workers."""
+    moderator = make_client()
+    game_ids = []
+    for _ in range(SHARDED_WORKERS * 3):
+        game_id = moderator.post('/new_game', json={'cards': [1, 2, 3],
+                                                    'moderator_name': 'M'}).json()['game_id']
+        moderator.post('/game/%s/new_round' % game_id, json={'round_name': 'R'})
+        moderator.post('/game/%s/round/R/new_poll' % game_id)
+        moderator.post('/game/%s/round/R/vote' % game_id, json={'vote': 2})
+        assert moderator.post('/game/%s/round/R/finalize' % game_id).status_code == 200
+        game_ids.append(game_id)
+
+    assert make_client().get('/admin/analytics').status_code == 403
+    analytics = make_client().get('/admin/analytics',
+                                  headers={'Authorization': 'Bearer ' + ADMIN_TOKEN})
+    assert analytics.status_code == 200
+    report = analytics.json()
+    assert (report['games'], report['rounds'], report['votes']) == (len(game_ids),) * 3
+    assert sorted(report['teams']) == sorted(game_ids)
+    assert report['decks'] == [{'cards': [1, 2, 3], 'games': len(game_ids),
+                                'votes': [0, len(game_ids), 0]}]
@@ -0,0 +1,102 @@
+"""
+Reusable conformance suite of persistence backends' errors.
+
+A test module opts its backends in by defining a ``backend`` fixture returning an empty backend and
+a ``TestFailingOperations`` class - or any other name pytest collects - deriving from
+``FailingOperationsSuite``. The module itself is not collected.
+"""
+import pytest
+
+from planningpoker.persistence import exceptions
+from planningpoker.persistence.exceptions import (
+    GameExists, GameExpired, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
+    IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame,
+)
+
+GAME_ID = 'game-123456'
+GAME_CARDS = [1, 2, 3, 5, 8, 13]
+MODERATOR_ID = 'asdfw1'
+MODERATOR_NAME = 'Liz'
+ROUND_NAME = 'Round One'
+EMPTY_ROUND_NAME = 'Round Without Polls'
+FINALIZED_ROUND_NAME = 'Round Zero'
+
+# Operations failing on the game of ``backend_in_every_state``: method names, arguments and
+# the exceptions the backend must raise.
+FAILING_OPERATIONS = [
+    ('add_game', (GAME_ID, 'another-moderator', 'Frank', GAME_CARDS), GameExists),
+    ('add_player', ('nonexistent game', 'player-1', 'Tom'), NoSuchGame),
+    ('add_player', (GAME_ID, MODERATOR_ID, 'Another Name'), PlayerAlreadyRegistered),
+    ('add_player', (GAME_ID, 'player-1', MODERATOR_NAME), PlayerNameTaken),
+    ('add_round', ('nonexistent game', 'Round Two'), NoSuchGame),
+    ('add_round', (GAME_ID, ROUND_NAME), RoundExists),
+    ('add_rounds', ('nonexistent game', ['Round Two']), NoSuchGame),
+    ('add_rounds', (GAME_ID, ['Round Two', ROUND_NAME]), RoundExists),
+    ('add_poll', ('nonexistent game', ROUND_NAME), NoSuchGame),
+    ('add_poll', (GAME_ID, 'nonexistent round'), NoSuchRound),
+    ('add_poll', (GAME_ID, FINALIZED_ROUND_NAME), RoundFinalized),
+    ('finalize_round', ('nonexistent game', ROUND_NAME), NoSuchGame),
+    ('finalize_round', (GAME_ID, 'nonexistent round'), NoSuchRound),
+    ('finalize_round', (GAME_ID, EMPTY_ROUND_NAME), NoActivePoll),
+    ('finalize_round', (GAME_ID, FINALIZED_ROUND_NAME), RoundFinalized),
+    ('cast_vote', ('nonexistent game', ROUND_NAME, MODERATOR_ID, GAME_CARDS[0]), NoSuchGame),
+    ('cast_vote', (GAME_ID, 'nonexistent round', MODERATOR_ID, GAME_CARDS[0]), NoSuchRound),
+    ('cast_vote', (GAME_ID, EMPTY_ROUND_NAME, MODERATOR_ID, GAME_CARDS[0]), NoActivePoll),
+    ('cast_vote', (GAME_ID, FINALIZED_ROUND_NAME, MODERATOR_ID, GAME_CARDS[0]), RoundFinalized),
+    ('cast_vote', (GAME_ID, ROUND_NAME, MODERATOR_ID, 'not a card'), IllegalEstimation),
+    ('cast_vote', (GAME_ID, ROUND_NAME, 'nonexistent player', GAME_CARDS[0]), PlayerNotInGame),
+    ('serialize_game', ('nonexistent game',), NoSuchGame),
+    ('export_votes', ('nonexistent game',), NoSuchGame),
+    ('finalized_polls', ('nonexistent game',), NoSuchGame),
+    ('get_game_version', ('nonexistent game',), NoSuchGame),
+]
+
+# Exceptions not raised by every backend, tested elsewhere.
+OPTIONAL_EXCEPTIONS = {
+    GameExpired,  # Only with game expiry - see test_persistence_expiry.py.
+}
+
+
+class FailingOperationsSuite:
+
+    """Operations every backend must reject, leaving the game as it was."""
+
+    @pytest.fixture
+    def backend_in_every_state(self, backend):
+        """Return the backend holding one game with an active, a finalized and an empty round."""
+        backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+        backend.add_round(GAME_ID, ROUND_NAME)
+        backend.add_poll(GAME_ID, ROUND_NAME)
+        backend.add_round(GAME_ID, FINALIZED_ROUND_NAME)
+        backend.add_poll(GAME_ID, FINALIZED_ROUND_NAME)
+        backend.finalize_round(GAME_ID, FINALIZED_ROUND_NAME)
+        backend.add_round(GAME_ID, EMPTY_ROUND_NAME)
+        backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, GAME_CARDS[1])
+        return backend
+
+    @pytest.mark.parametrize('method, args, exception', FAILING_OPERATIONS,
+                             ids=['%s-%s' % (method, exception.__name__)
+                                  for method, _, exception in FAILING_OPERATIONS])
+    def test_failing_operation(self, backend_in_every_state, method, args, exception):
+        """Check if a failing operation raises the exact exception and changes nothing."""
+        backend = backend_in_every_state
+        state = (backend.serialize_game(GAME_ID), backend.get_game_version(GAME_ID),
+                 backend.totals())
+
+        with pytest.raises(exception) as error:
+            getattr(backend, method)(*args)
+        assert type(error.value) is exception
+        str(error.value)  # Messages format with the exception's attributes.
+
+        assert state == (backend.serialize_game(GAME_ID), backend.get_game_version(GAME_ID),
+                         backend.totals())
+
+    def test_failing_operations_cover_exceptions(self):
+        """Check if every exception backends may raise is covered by ``FAILING_OPERATIONS``."""
+        concrete_exceptions = {
+            value for value in vars(exceptions).values()
+            if isinstance(value, type) and issubclass(value, exceptions.PersistenceError) and
+            not value.__subclasses__()
+        }
+        covered = {exception for _, _, exception in FAILING_OPERATIONS}
+        assert concrete_exceptions - OPTIONAL_EXCEPTIONS == covered
@@ -0,0 +1,116 @@
+"""Tests for estimation analytics across games."""
+from decimal import Decimal
+
+import pytest
+import numpy
+
+from planningpoker import analytics
+from planningpoker.json import dump_to_json, loads_or_empty
+from planningpoker.persistence import ProcessMemoryPersistence
+
+CARDS = [Decimal(1), Decimal(2), Decimal(3), Decimal(5), '?']
+OTHER_CARDS = ['S', 'M', 'L']
+
+
+@pytest.fixture
+def persistence():
+    """
+    Return a backend with games played by two teams and an empty game.
+
+    In the first game, Round One takes two polls and ends with 1, 3 and 5; Round Two ends with 2,
+    2 and ?; Round Three is not finalized. In the second game, with a deck of its own, Round One
+    ends with M and L.
+    """
+    persistence = ProcessMemoryPersistence()
+    persistence.add_game('game-1', 'moderator-1', 'Liz', CARDS)
+    persistence.add_player('game-1', 'player-1', 'Ted')
+    persistence.add_player('game-1', 'player-2', 'Kim')
+    persistence.add_rounds('game-1', ['Round One', 'Round Two', 'Round Three'])
+
+    def poll(game_id, round_name, votes):
+        persistence.add_poll(game_id, round_name)
+        for voter_id, estimation in votes:
+            persistence.cast_vote(game_id, round_name, voter_id, estimation)
+
+    poll('game-1', 'Round One', [('moderator-1', CARDS[0]), ('player-1', CARDS[4])])
+    poll('game-1', 'Round One', [('moderator-1', CARDS[0]), ('player-1', CARDS[2]),
+                                 ('player-2', CARDS[3])])
+    persistence.finalize_round('game-1', 'Round One')
+    poll('game-1', 'Round Two', [('moderator-1', CARDS[1]), ('player-1', CARDS[1]),
+                                 ('player-2', CARDS[4])])
+    persistence.finalize_round('game-1', 'Round Two')
+    poll('game-1', 'Round Three', [('moderator-1', CARDS[3])])
+
+    persistence.add_game('game-2', 'moderator-2', 'Bob', OTHER_CARDS)
+    persistence.add_player('game-2', 'player-3', 'Ann')
+    persistence.add_round('game-2', 'Round One')
+    poll('game-2', 'Round One', [('player-3', 'L'), ('moderator-2', 'M')])
+    persistence.finalize_round('game-2', 'Round One')
+
+    persistence.add_game('game-3', 'moderator-3', 'Sue', CARDS)
+    return persistence
+
+
+def test_load_columns(persistence):
+    """Check if the last polls of finalized rounds are loaded, one element per vote."""
+    columns = analytics.load_columns(persistence)
+    games = [columns.game_ids.index(game_id) for game_id in ['game-1', 'game-2', 'game-3']]
+    assert columns.decks == [tuple(CARDS), tuple(OTHER_CARDS)] or \
+        columns.decks == [tuple(OTHER_CARDS), tuple(CARDS)]
+    assert [columns.decks[deck] for deck in columns.game_deck[games].tolist()] == [
+        tuple(CARDS), tuple(OTHER_CARDS), tuple(CARDS)]
+    assert columns.round_game.tolist().count(games[0]) == 2
+    assert sorted(columns.round_polls.tolist()) == [1, 1, 2]
+
+    game_votes = columns.vote_game == games[0]
+    assert sorted(zip(columns.vote_player[game_votes].tolist(),
+                      columns.vote_card[game_votes].tolist())) == [
+        (0, 0), (0, 1), (1, 1), (1, 2), (2, 3), (2, 4)]
+    assert numpy.isnan(columns.vote_estimate[columns.vote_game == games[1]]).all()
+
+
+def test_analyze(persistence):
+    """Check the reports."""
+    report = analytics.analyze(analytics.load_columns(persistence))
+    assert (report['games'], report['rounds'], report['votes']) == (3, 3, 8)
+
+    first_team = report['teams']['game-1']
+    assert (first_team['rounds'], first_team['mean_polls']) == (2, 1.5)
+    # Round One: 1, 3 and 5 - deviation sqrt(8 / 3), range 4; Round Two: 2 and 2.
+    assert abs(first_team['mean_deviation'] - numpy.sqrt(8 / 3) / 2) < 1e-9
+    assert first_team['mean_range'] == 2
+    assert report['teams']['game-2'] == {'rounds': 1, 'mean_polls': 1, 'mean_deviation': None,
+                                         'mean_range': None}
+    assert report['teams']['game-3'] == {'rounds': 0, 'mean_polls': None,
+                                         'mean_deviation': None, 'mean_range': None}
+
+    assert report['revotes'] == {'mean_polls': 4 / 3, 'revote_rate': 1 / 3,
+                                 'rounds_by_polls': [2, 1]}
+
+    decks = {tuple(deck['cards']): deck for deck in report['decks']}
+    assert decks[tuple(CARDS)] == {'cards': CARDS, 'games': 2, 'votes': [1, 2, 1, 1, 1]}
+    assert decks[tuple(OTHER_CARDS)] == {'cards': OTHER_CARDS, 'games': 1, 'votes': [0, 1, 1]}
+
+
+def test_analyze_nothing():
+    """Check if a backend without games gets empty reports."""
+    report = analytics.analyze(analytics.load_columns(ProcessMemoryPersistence()))
+    assert report == {'games': 0, 'rounds': 0, 'votes': 0, 'teams': {},
+                      'revotes': {'mean_polls': None, 'revote_rate': None, 'rounds_by_polls': []},
+                      'decks': []}
+
+
+def test_merge_dumps(persistence):
+    """Check if builders merged from JSON dumps of others analyze the games of all of them."""
+    dumps = []
+    for game_ids in [['game-1', 'game-3'], ['game-2']]:
+        builder = analytics.ColumnsBuilder()
+        for game_id in game_ids:
+            builder.add_game(game_id, persistence.finalized_polls(game_id))
+        dumps.append(loads_or_empty(dump_to_json(builder.dump())))
+
+    merged = analytics.ColumnsBuilder()
+    for dumped in dumps:
+        merged.merge(dumped)
+    assert analytics.analyze(merged.build()) == analytics.analyze(
+        analytics.load_columns(persistence))
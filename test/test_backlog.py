@@ -0,0 +1,105 @@
+"""Tests for reading round names from uploaded backlogs."""
+import asyncio
+
+import pytest
+
+from planningpoker.backlog import (
+    BacklogError, LineReader, MAX_LINE_LENGTH, line_parser, read_round_names
+)
+
+
+class Upload:
+
+    """A stream of bytes, like a request body, arriving in small pieces."""
+
+    def __init__(self, body: bytes, piece_size: int = 5):
+        """Start at the beginning of the body."""
+        self._body = body
+        self._piece_size = piece_size
+        self.position = 0
+
+    async def read(self, size: int) -> bytes:
+        """Return up to ``size`` next bytes or an empty bytes object at the end."""
+        piece = self._body[self.position:self.position + min(size, self._piece_size)]
+        self.position += len(piece)
+        return piece
+
+
+def run(coroutine):
+    """Run a coroutine in a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def read(content_type: str, body: bytes, **kwargs) -> list:
+    """Read round names from an upload."""
+    return run(read_round_names(Upload(body), line_parser(content_type), **kwargs))
+
+
+def test_csv():
+    """Check if names are taken from the round_name column and other columns are ignored."""
+    body = ('\ufeffticket, round_name,points\r\n'
+            'ABC-1,Log in,3\r\n'
+            '\r\n'
+            'ABC-2,"Log out, quickly",\r\n'
+            'ABC-3,Łódź,8\r\n').encode()
+    assert read('text/csv', body) == ['Log in', 'Log out, quickly', 'Łódź']
+
+
+def test_ndjson():
+    """Check if names are taken from strings and objects."""
+    body = b'"Log in"\n{"round_name": "Log out", "ticket": "ABC-2"}\n\n'
+    assert read('application/x-ndjson', body) == ['Log in', 'Log out']
+
+
+@pytest.mark.parametrize('content_type, body, line_number', [
+    ('text/csv', b'ticket,points\nABC-1,3\n', 1),
+    ('text/csv', b'ticket,round_name\nABC-1\n', 2),
+    ('text/csv', b'round_name\n""\n', 2),
+    ('text/csv', b'round_name\nok\n\xff\n', 3),
+    ('application/x-ndjson', b'"ok"\n{"ticket": "ABC-1"}\n', 2),
+    ('application/x-ndjson', b'not json\n', 1),
+    ('application/x-ndjson', b'12\n', 1),
+    ('application/x-ndjson', b'"a"\n"b"\n"c"\n', 3),
+])
+def test_invalid(content_type, body, line_number):
+    """Check if invalid lines and too many names are reported with the line number."""
+    with pytest.raises(BacklogError) as error:
+        read(content_type, body, max_rounds=2)
+    assert error.value.line_number == line_number
+    assert str(error.value).startswith('Line %d: ' % line_number)
+
+
+def test_line_reader():
+    """Check if lines are split across and within chunks, and too long ones are cut short."""
+    async def read_lines(upload, **kwargs):
+        reader = LineReader(upload, **kwargs)
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return lines
+            lines.append(line)
+
+    body = b'a\nbc\n\nlonger line\nend'
+    assert run(read_lines(Upload(body), chunk_size=4)) == [
+        b'a\n', b'bc\n', b'\n', b'longer line\n', b'end']
+    assert run(read_lines(Upload(body), max_length=5, chunk_size=4)) == [
+        b'a\n', b'bc\n', b'\n', b'longer', b' line\n', b'end']
+
+
+def test_long_line_rejected_early():
+    """Check if a line over the limit is rejected before the rest of it is read."""
+    upload = Upload(b'round_name\n' + b'x' * MAX_LINE_LENGTH * 10 + b'\n', piece_size=1024)
+    with pytest.raises(BacklogError) as error:
+        run(read_round_names(upload, line_parser('text/csv')))
+    assert error.value.line_number == 2
+    assert upload.position < MAX_LINE_LENGTH * 2
+
+
+def test_unsupported_content_type():
+    """Check if there is no parser for other uploads."""
+    assert line_parser('application/json') is None
@@ -0,0 +1,95 @@
+"""Tests for buses notifying processes of game changes."""
+import asyncio
+
+import pytest
+
+from planningpoker.bus import MemoryBus, UnixBus, UnixBusBroker, bus_from_uri
+from planningpoker.bus.base import encode_change, decode_change
+from planningpoker.persistence import ProcessMemoryPersistence, AsyncPersistenceAdapter
+
+GAME_ID = 'game-123456'
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+def test_change_encoding():
+    """Check if notifications survive the wire format and malformed lines are rejected."""
+    assert encode_change(GAME_ID, 12) == b'game-123456 12\n'
+    assert decode_change(encode_change(GAME_ID, 12)) == (GAME_ID, 12)
+    for line in [b'', b'game-123456', b'game-123456 x', b'a b c']:
+        with pytest.raises(ValueError):
+            decode_change(line)
+
+
+def test_bus_from_uri(loop, tmpdir):
+    """Check if buses are picked by URI."""
+    assert isinstance(bus_from_uri(loop, 'memory://'), MemoryBus)
+    assert isinstance(bus_from_uri(loop, 'unix:///%s' % tmpdir.join('bus.sock')), UnixBus)
+    for uri in ['unix://', 'unix://relative', 'amqp://localhost']:
+        with pytest.raises(ValueError):
+            bus_from_uri(loop, uri)
+
+
+def test_adapters_sharing_bus(loop):
+    """Check if a mutation through one adapter wakes clients waiting on another one."""
+    backend = ProcessMemoryPersistence()
+    bus = MemoryBus(loop)
+    writer = AsyncPersistenceAdapter(backend, loop=loop, bus=bus)
+    reader = AsyncPersistenceAdapter(backend, loop=loop, bus=bus)
+
+    async def scenario():
+        await writer.add_game(GAME_ID, 'moderator', 'Liz', [1, 2])
+        assert (await reader.encode_game(GAME_ID))[0] == 1
+        changed = reader.changes.changed(GAME_ID)
+        await writer.add_round(GAME_ID, 'Round One')
+        await changed
+        assert GAME_ID not in reader._encoded_games
+
+        # A notification of a version already known wakes nobody.
+        changed = reader.changes.changed(GAME_ID)
+        reader.game_changed(GAME_ID, 2)
+        assert not changed.done()
+
+    loop.run_until_complete(scenario())
+
+
+def test_unix_bus(loop, tmpdir):
+    """Check if notifications published by any process reach every process through the broker."""
+    path = str(tmpdir.join('bus.sock'))
+    broker = UnixBusBroker(loop, path)
+    buses = [UnixBus(loop, path) for _ in range(2)]
+    received = [[], []]
+    all_received = asyncio.Future(loop=loop)
+
+    def make_listener(notifications):
+        def listener(game_id, version):
+            notifications.append((game_id, version))
+            if all(len(notifications) == 2 for notifications in received):
+                all_received.set_result(None)
+        return listener
+
+    for bus, notifications in zip(buses, received):
+        bus.add_listener(make_listener(notifications))
+
+    async def scenario():
+        await broker.start()
+        for bus in buses:
+            await bus.start()
+        buses[0].publish(GAME_ID, 2)
+        buses[1].publish('another-game', 7)
+        await all_received
+
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        for bus in buses:
+            bus.close()
+        broker.close()
+    for notifications in received:
+        assert sorted(notifications) == [('another-game', 7), (GAME_ID, 2)]
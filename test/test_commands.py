@@ -0,0 +1,126 @@
+"""Tests for game commands and running them from WebSocket frames."""
+import asyncio
+
+import pytest
+import simplejson
+
+from planningpoker import commands
+from planningpoker.persistence import ProcessMemoryPersistence, AsyncPersistenceAdapter
+from planningpoker.persistence.exceptions import PlayerNameTaken
+from planningpoker.views.push import run_command
+
+GAME_ID = 'game-123456'
+MODERATOR_ID = 'moderator-id'
+PLAYER_ID = 'player-id'
+ROUND_NAME = 'Round One'
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def persistence(loop):
+    """Return a persistence with a game, a player, a round with a poll and one without."""
+    persistence = AsyncPersistenceAdapter(ProcessMemoryPersistence(), loop=loop)
+
+    async def setup():
+        await persistence.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2, 3])
+        await persistence.add_player(GAME_ID, PLAYER_ID, 'Ted')
+        await persistence.add_round(GAME_ID, ROUND_NAME)
+        await persistence.add_poll(GAME_ID, ROUND_NAME)
+        await persistence.add_round(GAME_ID, 'Round Without Polls')
+
+    loop.run_until_complete(setup())
+    return persistence
+
+
+@pytest.mark.parametrize('command, client_id, params, message, status', [
+    (commands.add_round, MODERATOR_ID, {}, 'Must specify the name.', 400),
+    (commands.add_round, MODERATOR_ID, {'round_name': ''}, 'The name must not be empty.', 400),
+    (commands.add_round, PLAYER_ID, {'round_name': 'Round Two'},
+     'The user is not the moderator of this game.', 403),
+    (commands.add_round, MODERATOR_ID, {'round_name': ROUND_NAME},
+     'Round with this name already exists.', 409),
+    (commands.add_poll, None, {'round_name': ROUND_NAME},
+     'The user is not the moderator of this game.', 403),
+    (commands.add_poll, MODERATOR_ID, {'round_name': 'Nope'}, 'Round does not exist.', 404),
+    (commands.add_round, MODERATOR_ID, {'round_name': ['Round Two']},
+     'The round name must be a string.', 400),
+    (commands.finalize_round, MODERATOR_ID, {}, 'Must specify the round.', 400),
+    (commands.finalize_round, MODERATOR_ID, {'round_name': {'name': ROUND_NAME}},
+     'The round name must be a string.', 400),
+    (commands.cast_vote, PLAYER_ID, {'round_name': ROUND_NAME, 'vote': [1]},
+     'The estimation voted for is invalid.', 400),
+    (commands.cast_vote, PLAYER_ID, {'round_name': ROUND_NAME, 'vote': {'card': 1}},
+     'The estimation voted for is invalid.', 400),
+    (commands.cast_vote, PLAYER_ID, {'round_name': ROUND_NAME, 'vote': True},
+     'The estimation voted for is invalid.', 400),
+    (commands.cast_vote, PLAYER_ID, {'round_name': ROUND_NAME}, 'Must provide an estimation.',
+     400),
+    (commands.cast_vote, PLAYER_ID, {'round_name': ROUND_NAME, 'vote': 4},
+     'The estimation voted for is invalid.', 400),
+    (commands.cast_vote, None, {'round_name': ROUND_NAME, 'vote': 1},
+     'Cannot vote until the name is provided.', 401),
+    (commands.cast_vote, PLAYER_ID, {'round_name': 'Round Without Polls', 'vote': 1},
+     'There is no active poll in this round.', 404),
+])
+def test_command_errors(loop, persistence, command, client_id, params, message, status):
+    """Check if commands reject invalid requests the way the HTTP views do."""
+    with pytest.raises(commands.CommandError) as error:
+        loop.run_until_complete(command(persistence, GAME_ID, client_id, params))
+    assert (error.value.message, error.value.status) == (message, status)
+
+
+def test_run_command(loop, persistence):
+    """Check if commands from frames are run and their results returned with their IDs."""
+    def run(client_id, frame):
+        result = loop.run_until_complete(run_command(persistence, GAME_ID, client_id, frame))
+        return simplejson.loads(result)
+
+    assert run(PLAYER_ID, '{"id": 1, "command": "cast_vote", "round_name": "Round One", '
+                          '"vote": 2}') == {'type': 'result', 'id': 1, 'status': 200}
+    assert run(MODERATOR_ID, '{"command": "finalize_round", "round_name": "Round One"}') == {
+        'type': 'result', 'id': None, 'status': 200}
+    assert run(PLAYER_ID, '{"id": "x", "command": "add_poll", "round_name": "Round One"}') == {
+        'type': 'result', 'id': 'x', 'status': 403,
+        'error': 'The user is not the moderator of this game.'}
+    for frame in ['{"command": "drop_game"}', '{"command": ["cast_vote"]}', '[]', 'not json',
+                  '{"command": "add_poll", "round_name": ["Round One"]}',
+                  '{"command": "cast_vote", "round_name": "Round One", "vote": {}}',
+                  '{"command": "cast_vote", "round_name": null, "vote": 1}']:
+        assert run(MODERATOR_ID, frame)['status'] == 400
+
+    game = loop.run_until_complete(persistence.serialize_game(GAME_ID))
+    assert game['rounds'][ROUND_NAME]['polls'] == [{'Ted': 2}]
+    assert game['rounds'][ROUND_NAME]['finalized'] is True
+
+
+def test_run_command_persistence_error(loop, persistence, monkeypatch):
+    """Check if a persistence error no command handles fails the command, not the socket."""
+    async def add_round(*args):
+        raise PlayerNameTaken(GAME_ID, 'Ted')
+
+    monkeypatch.setattr(persistence, 'add_round', add_round)
+    result = loop.run_until_complete(run_command(
+        persistence, GAME_ID, MODERATOR_ID, '{"id": 1, "command": "add_round", "round_name": "x"}'))
+    assert simplejson.loads(result) == {'type': 'result', 'id': 1, 'status': 500,
+                                        'error': str(PlayerNameTaken(GAME_ID, 'Ted'))}
+
+
+def test_execute(loop, persistence):
+    """Check if commands are picked by name and their errors turned into results."""
+    def execute(params, **kwargs):
+        return loop.run_until_complete(commands.execute(persistence, GAME_ID, PLAYER_ID, params,
+                                                        **kwargs))
+
+    assert execute({'command': 'add_round', 'round_name': 'Round Two'})['status'] == 403
+    assert execute({'command': 'add_round', 'round_name': 'Round Two'},
+                   owner_verified=True) == {'status': 200}
+    assert execute({'command': 'cast_vote', 'round_name': ROUND_NAME, 'vote': 1},
+                   available=commands.MODERATOR_COMMANDS) == {'status': 400,
+                                                              'error': 'Unknown command.'}
@@ -0,0 +1,33 @@
+"""Tests for formatting exported votes."""
+from decimal import Decimal
+
+import simplejson
+
+from planningpoker.persistence.base import VoteRecord
+from planningpoker.views.export import EXPORT_FORMATS, format_csv, format_ndjson
+
+RECORDS = [
+    VoteRecord('Round, "One"', True, 1, 'Liz', Decimal('2.5')),
+    VoteRecord('Round Two', False, 2, 'Łukasz', '?'),
+]
+
+
+def test_format_ndjson():
+    """Check if every record is a line with a JSON object."""
+    lines = format_ndjson(RECORDS).splitlines()
+    assert [simplejson.loads(line, use_decimal=True) for line in lines] == [
+        {'round_name': 'Round, "One"', 'finalized': True, 'poll': 1, 'player_name': 'Liz',
+         'estimation': Decimal('2.5')},
+        {'round_name': 'Round Two', 'finalized': False, 'poll': 2, 'player_name': 'Łukasz',
+         'estimation': '?'},
+    ]
+
+
+def test_format_csv():
+    """Check if records are CSV rows following the header."""
+    _, header, _ = EXPORT_FORMATS['csv']
+    assert header + format_csv(RECORDS) == (
+        'round_name,finalized,poll,player_name,estimation\r\n'
+        '"Round, ""One""",True,1,Liz,2.5\r\n'
+        'Round Two,False,2,Łukasz,?\r\n'
+    )
@@ -0,0 +1,23 @@
+"""Test matching entity tags of games."""
+import pytest
+
+from planningpoker.views.game import etag_matches
+
+ETAG = '"1a2b3c4d-12"'
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (None, False),
+    ('', False),
+    (ETAG, True),
+    ('*', True),
+    ('W/' + ETAG, True),
+    ('"1a2b3c4d-11"', False),
+    ('"1a2b3c4d-1"', False),
+    ('"x", %s' % ETAG, True),
+    ('"x",W/%s ,"y"' % ETAG, True),
+    ('"x", "y"', False),
+])
+def test_etag_matches(if_none_match, matches):
+    """Check if ``If-None-Match`` values are compared weakly to the entity tag."""
+    assert etag_matches(if_none_match, ETAG) is matches
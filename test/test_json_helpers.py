@@ -2,8 +2,21 @@
 from decimal import Decimal
 
 import pytest
+import simplejson
 
-from planningpoker.json import json_response, loads_or_empty
+from planningpoker.json import (
+    json_response, loads_or_empty, dump_with_encoded_values, encoded_json_response, get_codec,
+    CODECS, AUTO_CODEC, JSONCodec
+)
+
+
+@pytest.fixture(params=sorted(CODECS) + [AUTO_CODEC])
+def codec(request):
+    """Return each codec, skipping ones that are not installed."""
+    try:
+        return get_codec(request.param)
+    except ValueError as e:
+        pytest.skip(str(e))
 
 
 @pytest.mark.parametrize('native_data, resulting_bytes', [
@@ -32,6 +45,26 @@ def test_json_response_argument_passing():
     assert response.reason == reason
 
 
+@pytest.mark.parametrize('data, encoded_values, resulting_bytes', [
+    ({}, {}, b'{}'),
+    ({'a': Decimal(1)}, {}, b'{"a": 1}'),
+    ({}, {'game': b'{"x": [1]}'}, b'{"game": {"x": [1]}}'),
+    ({'ł': 'ą'}, {'game': b'null'}, '{"ł": "ą", "game": null}'.encode()),
+])
+def test_dump_with_encoded_values(data, encoded_values, resulting_bytes):
+    """Check if encoded values are embedded in the dumped JSON as they are."""
+    assert dump_with_encoded_values(data, **encoded_values) == resulting_bytes
+
+
+def test_encoded_json_response():
+    """Check if ``encoded_json_response`` responds with the bytes as JSON."""
+    response = encoded_json_response(b'{"a": 1}', status=201)
+    assert response.body == b'{"a": 1}'
+    assert response.status == 201
+    assert response.content_type == 'application/json'
+    assert response.charset == 'utf-8'
+
+
 @pytest.mark.parametrize('text, loaded', [
     ('', {}),
     ('{}', {}),
@@ -47,3 +80,40 @@ def test_json_response_argument_passing():
 def test_loads_or_empty(text, loaded):
     """Test if ``loads_or_empty`` returns an empty dict for invalid payloads."""
     assert loads_or_empty(text) == loaded
+
+
+@pytest.mark.parametrize('data', [
+    {'cards': [Decimal(10), Decimal('10.0'), Decimal('0.1'), Decimal('1E+2'), '?']},
+    [{'Ted': Decimal('2.50')}, {}, None, 1, 0.5, 'łąż'],
+    # Strings looking like markers of Decimals are left alone.
+    ['\x00' + '0' * 16 + '1', '\\u0000', '"'],
+])
+def test_codec_round_trip(codec, data):
+    """Check if codecs write Decimals exactly and the same JSON values as simplejson."""
+    encoded = codec.dumpb(data)
+    assert encoded.decode() == codec.dumps(data)
+    assert simplejson.loads(encoded.decode(), use_decimal=True) == \
+        simplejson.loads(simplejson.dumps(data), use_decimal=True)
+    assert codec.dumps([Decimal('10.0'), Decimal('1E+2')]).replace(' ', '') == '[10.0,1E+2]'
+    assert codec.loads('{"vote": 0.5, "n": 3}') == {'vote': 0.5, 'n': 3}
+    with pytest.raises(ValueError):
+        codec.loads('{')
+
+
+def test_get_codec():
+    """Check if unknown codecs are rejected."""
+    assert get_codec('simplejson').name == 'simplejson'
+    with pytest.raises(ValueError):
+        get_codec('marshal')
+    with pytest.raises(TypeError):
+        JSONCodec()
+
+
+def test_auto_codec_decodes_any_json():
+    """Check if JSON that orjson rejects is decoded by the next decoder."""
+    codec = get_codec(AUTO_CODEC)
+    decoded = codec.loads('{"vote": NaN, "limit": -Infinity}')
+    assert decoded['vote'] != decoded['vote']
+    assert decoded['limit'] == float('-inf')
+    with pytest.raises(ValueError):
+        codec.loads('{')
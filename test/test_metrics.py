@@ -0,0 +1,119 @@
+"""Tests for request metrics."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+from planningpoker.metrics import RequestMetrics, render_gauges, sum_metrics
+from planningpoker.middlewares import metrics_middleware
+
+
+class Request:
+
+    """The part of a request the metrics middleware reads."""
+
+    def __init__(self, route_name: str):
+        """Match the route."""
+        self.match_info = SimpleNamespace(route=SimpleNamespace(name=route_name))
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def metrics():
+    """Return counters of 2 routes with 2 latency buckets."""
+    return RequestMetrics(['get_game', 'new_game'], buckets=(0.1, 1))
+
+
+def test_observe(metrics):
+    """Check if requests are counted by route, status class and latency bucket."""
+    metrics.observe('get_game', 200, 0.05)
+    metrics.observe('get_game', 204, 0.1)
+    metrics.observe('get_game', 404, 0.5)
+    metrics.observe('get_game', 503, 3)
+    metrics.observe(None, 404, 0.01)
+    metrics.observe('Static', 200, 0.01)
+
+    get_game = metrics.routes['get_game']
+    assert list(get_game.statuses) == [0, 2, 0, 1, 1]
+    assert list(get_game.buckets) == [2, 1, 1]
+    assert get_game.latency_sum == 3.65
+    assert list(metrics.routes['unmatched'].statuses) == [0, 1, 0, 1, 0]
+    assert list(metrics.routes['new_game'].statuses) == [0] * 5
+    assert list(metrics.routes) == ['get_game', 'new_game', 'unmatched']
+
+
+def test_render(metrics):
+    """Check if histograms are rendered with cumulative buckets."""
+    metrics.observe('new_game', 200, 0.5)
+    metrics.observe('new_game', 200, 0.5)
+    lines = metrics.render()
+    assert lines[:2] == ['# HELP planningpoker_requests_total Requests by route and response '
+                         'status class.', '# TYPE planningpoker_requests_total counter']
+    assert 'planningpoker_requests_total{route="new_game",status="2xx"} 2' in lines
+    assert 'planningpoker_requests_total{route="unmatched",status="5xx"} 0' in lines
+    assert '# TYPE planningpoker_request_duration_seconds histogram' in lines
+    new_game = lines.index('planningpoker_request_duration_seconds_bucket'
+                           '{route="new_game",le="0.1"} 0')
+    assert lines[new_game + 1:new_game + 5] == [
+        'planningpoker_request_duration_seconds_bucket{route="new_game",le="1"} 2',
+        'planningpoker_request_duration_seconds_bucket{route="new_game",le="+Inf"} 2',
+        'planningpoker_request_duration_seconds_sum{route="new_game"} 1.0',
+        'planningpoker_request_duration_seconds_count{route="new_game"} 2',
+    ]
+
+
+def test_render_gauges():
+    """Check the format of gauges."""
+    assert render_gauges({'games': ('Games.', 3)}) == [
+        '# HELP planningpoker_games Games.',
+        '# TYPE planningpoker_games gauge',
+        'planningpoker_games 3',
+    ]
+
+
+def test_sum_metrics(metrics):
+    """Check if metrics of processes are added up sample by sample."""
+    metrics.observe('get_game', 200, 0.5)
+    other_metrics = RequestMetrics(['get_game', 'new_game'], buckets=(0.1, 1))
+    other_metrics.observe('get_game', 200, 0.25)
+    other_metrics.observe('new_game', 500, 0.01)
+    texts = ['\n'.join(m.render() + render_gauges({'games': ('Games.', games)})) + '\n'
+             for m, games in [(metrics, 1), (other_metrics, 2)]]
+
+    summed = sum_metrics(texts).splitlines()
+    assert len(summed) == len(texts[0].splitlines())
+    assert summed.count('# TYPE planningpoker_games gauge') == 1
+    assert 'planningpoker_games 3' in summed
+    assert 'planningpoker_requests_total{route="get_game",status="2xx"} 2' in summed
+    assert 'planningpoker_requests_total{route="new_game",status="5xx"} 1' in summed
+    assert 'planningpoker_request_duration_seconds_sum{route="get_game"} 0.75' in summed
+    assert ('planningpoker_request_duration_seconds_bucket{route="get_game",le="0.1"} 0'
+            in summed)
+
+
+def test_middleware(loop, metrics):
+    """Check if the middleware counts responses and HTTP errors with their statuses."""
+    responses = [web.Response(status=201), web.HTTPForbidden(), RuntimeError()]
+
+    async def handler(request):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    handler = loop.run_until_complete(metrics_middleware({'metrics': metrics}, handler))
+    assert loop.run_until_complete(handler(Request('get_game'))).status == 201
+    with pytest.raises(web.HTTPForbidden):
+        loop.run_until_complete(handler(Request('get_game')))
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(handler(Request('get_game')))
+    assert list(metrics.routes['get_game'].statuses) == [0, 1, 0, 1, 1]
+    assert sum(metrics.routes['get_game'].buckets) == 3
@@ -1,25 +1,68 @@
-"""Tests for persistence backends."""
+"""
+Conformance tests of persistence backends.
+
+Every test runs against every backend of the ``backend`` fixture - a new backend is covered by
+adding it there. The backends also opt into the error conformance suite of
+``test.persistence_errors``.
+"""
+import os
+from decimal import Decimal
+
 import pytest
 
-from planningpoker.persistence import ProcessMemoryPersistence
+from planningpoker.random_id import get_random_id
+from planningpoker.persistence import (
+    ProcessMemoryPersistence, JournaledMemoryPersistence, SQLitePersistence
+)
 from planningpoker.persistence.exceptions import (
     GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
     IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame,
 )
-
-GAME_ID = 'game-123456'
-GAME_CARDS = [1, 2, 3, 5, 8, 13]
-MODERATOR_ID = 'asdfw1'
-MODERATOR_NAME = 'Liz'
-ROUND_NAME = 'Round One'
+from test.persistence_errors import (
+    FailingOperationsSuite, GAME_ID, GAME_CARDS, MODERATOR_ID, MODERATOR_NAME, ROUND_NAME
+)
 
 
-@pytest.fixture
-def backend():
+@pytest.fixture(params=['memory', 'journal', 'sqlite', 'redis'])
+def backend(request, tmpdir):
     """Create a persistence backend."""
+    if request.param == 'journal':
+        backend = JournaledMemoryPersistence(str(tmpdir.join('journal')))
+        request.addfinalizer(backend.close)
+        return backend
+    if request.param == 'sqlite':
+        backend = SQLitePersistence(str(tmpdir.join('planningpoker.sqlite3')))
+        request.addfinalizer(backend.close)
+        return backend
+    if request.param == 'redis':
+        return make_redis_backend(request)
     return ProcessMemoryPersistence()
 
 
+def make_redis_backend(request):
+    """
+    Create a Redis persistence backend.
+
+    Uses the Redis server at ``PLANNINGPOKER_TEST_REDIS_URL`` if set, otherwise an in-process fake.
+    """
+    from planningpoker.persistence.redis import RedisPersistence
+
+    redis_url = os.environ.get('PLANNINGPOKER_TEST_REDIS_URL')
+    if redis_url is None:
+        fakeredis = pytest.importorskip('fakeredis')
+        return RedisPersistence(fakeredis.FakeStrictRedis(decode_responses=True))
+
+    prefix = 'planningpoker-test-%s' % get_random_id()
+    backend = RedisPersistence.from_url(redis_url, prefix=prefix)
+
+    def delete_test_keys():
+        for key in backend._client.scan_iter(prefix + ':*'):
+            backend._client.delete(key)
+
+    request.addfinalizer(delete_test_keys)
+    return backend
+
+
 @pytest.fixture
 def backend_with_a_game(backend):
     """Return a persistence backend holding one game."""
@@ -41,9 +84,18 @@ def backend_with_a_poll(backend_with_a_round):
     return backend_with_a_round
 
 
+def test_epoch(backend):
+    """Check if the epoch of a backend stays the same."""
+    epoch = backend.get_epoch()
+    assert isinstance(epoch, str) and epoch
+    assert backend.get_epoch() == epoch
+
+
 def test_initial_state(backend):
     """Check if the persistence backend is initially empty."""
     assert backend.games_count == 0
+    assert backend.game_ids() == []
+    assert backend.totals() == {'players': 0, 'rounds': 0, 'polls': 0}
 
 
 def test_add_game(backend):
@@ -71,6 +123,7 @@ def test_add_game(backend):
     backend.add_game(another_game_id, moderator_id, moderator_name, cards)
     assert backend.games_count == 2
     assert backend.serialize_game(game_id) == backend.serialize_game(another_game_id)
+    assert sorted(backend.game_ids()) == [game_id, another_game_id]
 
     assert backend.client_owns_game(game_id, moderator_id)
     assert backend.client_owns_game(another_game_id, moderator_id)
@@ -127,6 +180,7 @@ def test_add_round(backend_with_a_game):
     assert serialized['rounds_order'] == [round_name]
     assert serialized['rounds'] == {round_name: {
         'polls': [],
+        'statistics': [],
         'finalized': False,
     }}
 
@@ -141,6 +195,28 @@ def test_add_round(backend_with_a_game):
         'All rounds are created equal'
 
 
+def test_add_rounds(backend_with_a_round):
+    """Check if rounds are added all at once, in order, or not at all."""
+    backend = backend_with_a_round
+
+    with pytest.raises(NoSuchGame):
+        backend.add_rounds('nonexistent game', ['round 1'])
+
+    for round_names in [['round 1', ROUND_NAME], ['round 1', 'round 2', 'round 1']]:
+        with pytest.raises(RoundExists) as error:
+            backend.add_rounds(GAME_ID, round_names)
+        assert error.value.round_name == round_names[-1]
+    assert backend.serialize_game(GAME_ID)['rounds_order'] == [ROUND_NAME]
+    assert backend.get_game_version(GAME_ID) == 2
+
+    backend.add_rounds(GAME_ID, ['round 1', 'round 2'])
+    backend.add_round(GAME_ID, 'round 3')
+    serialized = backend.serialize_game(GAME_ID)
+    assert serialized['rounds_order'] == [ROUND_NAME, 'round 1', 'round 2', 'round 3']
+    assert serialized['rounds']['round 2'] == {'polls': [], 'statistics': [], 'finalized': False}
+    assert backend.get_game_version(GAME_ID) == 4
+
+
 def test_add_poll(backend_with_a_round):
     """Test adding a poll."""
     backend = backend_with_a_round
@@ -155,6 +231,7 @@ def test_add_poll(backend_with_a_round):
 
     backend.add_poll(GAME_ID, ROUND_NAME)
     assert backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls'] == [{}]
+    assert backend.totals() == {'players': 1, 'rounds': 1, 'polls': 1}
 
     backend.finalize_round(GAME_ID, ROUND_NAME)
 
@@ -245,12 +322,33 @@ def test_cast_vote(backend_with_a_round):
 
     assert backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls'] == [player_name_to_vote]
 
+    # Statistics follow changed votes.
+    assert backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['statistics'] == [{
+        'count': 4,
+        'histogram': [1, 1, 0, 2, 0, 0],
+        'consensus': False,
+        'mean': Decimal('3.25'),
+        'median': Decimal('3.5'),
+        'min': 1,
+        'max': 5,
+    }]
+
     # Recasting the same vote should not change anything.
     for player, vote in player_id_to_vote.items():
         backend.cast_vote(GAME_ID, ROUND_NAME, player, vote)
     assert backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls'] == [player_name_to_vote]
 
 
+def test_cast_vote_equal_card(backend_with_a_poll):
+    """Check if a vote for a number equal to a card is given as the card itself."""
+    backend = backend_with_a_poll
+    backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, Decimal('2.0'))
+    [vote] = backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls'][0].values()
+    assert (vote, type(vote)) == (GAME_CARDS[1], type(GAME_CARDS[1]))
+    assert [record.estimation for record in backend.export_votes(GAME_ID)] == [GAME_CARDS[1]]
+    assert str(vote) == str(GAME_CARDS[1])
+
+
 def test_cast_vote_round_finalized(backend_with_a_poll):
     """Test if casting a vote to a finalized round results in an error."""
     backend = backend_with_a_poll
@@ -285,3 +383,80 @@ def test_cast_vote_unregistrered(backend_with_a_poll):
     """Test if casting a vote by an unregistered player causes an exception to be raised."""
     with pytest.raises(PlayerNotInGame):
         backend_with_a_poll.cast_vote(GAME_ID, ROUND_NAME, '123123-no-such-player', GAME_CARDS[2])
+
+
+def test_game_version(backend):
+    """Check if every successful mutation, and only such, increments the game version."""
+    with pytest.raises(NoSuchGame):
+        backend.get_game_version(GAME_ID)
+
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    assert backend.get_game_version(GAME_ID) == 1
+
+    backend.add_player(GAME_ID, 'player-1', 'Tom')
+    backend.add_round(GAME_ID, ROUND_NAME)
+    backend.add_poll(GAME_ID, ROUND_NAME)
+    backend.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[0])
+    backend.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[1])
+    backend.finalize_round(GAME_ID, ROUND_NAME)
+    assert backend.get_game_version(GAME_ID) == 7
+
+    with pytest.raises(RoundExists):
+        backend.add_round(GAME_ID, ROUND_NAME)
+    with pytest.raises(RoundFinalized):
+        backend.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[0])
+    backend.serialize_game(GAME_ID)
+    assert backend.get_game_version(GAME_ID) == 7
+
+
+def test_export_votes(backend_with_a_poll):
+    """Check if votes are exported round by round and later mutations do not affect an export."""
+    backend = backend_with_a_poll
+    backend.add_player(GAME_ID, 'player-1', 'Tom')
+    backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, GAME_CARDS[0])
+    backend.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[1])
+    backend.finalize_round(GAME_ID, ROUND_NAME)
+    backend.add_round(GAME_ID, 'Round Two')
+    backend.add_poll(GAME_ID, 'Round Two')
+    backend.cast_vote(GAME_ID, 'Round Two', 'player-1', GAME_CARDS[2])
+
+    with pytest.raises(NoSuchGame):
+        backend.export_votes('nonexistent game')
+
+    export = backend.export_votes(GAME_ID)
+    backend.cast_vote(GAME_ID, 'Round Two', 'player-1', GAME_CARDS[3])
+    backend.cast_vote(GAME_ID, 'Round Two', MODERATOR_ID, GAME_CARDS[3])
+    assert sorted(export) == [
+        (ROUND_NAME, True, 1, MODERATOR_NAME, GAME_CARDS[0]),
+        (ROUND_NAME, True, 1, 'Tom', GAME_CARDS[1]),
+        ('Round Two', False, 1, 'Tom', GAME_CARDS[2]),
+    ]
+
+
+def test_finalized_polls(backend_with_a_poll):
+    """Check if the last polls of finalized rounds are read as arrays of slots and card indices."""
+    backend = backend_with_a_poll
+    backend.add_player(GAME_ID, 'player-1', 'Tom')
+    backend.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[1])
+    backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, GAME_CARDS[0])
+    backend.finalize_round(GAME_ID, ROUND_NAME)
+    backend.add_rounds(GAME_ID, ['Round Two', 'Round Three', 'Round Four'])
+    for round_name in ['Round Two', 'Round Two', 'Round Three', 'Round Four']:
+        backend.add_poll(GAME_ID, round_name)
+    backend.cast_vote(GAME_ID, 'Round Two', MODERATOR_ID, GAME_CARDS[2])
+    backend.finalize_round(GAME_ID, 'Round Two')
+    backend.cast_vote(GAME_ID, 'Round Three', MODERATOR_ID, GAME_CARDS[3])
+    backend.finalize_round(GAME_ID, 'Round Four')
+
+    with pytest.raises(NoSuchGame):
+        backend.finalized_polls('nonexistent game')
+
+    polls = backend.finalized_polls(GAME_ID)
+    assert polls.cards == GAME_CARDS
+    assert (polls.round_polls.tolist(), polls.round_votes.tolist()) == ([1, 2, 1], [2, 1, 0])
+    assert polls.votes.tolist() == [1, 1, 0, 0, 0, 2]
+
+
+class TestFailingOperations(FailingOperationsSuite):
+
+    """Errors of the backends of the ``backend`` fixture - see ``test.persistence_errors``."""
@@ -0,0 +1,154 @@
+"""Tests for the awaitable persistence adapter."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import simplejson
+
+from planningpoker.persistence import ProcessMemoryPersistence, AsyncPersistenceAdapter
+from planningpoker.persistence.exceptions import NoSuchGame, GameExists
+
+GAME_ID = 'game-123456'
+GAME_CARDS = [1, 2, 3, 5, 8, 13]
+MODERATOR_ID = 'asdfw1'
+MODERATOR_NAME = 'Liz'
+ROUND_NAME = 'Round One'
+
+
+class ThreadRecordingPersistence(ProcessMemoryPersistence):
+
+    """A memory backend pretending to block and recording threads it was called from."""
+
+    blocking = True
+
+    def __init__(self):
+        """Start with no recorded calls."""
+        super().__init__()
+        self.threads = []
+
+    def serialize_game(self, game_id: str) -> dict:
+        """Record the calling thread and delegate."""
+        self.threads.append(threading.current_thread())
+        return super().serialize_game(game_id)
+
+    def close(self) -> None:
+        """Record the calling thread."""
+        self.threads.append(threading.current_thread())
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+def test_adapter_delegates(loop):
+    """Check if the adapter exposes the whole backend contract as coroutines."""
+    persistence = AsyncPersistenceAdapter(ProcessMemoryPersistence(), loop=loop)
+
+    async def scenario():
+        assert await persistence.games_count() == 0
+        await persistence.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+        await persistence.add_player(GAME_ID, 'player-1', 'Tom')
+        await persistence.add_round(GAME_ID, ROUND_NAME)
+        await persistence.add_poll(GAME_ID, ROUND_NAME)
+        await persistence.cast_vote(GAME_ID, ROUND_NAME, 'player-1', GAME_CARDS[2])
+        await persistence.finalize_round(GAME_ID, ROUND_NAME)
+        assert await persistence.games_count() == 1
+        assert await persistence.client_owns_game(GAME_ID, MODERATOR_ID)
+        return await persistence.serialize_game(GAME_ID)
+
+    assert loop.run_until_complete(scenario()) == {
+        'players': [MODERATOR_NAME, 'Tom'],
+        'cards': GAME_CARDS,
+        'rounds_order': [ROUND_NAME],
+        'rounds': {ROUND_NAME: {
+            'polls': [{'Tom': GAME_CARDS[2]}],
+            'statistics': [{'count': 1, 'histogram': [0, 0, 1, 0, 0, 0], 'consensus': True,
+                            'mean': 3, 'median': 3, 'min': 3, 'max': 3}],
+            'finalized': True,
+        }},
+    }
+
+
+def test_adapter_propagates_exceptions(loop):
+    """Check if backend exceptions reach the awaiting coroutine intact."""
+    persistence = AsyncPersistenceAdapter(ThreadRecordingPersistence(), loop=loop)
+
+    with pytest.raises(NoSuchGame):
+        loop.run_until_complete(persistence.serialize_game('nonexistent game'))
+
+    loop.run_until_complete(
+        persistence.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS))
+    with pytest.raises(GameExists):
+        loop.run_until_complete(
+            persistence.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS))
+
+
+@pytest.mark.parametrize('blocking', [True, False])
+def test_adapter_offloads_blocking_backends(loop, blocking):
+    """Check if only blocking backends are called outside of the event loop thread."""
+    backend = ThreadRecordingPersistence()
+    backend.blocking = blocking
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    executor = ThreadPoolExecutor(max_workers=1)
+    persistence = AsyncPersistenceAdapter(backend, loop=loop, executor=executor)
+
+    loop.run_until_complete(persistence.serialize_game(GAME_ID))
+    executor.shutdown()
+
+    [calling_thread] = backend.threads
+    assert (calling_thread is threading.current_thread()) is not blocking
+
+
+@pytest.mark.parametrize('blocking', [True, False])
+def test_adapter_closes_backend(loop, blocking):
+    """Check if closing the adapter closes the backend, outside of the loop if it blocks."""
+    backend = ThreadRecordingPersistence()
+    backend.blocking = blocking
+    executor = ThreadPoolExecutor(max_workers=1)
+    persistence = AsyncPersistenceAdapter(backend, loop=loop, executor=executor)
+
+    loop.run_until_complete(persistence.close())
+    executor.shutdown()
+
+    [calling_thread] = backend.threads
+    assert (calling_thread is threading.current_thread()) is not blocking
+
+
+def test_encoded_games_cache(loop):
+    """Check if a game is encoded once per version."""
+    backend = ThreadRecordingPersistence()
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    persistence = AsyncPersistenceAdapter(backend, loop=loop)
+
+    version, encoded = loop.run_until_complete(persistence.encode_game(GAME_ID))
+    assert version == 1
+    assert simplejson.loads(encoded.decode()) == backend.serialize_game(GAME_ID)
+    backend.threads.clear()
+
+    assert loop.run_until_complete(persistence.encode_game(GAME_ID)) == (1, encoded)
+    assert backend.threads == []
+
+    backend.add_round(GAME_ID, ROUND_NAME)
+    version, encoded_with_a_round = loop.run_until_complete(persistence.encode_game(GAME_ID))
+    assert version == 2
+    assert ROUND_NAME.encode() in encoded_with_a_round
+    assert len(backend.threads) == 1
+
+
+def test_encoded_games_cache_size(loop):
+    """Check if only the most recently read games are kept encoded."""
+    backend = ThreadRecordingPersistence()
+    persistence = AsyncPersistenceAdapter(backend, loop=loop, encoded_games_cache_size=2)
+    for game_id in ['a', 'b', 'c']:
+        backend.add_game(game_id, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+        loop.run_until_complete(persistence.encode_game(game_id))
+    backend.threads.clear()
+
+    for game_id in ['c', 'b', 'a']:
+        loop.run_until_complete(persistence.encode_game(game_id))
+    assert len(backend.threads) == 1
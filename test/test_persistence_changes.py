@@ -0,0 +1,57 @@
+"""Tests for waiting for games to change."""
+import asyncio
+
+import pytest
+
+from planningpoker.persistence import ProcessMemoryPersistence, AsyncPersistenceAdapter
+from planningpoker.persistence.changes import GameChanges
+
+GAME_ID = 'game-123456'
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+def test_waiters_share_a_future(loop):
+    """Check if all waiters for a game are woken together and only by that game's change."""
+    changes = GameChanges(loop)
+    changed = changes.changed(GAME_ID)
+    assert changes.changed(GAME_ID) is changed
+    other_game_changed = changes.changed('other-game')
+
+    changes.notify(GAME_ID)
+    assert changed.done()
+    assert not other_game_changed.done()
+    assert changes.changed(GAME_ID) is not changed
+
+    changes.notify('nobody-waits-for-this-game')
+
+
+def test_timeouts_are_shared(loop):
+    """Check if timeouts ending close to each other share a future and a timer."""
+    changes = GameChanges(loop, timeout_resolution=0.05)
+    timeout = changes.timeout(0.01)
+    assert changes.timeout(0.01) is timeout
+    assert changes.timeout(0.2) is not timeout
+
+    start = loop.time()
+    loop.run_until_complete(timeout)
+    assert loop.time() - start >= 0.01
+
+
+def test_adapter_notifies_mutations(loop):
+    """Check if mutations made through the adapter wake the game's waiters."""
+    persistence = AsyncPersistenceAdapter(ProcessMemoryPersistence(), loop=loop)
+    loop.run_until_complete(persistence.add_game(GAME_ID, 'moderator', 'Liz', [1, 2]))
+
+    changed = persistence.changes.changed(GAME_ID)
+    loop.run_until_complete(persistence.serialize_game(GAME_ID))
+    assert not changed.done()
+
+    loop.run_until_complete(persistence.add_round(GAME_ID, 'Round One'))
+    assert changed.done()
@@ -5,15 +5,15 @@ import pytest
 
 from planningpoker.persistence.exceptions import (
     GameError, RoundError, PlayerStateError,
-    GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll,
+    GameExists, GameExpired, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll,
     RoundFinalized, IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered,
     PlayerNotInGame
 )
 
 
 @pytest.mark.parametrize('exception_class', [
-    GameExists, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll, RoundFinalized,
-    IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame
+    GameExists, GameExpired, RoundExists, NoSuchGame, NoSuchRound, NoActivePoll,
+    RoundFinalized, IllegalEstimation, PlayerNameTaken, PlayerAlreadyRegistered, PlayerNotInGame
 ])
 def test_exceptions_stringification(exception_class):
     """Check exception __str__ formatting."""
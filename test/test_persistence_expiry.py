@@ -0,0 +1,137 @@
+"""Tests for removing idle games from the process memory persistence backends."""
+import pytest
+
+from planningpoker.persistence import ProcessMemoryPersistence, JournaledMemoryPersistence
+from planningpoker.persistence.exceptions import GameExpired, NoSuchGame
+from test.persistence_errors import FailingOperationsSuite
+from test.test_timing_wheel import Clock
+
+GAME_TTL = 64
+GAME_ID = 'game-123456'
+OTHER_GAME_ID = 'game-654321'
+MODERATOR_ID = 'asdfw1'
+ROUND_NAME = 'Round One'
+
+
+@pytest.fixture
+def clock():
+    """Return a fake clock."""
+    return Clock()
+
+
+@pytest.fixture(params=['memory', 'journal'])
+def backend(request, tmpdir, clock):
+    """Create a memory persistence backend removing games idle for ``GAME_TTL`` seconds."""
+    if request.param == 'journal':
+        backend = JournaledMemoryPersistence(str(tmpdir.join('journal')), game_ttl=GAME_TTL,
+                                             clock=clock)
+        request.addfinalizer(backend.close)
+        return backend
+    return ProcessMemoryPersistence(game_ttl=GAME_TTL, clock=clock)
+
+
+def test_idle_games_expire(backend, clock):
+    """Check if games idle for the TTL are removed and reported as expired."""
+    backend.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    clock.now += GAME_TTL / 2
+    backend.add_game(OTHER_GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+
+    clock.now += GAME_TTL / 2 + 2
+    assert backend.evict_expired_games() == [GAME_ID]
+    assert backend.games_count == 1
+    assert backend.evicted_games_count == 1
+
+    with pytest.raises(GameExpired):
+        backend.serialize_game(GAME_ID)
+    with pytest.raises(GameExpired):
+        backend.add_round(GAME_ID, ROUND_NAME)
+    with pytest.raises(NoSuchGame):
+        backend.serialize_game('game-never-existed')
+
+    backend.serialize_game(OTHER_GAME_ID)
+
+
+def test_access_postpones_expiry(backend, clock):
+    """Check if both reads and mutations keep a game alive."""
+    backend.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    for access in [
+            lambda: backend.serialize_game(GAME_ID),
+            lambda: backend.client_owns_game(GAME_ID, MODERATOR_ID),
+            lambda: backend.add_round(GAME_ID, ROUND_NAME),
+            lambda: backend.add_poll(GAME_ID, ROUND_NAME),
+    ]:
+        clock.now += GAME_TTL - 2
+        assert backend.evict_expired_games() == []
+        access()
+
+    clock.now += GAME_TTL + 2
+    assert backend.evict_expired_games() == [GAME_ID]
+
+
+def test_no_ttl():
+    """Check if games are kept forever without a TTL."""
+    backend = ProcessMemoryPersistence()
+    backend.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    assert backend.expiry_interval is None
+    assert backend.evict_expired_games() == []
+    backend.serialize_game(GAME_ID)
+
+
+def test_tombstones_are_bounded(clock, monkeypatch):
+    """Check if only the most recently expired games are told apart from unknown ones."""
+    monkeypatch.setattr(ProcessMemoryPersistence, 'MAX_TOMBSTONES', 2)
+    backend = ProcessMemoryPersistence(game_ttl=GAME_TTL, clock=clock)
+    for game_id in ['a', 'b', 'c']:
+        backend.add_game(game_id, MODERATOR_ID, 'Liz', [1, 2])
+        clock.now += GAME_TTL + 2
+        backend.evict_expired_games()
+
+    assert backend.evicted_games_count == 3
+    with pytest.raises(NoSuchGame):
+        backend.serialize_game('a')
+    for game_id in ['b', 'c']:
+        with pytest.raises(GameExpired):
+            backend.serialize_game(game_id)
+
+
+def test_evictions_are_journaled(tmpdir, clock):
+    """Check if expired games do not come back after a restart."""
+    directory = str(tmpdir.join('journal'))
+    backend = JournaledMemoryPersistence(directory, game_ttl=GAME_TTL, clock=clock)
+    backend.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    backend.add_game(OTHER_GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    backend.evict_game(GAME_ID)
+    backend.close()
+
+    recovered = JournaledMemoryPersistence(directory, game_ttl=GAME_TTL, clock=clock)
+    try:
+        assert recovered.games_count == 1
+        assert recovered.evicted_games_count == 0
+        with pytest.raises(GameExpired):
+            recovered.serialize_game(GAME_ID)
+
+        # Recovered games expire after the TTL counted from the recovery.
+        clock.now += GAME_TTL + 2
+        assert recovered.evict_expired_games() == [OTHER_GAME_ID]
+    finally:
+        recovered.close()
+
+
+def test_snapshotted_games_expire(tmpdir, clock):
+    """Check if games recovered from a snapshot are put on the expiry wheel."""
+    directory = str(tmpdir.join('journal'))
+    backend = JournaledMemoryPersistence(directory, snapshot_every=1)
+    backend.add_game(GAME_ID, MODERATOR_ID, 'Liz', [1, 2])
+    backend.close()
+
+    recovered = JournaledMemoryPersistence(directory, game_ttl=GAME_TTL, clock=clock)
+    try:
+        clock.now += GAME_TTL + 2
+        assert recovered.evict_expired_games() == [GAME_ID]
+    finally:
+        recovered.close()
+
+
+class TestFailingOperations(FailingOperationsSuite):
+
+    """Errors of the backends removing idle games, while the game is not idle."""
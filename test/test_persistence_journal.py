@@ -0,0 +1,158 @@
+"""Tests for the journaled process memory persistence backend."""
+from decimal import Decimal
+
+import pytest
+
+from planningpoker.persistence import JournaledMemoryPersistence
+
+GAME_ID = 'game-123456'
+GAME_CARDS = [Decimal(1), Decimal('2.5'), Decimal(13), '?']
+MODERATOR_ID = 'asdfw1'
+MODERATOR_NAME = 'Liz'
+PLAYER_ID = 'fq2e1'
+PLAYER_NAME = 'Ted'
+ROUND_NAME = 'Round łąśðœ→ęóæą'
+
+
+def play(backend: JournaledMemoryPersistence, votes: int = 3) -> None:
+    """Run all kinds of mutations on a backend."""
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    backend.add_player(GAME_ID, PLAYER_ID, PLAYER_NAME)
+    backend.add_round(GAME_ID, ROUND_NAME)
+    backend.add_poll(GAME_ID, ROUND_NAME)
+    for vote in range(votes):
+        backend.cast_vote(GAME_ID, ROUND_NAME, PLAYER_ID, GAME_CARDS[vote % len(GAME_CARDS)])
+    backend.finalize_round(GAME_ID, ROUND_NAME)
+
+
+@pytest.fixture
+def directory(tmpdir):
+    """Return a path for the journal directory."""
+    return str(tmpdir.join('journal'))
+
+
+@pytest.mark.parametrize('snapshot_every', [1, 3, 1000])
+def test_recovery(directory, snapshot_every):
+    """Check if the state is recovered from snapshots and the journal."""
+    backend = JournaledMemoryPersistence(directory, snapshot_every=snapshot_every)
+    play(backend, votes=10)
+    serialized = backend.serialize_game(GAME_ID)
+    backend.close()
+
+    recovered = JournaledMemoryPersistence(directory, snapshot_every=snapshot_every)
+    assert recovered.serialize_game(GAME_ID) == serialized
+    assert recovered.client_owns_game(GAME_ID, MODERATOR_ID)
+
+    # The recovered backend keeps journaling.
+    recovered.add_round(GAME_ID, 'Another round')
+    serialized_with_another_round = recovered.serialize_game(GAME_ID)
+    recovered.close()
+
+    assert JournaledMemoryPersistence(directory).serialize_game(GAME_ID) == \
+        serialized_with_another_round
+
+
+def test_recover_added_rounds(directory):
+    """Check if rounds added at once are journaled as a single record and recovered."""
+    backend = JournaledMemoryPersistence(directory)
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    backend.add_rounds(GAME_ID, [ROUND_NAME, 'Round 2'])
+    assert backend._seq == 2
+    backend.close()
+
+    recovered = JournaledMemoryPersistence(directory)
+    assert recovered.serialize_game(GAME_ID)['rounds_order'] == [ROUND_NAME, 'Round 2']
+    assert recovered.get_game_version(GAME_ID) == 2
+    recovered.close()
+
+
+def test_snapshot_compacts_journal(directory, tmpdir):
+    """Check if files covered by a snapshot are removed."""
+    backend = JournaledMemoryPersistence(directory, snapshot_every=4)
+    play(backend, votes=10)
+    backend.close()
+
+    files = sorted(path.basename for path in tmpdir.join('journal').listdir())
+    assert files == ['journal-00000000000000000013.log', 'snapshot-00000000000000000012.json']
+
+
+def test_snapshot_of_the_state_when_taken(directory, monkeypatch):
+    """Check if a snapshot encoded by the writer thread holds the state from when it was taken."""
+    from planningpoker.persistence import journal
+
+    backend = JournaledMemoryPersistence(directory, snapshot_every=4)
+    encoding = []
+    original_encode_games = journal.encode_games
+
+    def encode_games(games):
+        # Mutations made right after the snapshot was taken, before the writer encoded it.
+        encoding.append(games)
+        backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, GAME_CARDS[1])
+        return original_encode_games(games)
+
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    backend.add_round(GAME_ID, ROUND_NAME)
+    backend.add_poll(GAME_ID, ROUND_NAME)
+    monkeypatch.setattr(journal, 'encode_games', encode_games)
+    backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, GAME_CARDS[0])
+    backend.flush()
+    monkeypatch.undo()
+    assert len(encoding) == 1
+    assert encoding[0][GAME_ID].rounds[ROUND_NAME].polls[0].votes.tolist() == [0, 0]
+    backend.close()
+
+    recovered = JournaledMemoryPersistence(directory)
+    assert recovered.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls'] == [
+        {MODERATOR_NAME: GAME_CARDS[1]}]
+    recovered.close()
+
+
+def test_read_only(directory, tmpdir):
+    """Check if a journal opened read-only gives the state and leaves the directory untouched."""
+    backend = JournaledMemoryPersistence(directory)
+    play(backend)
+    serialized = backend.serialize_game(GAME_ID)
+    backend.flush()
+    [segment] = tmpdir.join('journal').listdir()
+    segment.write('["r", "%s", "Torn' % GAME_ID, mode='a')
+    contents = segment.read()
+
+    reader = JournaledMemoryPersistence(directory, read_only=True)
+    assert reader.serialize_game(GAME_ID) == serialized
+    reader.add_round(GAME_ID, 'Round 2')
+    reader.close()
+    assert tmpdir.join('journal').listdir() == [segment]
+    assert segment.read() == contents
+    backend.close()
+
+    with pytest.raises(ValueError):
+        JournaledMemoryPersistence(str(tmpdir.join('nothing')), read_only=True)
+
+
+def test_failed_mutations_not_journaled(directory):
+    """Check if mutations rejected by validation do not end up in the journal."""
+    backend = JournaledMemoryPersistence(directory)
+    play(backend)
+    with pytest.raises(Exception):
+        backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    serialized = backend.serialize_game(GAME_ID)
+    backend.close()
+
+    assert JournaledMemoryPersistence(directory).serialize_game(GAME_ID) == serialized
+
+
+def test_torn_write(directory, tmpdir):
+    """Check if a record torn by a crash is dropped and records appended later are recovered."""
+    backend = JournaledMemoryPersistence(directory)
+    play(backend)
+    backend.close()
+    [segment] = tmpdir.join('journal').listdir()
+    segment.write('["r", "%s", "Torn' % GAME_ID, mode='a')
+
+    recovered = JournaledMemoryPersistence(directory)
+    assert recovered.serialize_game(GAME_ID)['rounds_order'] == [ROUND_NAME]
+    recovered.add_round(GAME_ID, 'Round 2')
+    recovered.close()
+
+    assert JournaledMemoryPersistence(directory).serialize_game(GAME_ID)['rounds_order'] == \
+        [ROUND_NAME, 'Round 2']
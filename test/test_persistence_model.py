@@ -0,0 +1,76 @@
+"""Tests for the compact in-memory game representation."""
+from copy import deepcopy
+from decimal import Decimal
+
+from planningpoker.persistence.model import Game, Poll
+
+CARDS = [Decimal(1), Decimal('2.5'), '?']
+
+
+def test_poll_revote():
+    """Check if a player's vote is replaced in place, along with its count in the histogram."""
+    poll = Poll(len(CARDS))
+    poll.cast(1, 0)
+    poll.cast(0, 2)
+    poll.cast(1, 1)
+    assert poll.votes.tolist() == [1, 1, 0, 2]
+    assert poll.histogram.tolist() == [0, 1, 1]
+    assert poll.serialize(['Liz', 'Ted'], CARDS) == {'Ted': Decimal('2.5'), 'Liz': '?'}
+
+
+def test_poll_positions():
+    """Check if votes are indexed by player slot while the poll is open, also after loading."""
+    game = Game('moderator-id', 'Liz', CARDS)
+    round = game.add_round('Round One')
+    first_poll = game.add_poll(round)
+    first_poll.cast(0, 0)
+    assert first_poll.positions == {0: 0}
+    game.add_poll(round)
+    assert first_poll.positions is None
+
+    loaded = Poll(len(CARDS), first_poll.votes[:])
+    loaded.cast(1, 2)
+    loaded.cast(0, 1)
+    assert (loaded.votes.tolist(), loaded.positions) == ([0, 1, 1, 2], {0: 0, 1: 2})
+
+
+def test_dump_and_load():
+    """Check if a game survives a round trip through its dump."""
+    game = Game('moderator-id', 'Liz', CARDS)
+    game.add_player('player-id', 'Ted')
+    round = game.add_round('Round One')
+    game.add_poll(round).cast(1, 0)
+    game.add_poll(round).cast(0, 1)
+    round.finalized = True
+    game.add_round('Round Two')
+
+    loaded = Game.load(game.dump())
+    assert loaded.dump() == game.dump()
+    assert loaded.player_slots == {'moderator-id': 0, 'player-id': 1}
+    assert loaded.name_slots == {'Liz': 0, 'Ted': 1}
+    assert loaded.serialize_rounds() == game.serialize_rounds()
+    rounds = loaded.serialize_rounds()
+    assert rounds['Round One']['polls'] == [{'Ted': Decimal(1)}, {'Liz': Decimal('2.5')}]
+    assert [statistics['histogram'] for statistics in rounds['Round One']['statistics']] == [
+        [1, 0, 0], [0, 1, 0]]
+    assert rounds['Round Two'] == {'polls': [], 'statistics': [], 'finalized': False}
+
+
+def test_copy():
+    """Check if a copy of a game is not affected by mutations of the original."""
+    game = Game('moderator-id', 'Liz', CARDS)
+    round = game.add_round('Round One')
+    game.add_poll(round).cast(0, 0)
+    dumped = deepcopy(game.dump())
+
+    copy = game.copy()
+    copy.rounds['Round One'].polls[0].cast(0, 0)
+    game.add_player('player-id', 'Ted')
+    round.polls[0].cast(1, 2)
+    round.polls[0].cast(0, 1)
+    round.finalized = True
+    game.add_round('Round Two')
+    assert copy.dump() == dumped
+    assert copy.rounds['Round One'].polls[0].histogram.tolist() == [1, 0, 0]
+    assert copy.rounds['Round One'].polls[0].positions == {0: 0}
+    assert copy.name_slots == {'Liz': 0}
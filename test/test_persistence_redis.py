@@ -0,0 +1,68 @@
+"""Tests specific to the Redis persistence backend."""
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('redis')
+
+from planningpoker.persistence.redis import RedisPersistence, card_key  # noqa
+from test.test_persistence import make_redis_backend  # noqa
+
+
+@pytest.mark.parametrize('card, equal_card', [
+    (1, Decimal(1)),
+    (Decimal('1.0'), Decimal(1)),
+    (Decimal('10'), 10),
+    (Decimal('0.5'), 0.5),
+    (Decimal('-0'), 0),
+    ('?', '?'),
+])
+def test_card_key_equal(card, equal_card):
+    """Check if cards equal in Python get equal keys."""
+    assert card_key(card) == card_key(equal_card)
+
+
+@pytest.mark.parametrize('card, other_card', [
+    (1, '1'),
+    (Decimal('0.1'), 0.1),  # The float is not exactly 0.1.
+    (Decimal(2), Decimal(20)),
+    ('Break?', '?'),
+])
+def test_card_key_different(card, other_card):
+    """Check if cards different in Python get different keys."""
+    assert card_key(card) != card_key(other_card)
+
+
+def test_shared_epoch():
+    """Check if backends using the same database share the epoch, unlike the ones using others."""
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeStrictRedis(decode_responses=True)
+    epoch = RedisPersistence(client).get_epoch()
+    assert RedisPersistence(client).get_epoch() == epoch
+    assert RedisPersistence(client, prefix='other').get_epoch() != epoch
+
+
+def test_script_keys_share_the_hash_tag():
+    """Check if scripts get only keys of the game's slot of a Redis cluster."""
+    fakeredis = pytest.importorskip('fakeredis')
+    backend = RedisPersistence(fakeredis.FakeStrictRedis(decode_responses=True))
+    assert all('{game-123456}' in key for key in backend._keys('game-123456'))
+
+
+def test_serialize_large_game(request):
+    """Check if games with more rounds and votes than a Lua call can take at once are serialized."""
+    backend = make_redis_backend(request)
+    backend.add_game('game-123456', 'player-0', 'Player 0', [1, 2])
+    for i in range(1, 90):
+        backend.add_player('game-123456', 'player-%d' % i, 'Player %d' % i)
+    round_names = ['Round %d' % i for i in range(8010)]
+    backend.add_rounds('game-123456', round_names)
+    for poll in range(90):  # 8100 votes.
+        backend.add_poll('game-123456', 'Round 0')
+        for i in range(90):
+            backend.cast_vote('game-123456', 'Round 0', 'player-%d' % i, 1 + (poll + i) % 2)
+
+    game = backend.serialize_game('game-123456')
+    assert game['rounds_order'] == round_names
+    assert game['rounds']['Round 0']['polls'] == [
+        {'Player %d' % i: 1 + (poll + i) % 2 for i in range(90)} for poll in range(90)]
@@ -0,0 +1,129 @@
+"""Tests specific to the SQLite persistence backend."""
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from planningpoker.persistence import SQLitePersistence
+from planningpoker.persistence.sqlite import MIGRATIONS
+from planningpoker.persistence.exceptions import IllegalEstimation
+
+GAME_ID = 'game-123456'
+GAME_CARDS = [Decimal(1), Decimal('2.5'), Decimal(13), '?']
+MODERATOR_ID = 'asdfw1'
+MODERATOR_NAME = 'Liz'
+ROUND_NAME = 'Round One'
+
+
+@pytest.fixture
+def database_path(tmpdir):
+    """Return a path for a new database file."""
+    return str(tmpdir.join('planningpoker.sqlite3'))
+
+
+def test_state_survives_reopening(database_path):
+    """Check if committed state is there after the database is reopened."""
+    backend = SQLitePersistence(database_path)
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    backend.add_round(GAME_ID, ROUND_NAME)
+    backend.add_poll(GAME_ID, ROUND_NAME)
+    backend.cast_vote(GAME_ID, ROUND_NAME, MODERATOR_ID, Decimal('2.5'))
+    serialized = backend.serialize_game(GAME_ID)
+    backend.close()
+
+    reopened = SQLitePersistence(database_path)
+    try:
+        assert reopened.games_count == 1
+        assert reopened.serialize_game(GAME_ID) == serialized
+        assert reopened.client_owns_game(GAME_ID, MODERATOR_ID)
+    finally:
+        reopened.close()
+
+
+def test_shared_epoch(database_path):
+    """Check if all connections to the database, also after reopening, share the epoch."""
+    backend = SQLitePersistence(database_path)
+    other_backend = SQLitePersistence(database_path)
+    epoch = backend.get_epoch()
+    assert other_backend.get_epoch() == epoch
+    backend.close()
+    other_backend.close()
+
+    reopened = SQLitePersistence(database_path)
+    try:
+        assert reopened.get_epoch() == epoch
+    finally:
+        reopened.close()
+
+
+def test_group_commit(database_path):
+    """Check if concurrent mutations committed together keep their individual outcomes."""
+    backend = SQLitePersistence(database_path, commit_interval=0.05)
+    backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+    backend.add_round(GAME_ID, ROUND_NAME)
+    backend.add_poll(GAME_ID, ROUND_NAME)
+    players = ['player-%d' % i for i in range(20)]
+    for player_id in players:
+        backend.add_player(GAME_ID, player_id, player_id.upper())
+
+    def vote(player_id):
+        estimation = 'no such card' if player_id == players[0] else GAME_CARDS[0]
+        try:
+            backend.cast_vote(GAME_ID, ROUND_NAME, player_id, estimation)
+        except IllegalEstimation:
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=len(players)) as executor:
+        outcomes = list(executor.map(vote, players))
+
+    try:
+        assert outcomes == [False] + [True] * (len(players) - 1)
+        [poll] = backend.serialize_game(GAME_ID)['rounds'][ROUND_NAME]['polls']
+        assert poll == {player_id.upper(): GAME_CARDS[0] for player_id in players[1:]}
+    finally:
+        backend.close()
+
+
+def test_migration(database_path):
+    """Check if a database made before games had versions is migrated and its games kept."""
+    connection = sqlite3.connect(database_path)
+    connection.executescript('''
+        CREATE TABLE games (game_id TEXT PRIMARY KEY, moderator_id TEXT NOT NULL,
+                            cards TEXT NOT NULL);
+        CREATE TABLE players (game_id TEXT NOT NULL, player_id TEXT NOT NULL, name TEXT NOT NULL,
+                              PRIMARY KEY (game_id, player_id), UNIQUE (game_id, name));
+    ''')
+    connection.execute("INSERT INTO games VALUES (?, ?, '[1, 2]')", (GAME_ID, MODERATOR_ID))
+    connection.execute('INSERT INTO players VALUES (?, ?, ?)',
+                       (GAME_ID, MODERATOR_ID, MODERATOR_NAME))
+    connection.commit()
+    connection.close()
+
+    # Reopening a migrated database changes nothing.
+    for version in [1, 2]:
+        backend = SQLitePersistence(database_path)
+        try:
+            assert backend.get_game_version(GAME_ID) == version
+            assert backend.serialize_game(GAME_ID)['players'] == [MODERATOR_NAME]
+            backend.add_round(GAME_ID, 'Round %d' % version)
+        finally:
+            backend.close()
+
+    connection = sqlite3.connect(database_path)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+    connection.close()
+
+
+def test_lone_mutation_committed_at_once(database_path):
+    """Check if a mutation with no others queued does not wait for the commit interval."""
+    backend = SQLitePersistence(database_path, commit_interval=5)
+    try:
+        start = time.monotonic()
+        backend.add_game(GAME_ID, MODERATOR_ID, MODERATOR_NAME, GAME_CARDS)
+        backend.add_round(GAME_ID, ROUND_NAME)
+        assert time.monotonic() - start < 2
+    finally:
+        backend.close()
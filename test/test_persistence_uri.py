@@ -0,0 +1,59 @@
+"""Test selecting persistence backends by URI."""
+import pytest
+
+from planningpoker.persistence import (
+    backend_from_uri, ProcessMemoryPersistence, JournaledMemoryPersistence, SQLitePersistence,
+    DEFAULT_PERSISTENCE_URI
+)
+
+
+def test_memory_uri():
+    """Check if the default URI selects the process memory backend."""
+    assert isinstance(backend_from_uri(DEFAULT_PERSISTENCE_URI), ProcessMemoryPersistence)
+
+
+def test_journaled_memory_uri(tmpdir):
+    """Check if a memory URI with a path keeps the journal in the directory."""
+    path = tmpdir.join('journal')
+    backend = backend_from_uri('memory:///' + str(path))
+    try:
+        assert isinstance(backend, JournaledMemoryPersistence)
+        assert path.check(dir=True)
+    finally:
+        backend.close()
+
+
+def test_sqlite_uri(tmpdir):
+    """Check if an SQLite URI opens a database at the given path."""
+    path = tmpdir.join('db.sqlite3')
+    backend = backend_from_uri('sqlite:///' + str(path))
+    try:
+        assert isinstance(backend, SQLitePersistence)
+        assert path.check(file=True)
+    finally:
+        backend.close()
+
+
+@pytest.mark.parametrize('uri', [
+    '', 'sqlite://', 'sqlite://host/path', 'memory://host/path', 'postgres://db'
+])
+def test_invalid_uri(uri):
+    """Check if unsupported URIs are rejected."""
+    with pytest.raises(ValueError):
+        backend_from_uri(uri)
+
+
+@pytest.mark.parametrize('uri', ['memory://', 'memory:///journal'])
+def test_game_ttl(uri, tmpdir, monkeypatch):
+    """Check if memory backends accept a game TTL."""
+    monkeypatch.chdir(tmpdir)
+    backend = backend_from_uri(uri, game_ttl=60)
+    assert backend.expiry_interval is not None
+    if isinstance(backend, JournaledMemoryPersistence):
+        backend.close()
+
+
+def test_game_ttl_unsupported(tmpdir):
+    """Check if backends not removing idle games reject a game TTL."""
+    with pytest.raises(ValueError):
+        backend_from_uri('sqlite:///' + str(tmpdir.join('db.sqlite3')), game_ttl=60)
@@ -0,0 +1,113 @@
+"""Tests for the sampling request profiler."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from planningpoker.profiling import RequestProfiler
+from planningpoker.middlewares import profiling_middleware
+
+
+class Request:
+
+    """The part of a request the profiling middleware reads."""
+
+    def __init__(self, route_name: str):
+        """Match the route."""
+        self.match_info = SimpleNamespace(route=SimpleNamespace(name=route_name))
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def profiler(request, loop, tmpdir):
+    """Return a disabled profiler sampling every 2nd request and dumping every 3 samples."""
+    profiler = RequestProfiler(loop, 2, str(tmpdir.join('profile.log')), dump_every=3,
+                               time_limit=0.05)
+    request.addfinalizer(lambda: loop.run_until_complete(profiler.close()))
+    return profiler
+
+
+def estimate(request):
+    """Handle a request with a function for the profiler to find."""
+    return sum(range(1000))
+
+
+async def handler(request):
+    """Respond to a request."""
+    return estimate(request)
+
+
+def test_disabled(loop, profiler):
+    """Check if the middleware stays out of the way of requests while the profiler is off."""
+    assert loop.run_until_complete(profiling_middleware({'profiler': profiler}, handler)) \
+        is handler
+
+
+def test_sampling(loop, profiler, tmpdir):
+    """Check if one request in N of each route is profiled and reports are written to the file."""
+    profiler.toggle()
+
+    def handle(route_name):
+        wrapped = loop.run_until_complete(profiling_middleware({'profiler': profiler}, handler))
+        return loop.run_until_complete(wrapped(Request(route_name)))
+
+    for route_name in ['get_game', 'cast_vote', 'get_game', 'cast_vote', 'get_game']:
+        assert handle(route_name) == 499500
+    assert profiler.profiled_requests == 2
+    report = profiler.report()
+    assert '=== Route cast_vote: 1 profiled requests' in report
+    assert '=== Route get_game: 1 profiled requests' in report
+    assert 'estimate' in report
+    assert not tmpdir.join('profile.log').exists()
+
+    handle('get_game')
+    assert profiler.profiled_requests == 3
+    assert profiler.report() == ''
+    loop.run_until_complete(profiler.flush())
+    assert '=== Route get_game: 2 profiled requests' in tmpdir.join('profile.log').read()
+
+    handle('add_game')
+    handle('add_game')
+    profiler.toggle()
+    assert not profiler.enabled
+    loop.run_until_complete(profiler.flush())
+    assert '=== Route add_game: 1 profiled requests' in tmpdir.join('profile.log').read()
+
+
+def test_one_request_at_a_time(profiler):
+    """Check if samples falling on requests started while another one is profiled are skipped."""
+    profiler.set_enabled(True)
+    profiler._seen['get_game'] = 1
+    assert profiler.should_profile('get_game')
+    profiler._current = object()
+    profiler._seen['get_game'] = 3
+    assert not profiler.should_profile('get_game')
+
+
+def test_long_requests(loop, profiler):
+    """Check if profiling stops after the time limit and long-lived routes are not profiled."""
+    profiler.set_enabled(True)
+    assert not any(profiler.should_profile('game_events') for _ in range(4))
+
+    async def slow_handler(request):
+        await asyncio.sleep(0.2)
+        return 'done'
+
+    async def scenario():
+        wrapped = await profiling_middleware({'profiler': profiler}, slow_handler)
+        first = loop.create_task(wrapped(Request('get_game')))
+        await asyncio.sleep(0.01)
+        profiled = loop.create_task(wrapped(Request('get_game')))
+        await asyncio.sleep(0.1)
+        assert (profiler.profiled_requests, profiler._current) == (1, None)
+        assert (await first, await profiled) == ('done', 'done')
+
+    loop.run_until_complete(scenario())
+    assert profiler.profiled_requests == 1
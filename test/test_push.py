@@ -0,0 +1,130 @@
+"""Tests for pushing game updates to subscribers."""
+import asyncio
+
+import pytest
+import simplejson
+
+from planningpoker.push import Subscription, GamePublisher, Update, parse_event_id
+from planningpoker.persistence import ProcessMemoryPersistence, AsyncPersistenceAdapter
+from test.test_timing_wheel import Clock
+
+GAME_ID = 'game-123456'
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+def test_subscription_coalesces_updates(loop):
+    """Check if a subscription keeps only the newest update."""
+    subscription = Subscription()
+    subscription.offer(Update('epoch', 2, 'two'))
+    subscription.offer(Update('epoch', 3, 'three'))
+    subscription.offer(Update('epoch', 1, 'one'))
+    assert loop.run_until_complete(subscription.next(loop)).message == 'three'
+
+    subscription.offer(Update('epoch', 3, 'three again'))
+    subscription.offer(Update('epoch', 4, 'four'))
+    assert loop.run_until_complete(subscription.next(loop)).message == 'four'
+
+    subscription.end()
+    assert loop.run_until_complete(subscription.next(loop)) is None
+
+
+def test_subscription_timeout(loop):
+    """Check if waiting for an update ends when the timeout future resolves."""
+    subscription = Subscription()
+    timeout = asyncio.Future(loop=loop)
+    loop.call_soon(timeout.set_result, None)
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(subscription.next(loop, timeout))
+
+    subscription.offer(Update('epoch', 1, 'one'))
+    assert loop.run_until_complete(subscription.next(loop, timeout)).message == 'one'
+
+
+def test_update_event():
+    """Check if an update is framed as a Server-Sent Event identified by its version."""
+    update = Update('a1b2c3d4', 7, '{"version": 7}')
+    assert update.event == b'id: a1b2c3d4-7\nevent: game\ndata: {"version": 7}\n\n'
+    assert update.event is update.event
+
+
+@pytest.mark.parametrize('last_event_id, version', [
+    ('a1b2c3d4-7', 7),
+    (' a1b2c3d4-12 ', 12),
+    (None, None),
+    ('', None),
+    ('ffffffff-7', None),
+    ('a1b2c3d4-', None),
+    ('a1b2c3d4-x', None),
+    ('7', None),
+])
+def test_parse_event_id(last_event_id, version):
+    """Check if only event IDs of the current epoch give a version."""
+    assert parse_event_id(last_event_id, 'a1b2c3d4') == version
+
+
+def test_publisher(loop):
+    """Check if every change is encoded once and reaches all subscribers."""
+    persistence = AsyncPersistenceAdapter(ProcessMemoryPersistence(), loop=loop)
+    publisher = GamePublisher(persistence, loop)
+    encodings = []
+    original_encode_game = persistence.encode_game
+
+    async def encode_game(game_id):
+        encodings.append(game_id)
+        return await original_encode_game(game_id)
+
+    persistence.encode_game = encode_game
+
+    async def scenario():
+        await persistence.add_game(GAME_ID, 'moderator', 'Liz', [1, 2])
+        subscriptions = [publisher.subscribe(GAME_ID) for _ in range(3)]
+        first_updates = [simplejson.loads((await s.next(loop)).message) for s in subscriptions]
+        assert [update['version'] for update in first_updates] == [1, 1, 1]
+        assert first_updates[0]['game']['players'] == ['Liz']
+
+        await persistence.add_round(GAME_ID, 'Round One')
+        for subscription in subscriptions:
+            update = simplejson.loads((await subscription.next(loop)).message)
+            assert update == {'type': 'game', 'version': 2,
+                              'game': await persistence.serialize_game(GAME_ID)}
+        assert len(encodings) == 2
+
+        for subscription in subscriptions:
+            publisher.unsubscribe(GAME_ID, subscription)
+        await asyncio.sleep(0)
+        await persistence.add_poll(GAME_ID, 'Round One')
+        await asyncio.sleep(0)
+        assert len(encodings) == 2
+
+    loop.run_until_complete(scenario())
+    publisher.close()
+
+
+def test_eviction_ends_subscriptions(loop):
+    """Check if subscriptions of a game removed for being idle end right away."""
+    clock = Clock()
+    persistence = AsyncPersistenceAdapter(ProcessMemoryPersistence(game_ttl=64, clock=clock),
+                                          loop=loop)
+    publisher = GamePublisher(persistence, loop)
+
+    async def scenario():
+        await persistence.add_game(GAME_ID, 'moderator', 'Liz', [1, 2])
+        subscription = publisher.subscribe(GAME_ID)
+        assert (await subscription.next(loop)).version == 1
+        changed = persistence.changes.changed(GAME_ID)
+
+        clock.now += 100
+        assert await persistence.evict_expired_games() == [GAME_ID]
+        assert changed.done()
+        assert await subscription.next(loop) is None
+        assert subscription.ended
+
+    loop.run_until_complete(scenario())
+    publisher.close()
@@ -0,0 +1,133 @@
+"""Tests for the session storage caching decrypted cookies."""
+import os
+import time
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from planningpoker.sessions import CachingEncryptedCookieStorage
+
+COOKIE_NAME = 'AIOHTTP_SESSION'
+
+
+class Request:
+
+    """The part of a request session storages read."""
+
+    def __init__(self, cookie: str = None):
+        """Send the cookie, if given."""
+        self.cookies = {} if cookie is None else {COOKIE_NAME: cookie}
+
+
+class Clock:
+
+    """A clock that moves only when told to."""
+
+    def __init__(self):
+        """Start at 0."""
+        self.time = 0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.time
+
+
+@pytest.fixture
+def loop(request):
+    """Create a fresh event loop."""
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def clock():
+    """Return a stopped clock."""
+    return Clock()
+
+
+@pytest.fixture
+def storage(clock):
+    """Return a storage keeping 2 cookies decrypted for 10 seconds."""
+    return CachingEncryptedCookieStorage(os.urandom(32), cache_size=2, ttl=10,
+                                         clock=clock)
+
+
+def new_cookie(loop, storage, client_id: str) -> str:
+    """Return the cookie a client gets with its new session."""
+    session = loop.run_until_complete(storage.load_session(Request()))
+    session['client_id'] = client_id
+    response = web.Response()
+    loop.run_until_complete(storage.save_session(Request(), response, session))
+    return response.cookies[COOKIE_NAME].value
+
+
+def test_cached_sessions(loop, storage, clock):
+    """Check if cookies are decrypted once until they expire or get evicted."""
+    first_cookie = new_cookie(loop, storage, 'first')
+
+    def load(cookie):
+        return loop.run_until_complete(storage.load_session(Request(cookie)))
+
+    for _ in range(3):
+        session = load(first_cookie)
+        assert (session.new, session['client_id']) == (False, 'first')
+    assert (storage.hits, storage.misses, storage.hit_rate) == (3, 0, 1)
+
+    session['client_id'] = 'changed'  # Changes of a session do not leak into the cache.
+    assert load(first_cookie)['client_id'] == 'first'
+
+    clock.time = 10
+    assert load(first_cookie)['client_id'] == 'first'
+    assert (storage.hits, storage.misses) == (4, 1)
+
+    second_cookie = new_cookie(loop, storage, 'second')
+    new_cookie(loop, storage, 'third')
+    assert load(second_cookie)['client_id'] == 'second'
+    assert load(first_cookie)['client_id'] == 'first'
+    assert (storage.hits, storage.misses) == (5, 2)
+
+    assert load(first_cookie[:-2]).new  # Tampered cookies are not cached.
+    assert load(first_cookie[:-2]).new
+    assert storage.misses == 4
+
+
+def test_unchanged_session_not_saved(loop, storage):
+    """Check if sessions are not encrypted again if the request's cookie holds their data."""
+    cookie = new_cookie(loop, storage, 'first')
+    session = loop.run_until_complete(storage.load_session(Request(cookie)))
+
+    session['client_id'] = 'first'
+    response = web.Response()
+    loop.run_until_complete(storage.save_session(Request(cookie), response, session))
+    assert COOKIE_NAME not in response.cookies
+    assert storage.skipped_saves == 1
+
+    session['client_id'] = 'second'
+    loop.run_until_complete(storage.save_session(Request(cookie), response, session))
+    assert response.cookies[COOKIE_NAME].value != cookie
+    assert storage.skipped_saves == 1
+
+
+def test_cookie_expiry(loop, clock):
+    """Check if cached cookies expire with their own max age, counted from their creation."""
+    secret_key = os.urandom(32)
+    cookie = new_cookie(loop, CachingEncryptedCookieStorage(secret_key), 'first')
+    storage = CachingEncryptedCookieStorage(secret_key, ttl=10, max_age=30, clock=clock)
+
+    def load(cookie):
+        return loop.run_until_complete(storage.load_session(Request(cookie)))
+
+    clock.time = time.time()
+    created = load(cookie).created
+    assert (storage.hits, storage.misses) == (0, 1)
+
+    clock.time = created + 25  # Decrypted again after ttl, cached until the cookie expires.
+    load(cookie)
+    clock.time = created + 29
+    load(cookie)
+    assert (storage.hits, storage.misses) == (1, 2)
+    clock.time = created + 30
+    load(cookie)
+    assert (storage.hits, storage.misses) == (1, 3)
@@ -0,0 +1,46 @@
+"""Test assigning games to worker processes."""
+from itertools import count
+
+import pytest
+
+from planningpoker.sharding import Shard, SINGLE_SHARD, game_shard, get_shard_game_id, path_shard
+from planningpoker.persistence.uri import shard_persistence_uri
+
+
+@pytest.mark.parametrize('shards', [1, 2, 3, 8])
+def test_get_shard_game_id(shards):
+    """Check if game IDs generated for a shard are owned by the shard."""
+    for index in range(shards):
+        game_id = get_shard_game_id(Shard(index, shards))
+        assert game_shard(game_id, shards) == index
+
+
+def test_get_shard_game_id_single_shard():
+    """Check if a single shard takes the first ID it gets."""
+    ids = ('id-%d' % i for i in count())
+    assert get_shard_game_id(SINGLE_SHARD, get_id=lambda: next(ids)) == 'id-0'
+
+
+@pytest.mark.parametrize('path, shard', [
+    ('/game/aaa', game_shard('aaa', 4)),
+    ('/game/aaa/join', game_shard('aaa', 4)),
+    ('/game/bbbb/round/aaa/vote', game_shard('bbbb', 4)),
+    ('/new_game', None),
+    ('/status', None),
+    ('/static/style/custom.css', None),
+    ('/', None),
+])
+def test_path_shard(path, shard):
+    """Check if requests concerning a game are routed to the game's shard."""
+    assert path_shard(path, 4) == shard
+
+
+@pytest.mark.parametrize('uri, sharded_uri', [
+    ('memory://', 'memory://'),
+    ('memory:///var/planningpoker', 'memory:///var/planningpoker/shard-2'),
+    ('sqlite:///db.sqlite3', 'sqlite:///db.sqlite3'),
+    ('redis://localhost', 'redis://localhost'),
+])
+def test_shard_persistence_uri(uri, sharded_uri):
+    """Check if only process memory backends get storage per shard."""
+    assert shard_persistence_uri(uri, Shard(2, 4)) == sharded_uri
@@ -0,0 +1,39 @@
+"""Tests for poll statistics."""
+from decimal import Decimal
+
+from planningpoker.statistics import numeric_order, poll_statistics
+
+CARDS = [Decimal(8), Decimal('0.5'), '?', Decimal(2), Decimal('NaN'), Decimal(13)]
+ORDER = numeric_order(CARDS)
+
+
+def test_numeric_order():
+    """Check if only finite numeric cards are taken, sorted by value."""
+    assert ORDER == [1, 3, 0, 5]
+    assert numeric_order(['coffee', True]) == []
+
+
+def test_poll_statistics():
+    """Check statistics computed from histograms."""
+    statistics = poll_statistics([1, 2, 4, 1, 0, 0], CARDS, ORDER)
+    assert statistics == {
+        'count': 8,
+        'histogram': [1, 2, 4, 1, 0, 0],
+        'consensus': False,
+        'mean': Decimal('2.75'),
+        'median': Decimal('1.25'),
+        'min': Decimal('0.5'),
+        'max': Decimal(8),
+    }
+    assert poll_statistics([0, 0, 0, 0, 0, 3], CARDS, ORDER)['median'] == Decimal(13)
+    assert poll_statistics([1, 1, 0, 1, 0, 0], CARDS, ORDER)['median'] == Decimal(2)
+
+
+def test_poll_statistics_without_numbers():
+    """Check if polls with no numeric votes get no numeric statistics."""
+    empty = poll_statistics([0] * 6, CARDS, ORDER)
+    assert (empty['count'], empty['consensus'], empty['mean']) == (0, False, None)
+
+    unknown = poll_statistics([0, 0, 3, 0, 0, 0], CARDS, ORDER)
+    assert (unknown['count'], unknown['consensus']) == (3, True)
+    assert [unknown[key] for key in ['mean', 'median', 'min', 'max']] == [None] * 4
@@ -0,0 +1,85 @@
+"""Tests for the timing wheel."""
+import pytest
+
+from planningpoker.timing_wheel import TimingWheel
+
+
+class Clock:
+
+    """A clock moved forward by hand."""
+
+    def __init__(self):
+        """Start at an arbitrary time."""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Return a fake clock."""
+    return Clock()
+
+
+def test_expiry(clock):
+    """Check if keys expire after the timeout but not before."""
+    wheel = TimingWheel(10, 1, clock)
+    wheel.touch('a')
+    clock.now += 5
+    wheel.touch('b')
+
+    clock.now += 4.5
+    assert wheel.advance() == []
+    clock.now += 1
+    assert wheel.advance() == ['a']
+    assert 'a' not in wheel
+    assert 'b' in wheel
+
+    clock.now += 5
+    assert wheel.advance() == ['b']
+    assert len(wheel) == 0
+
+
+def test_touch_postpones_expiry(clock):
+    """Check if touching a key restarts its timeout."""
+    wheel = TimingWheel(10, 1, clock)
+    wheel.touch('a')
+    for _ in range(5):
+        clock.now += 8
+        wheel.touch('a')
+        assert wheel.advance() == []
+
+    clock.now += 11
+    assert wheel.advance() == ['a']
+
+
+def test_discard(clock):
+    """Check if discarded keys do not expire, even if touched again later."""
+    wheel = TimingWheel(10, 1, clock)
+    wheel.touch('a')
+    wheel.touch('b')
+    wheel.discard('a')
+    wheel.discard('c')
+    clock.now += 11
+    assert wheel.advance() == ['b']
+
+    wheel.touch('a')
+    wheel.discard('a')
+    wheel.touch('a')
+    clock.now += 11
+    assert wheel.advance() == ['a']
+    assert wheel.advance() == []
+
+
+@pytest.mark.parametrize('pause', [3, 10, 11, 12, 25, 1000])
+def test_long_pause(clock, pause):
+    """Check if keys expire when the wheel was not advanced for any number of ticks."""
+    wheel = TimingWheel(10, 1, clock)
+    for second in range(10):
+        wheel.touch(second)
+        clock.now += 1
+
+    clock.now += pause
+    assert sorted(wheel.advance()) == list(range(min(pause + 1, 10)))